@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步语音处理流水线
+串联：语音识别(ASR) → 智能Agent → 系统控制器 → 语音合成(TTS)
+所有网络等待都在同一个事件循环中进行，同步接口只是提交协程并等待结果的薄封装
+"""
+
+import asyncio
+import queue
+import threading
+from typing import Dict, Any, List, Iterable, Iterator, AsyncIterator, Tuple
+
+from history_compactor import HistoryCompactor
+from session_manager import DEFAULT_SESSION
+from llm_stream import astream_chat
+from streaming_tts import StreamingTTS
+
+
+class AsyncRuntime:
+    """在后台线程中运行的共享事件循环，供同步代码提交协程"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="async-runtime", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: float = None):
+        """在事件循环中执行协程，阻塞当前线程直到得到结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def iterate(self, agen: AsyncIterator, timeout: float = None) -> Iterator:
+        """
+        在事件循环中消费异步生成器，把产出的元素交给当前线程的同步迭代器
+        调用方提前停止迭代时取消异步生成器
+        """
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(done)
+                await agen.aclose()
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item = items.get(timeout=timeout)
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def stop(self):
+        """停止事件循环"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+async def _call_async(client, async_name: str, sync_name: str, *args) -> Dict[str, Any]:
+    """优先调用客户端的异步方法，没有时把同步方法放到线程池执行"""
+    async_method = getattr(client, async_name, None)
+    if async_method is not None:
+        return await async_method(*args)
+    return await asyncio.to_thread(getattr(client, sync_name), *args)
+
+
+class VoicePipeline:
+    """语音助手处理流水线"""
+
+    def __init__(self, api_client, xunfei_client, agent, controller, runtime: AsyncRuntime = None,
+                 tts_client=None, history_compactor: HistoryCompactor = None):
+        """
+        参数:
+            api_client: LLM/TTS客户端（七牛云或百度）
+            xunfei_client: 讯飞语音识别客户端
+            agent: 智能Agent
+            controller: 系统控制器
+            runtime: 共享事件循环，不传则新建
+            tts_client: 语音合成使用的客户端（如带缓存的 CachedTTSClient），不传则使用api_client
+            history_compactor: 对话历史压缩器，不传则按默认预算新建、用api_client生成摘要
+        """
+        self.api_client = api_client
+        self.xunfei_client = xunfei_client
+        self.agent = agent
+        self.controller = controller
+        self.runtime = runtime or AsyncRuntime()
+        self.tts_client = tts_client or api_client
+        self.streaming_tts = StreamingTTS(self.tts_client)
+        self.history_compactor = history_compactor or HistoryCompactor(self._asummarize)
+        self.chat_model = getattr(api_client, "model", None)  # 决定对话历史的token预算
+
+    # ------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------
+
+    async def aprocess_text(self, text: str, text_key: str = "text",
+                            session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """
+        文本 → Agent → 系统控制器
+
+        参数:
+            text: 用户文本
+            text_key: 响应中回显文本使用的字段名（语音输入为 recognized_text）
+            session_id: 会话ID（对话历史按会话记录）
+        """
+        agent_result = await self.agent.aprocess_user_input(text, session_id)
+
+        # 如果Agent返回了工具调用，执行系统操作
+        if agent_result.get('success'):
+            action = agent_result.get('action') or agent_result.get('tool')
+            # 优先使用agent_result中的参数，fallback到parameters字段
+            parameters = dict(agent_result.get('parameters', {}))
+            # 如果parameters为空，尝试从agent_result的其他字段获取
+            if not parameters:
+                for key in ['url', 'target_name', 'song_name', 'artist', 'topic', 'query']:
+                    if key in agent_result:
+                        parameters[key] = agent_result[key]
+
+            # 执行系统操作
+            execution_result = await self.controller.aexecute_action(action, parameters)
+
+            # 合并结果
+            return {
+                "success": True,
+                text_key: text,
+                "intent": {
+                    "action": action,
+                    "parameters": parameters
+                },
+                "execution": execution_result,
+                "message": execution_result.get('message', ''),
+                "tts_text": execution_result.get('message', '')
+            }
+
+        return {
+            "success": agent_result.get('success', False),
+            text_key: text,
+            "message": agent_result.get('message', ''),
+            "error": agent_result.get('error'),
+            "tts_text": agent_result.get('message', '')
+        }
+
+    async def aprocess_voice(self, audio_bytes: bytes, audio_format: str = "pcm",
+                             sample_rate: int = 16000, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """音频 → 讯飞ASR → Agent → 系统控制器"""
+        print(f"📤 使用讯飞ASR识别，音频大小: {len(audio_bytes)} bytes")
+
+        asr_result = await _call_async(
+            self.xunfei_client, "aspeech_recognition", "speech_recognition",
+            audio_bytes, audio_format, sample_rate
+        )
+        return await self._aprocess_asr_result(asr_result, session_id)
+
+    async def aprocess_voice_stream(self, chunks: Iterable[bytes], audio_format: str = "pcm",
+                                    sample_rate: int = 16000,
+                                    session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """
+        音频分片流 → 讯飞ASR → Agent → 系统控制器
+        chunks是阻塞读取的迭代器（如HTTP请求体），在线程中边读边识别
+        """
+        asr_result = await asyncio.to_thread(
+            self.xunfei_client.speech_recognition_stream, chunks, audio_format, sample_rate
+        )
+        return await self._aprocess_asr_result(asr_result, session_id)
+
+    async def _aprocess_asr_result(self, asr_result: Dict[str, Any],
+                                   session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """识别结果 → Agent → 系统控制器"""
+        if not asr_result.get('success'):
+            return {
+                "success": False,
+                "error": f"讯飞语音识别失败: {asr_result.get('error')}"
+            }
+
+        recognized_text = asr_result.get('text', '')
+        print(f"✅ 讯飞识别成功: {recognized_text}")
+        print(f"📝 识别结果: {recognized_text}")
+
+        return await self.aprocess_text(recognized_text, "recognized_text", session_id)
+
+    async def atext_to_speech(self, text: str) -> Dict[str, Any]:
+        """文本 → TTS"""
+        return await _call_async(self.tts_client, "atext_to_speech", "text_to_speech", text)
+
+    def atext_to_speech_stream(self, text: str) -> AsyncIterator[Dict[str, Any]]:
+        """文本 → 分句并行TTS，按顺序逐段产出（见 StreamingTTS.astream）"""
+        return self.streaming_tts.astream(text)
+
+    async def acompact_history(self, message: str, history: List[Dict] = None,
+                               session_id: str = DEFAULT_SESSION) -> Tuple[List[Dict], Dict[str, Any]]:
+        """按当前模型的token预算压缩对话历史（见 HistoryCompactor.acompact）"""
+        return await self.history_compactor.acompact(message, history, self.chat_model, session_id)
+
+    async def _asummarize(self, prompt: str) -> str:
+        """用对话接口生成历史摘要"""
+        result = await _call_async(self.api_client, "achat", "chat", prompt, None)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error') or "对话失败")
+        return result.get('content', '')
+
+    async def achat(self, message: str, history: List[Dict] = None) -> Dict[str, Any]:
+        """纯对话（不执行系统操作）"""
+        return await _call_async(self.api_client, "achat", "chat", message, history)
+
+    async def achat_stream(self, message: str, history: List[Dict] = None,
+                           speak: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式纯对话：逐段产出大模型回复，speak为True时同时分句合成语音
+
+        产出:
+            {"type": "delta", "content": 回复增量}
+            {"type": "audio", ...}（仅speak=True，见 StreamingTTS.astream_text）
+
+        异常:
+            LLMStreamError: 对话失败
+        """
+        deltas = astream_chat(self.api_client, message, history)
+        if speak:
+            async for event in self.streaming_tts.astream_text(deltas):
+                yield event
+            return
+        async for delta in deltas:
+            yield {"type": "delta", "content": delta}
+
+    # ------------------------------------------------------------
+    # 同步接口（薄封装，供HTTP处理线程调用）
+    # ------------------------------------------------------------
+
+    def process_text(self, text: str, text_key: str = "text",
+                     session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        return self.runtime.run(self.aprocess_text(text, text_key, session_id))
+
+    def process_voice(self, audio_bytes: bytes, audio_format: str = "pcm",
+                      sample_rate: int = 16000, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        return self.runtime.run(self.aprocess_voice(audio_bytes, audio_format, sample_rate, session_id))
+
+    def process_voice_stream(self, chunks: Iterable[bytes], audio_format: str = "pcm",
+                             sample_rate: int = 16000, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        return self.runtime.run(self.aprocess_voice_stream(chunks, audio_format, sample_rate, session_id))
+
+    def text_to_speech(self, text: str) -> Dict[str, Any]:
+        return self.runtime.run(self.atext_to_speech(text))
+
+    def text_to_speech_stream(self, text: str) -> Iterator[Dict[str, Any]]:
+        return self.runtime.iterate(self.atext_to_speech_stream(text))
+
+    def compact_history(self, message: str, history: List[Dict] = None,
+                        session_id: str = DEFAULT_SESSION) -> Tuple[List[Dict], Dict[str, Any]]:
+        return self.runtime.run(self.acompact_history(message, history, session_id))
+
+    def chat(self, message: str, history: List[Dict] = None) -> Dict[str, Any]:
+        return self.runtime.run(self.achat(message, history))
+
+    def chat_stream(self, message: str, history: List[Dict] = None,
+                    speak: bool = False) -> Iterator[Dict[str, Any]]:
+        return self.runtime.iterate(self.achat_stream(message, history, speak))
@@ -5,13 +5,463 @@
 """
 
 import base64
-import io
-from pydub import AudioSegment
+import itertools
+import struct
+import subprocess
+import threading
+from typing import Iterable, Iterator, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：未安装时不能在进程内重采样，转码全部交给ffmpeg
+    np = None
+
+TARGET_SAMPLE_RATE = 16000  # 讯飞识别使用的采样率
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo:
+    """WAV文件的格式信息，data是原缓冲区中音频数据的memoryview（未复制）"""
+    
+    __slots__ = ("format_tag", "channels", "sample_rate", "bits_per_sample", "block_align", "data")
+    
+    def __init__(self, format_tag: int, channels: int, sample_rate: int,
+                 bits_per_sample: int, block_align: int, data: memoryview):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.block_align = block_align
+        self.data = data
+    
+    @property
+    def is_pcm16_mono(self) -> bool:
+        """是否为16bit单声道PCM"""
+        return self.format_tag == WAVE_FORMAT_PCM and self.channels == 1 and self.bits_per_sample == 16
+    
+    @property
+    def duration(self) -> float:
+        """音频时长（秒）"""
+        if not self.block_align or not self.sample_rate:
+            return 0.0
+        return len(self.data) / self.block_align / self.sample_rate
+    
+    def __repr__(self):
+        return (f"WavInfo(format_tag={self.format_tag:#x}, channels={self.channels}, "
+                f"sample_rate={self.sample_rate}, bits_per_sample={self.bits_per_sample}, "
+                f"data_bytes={len(self.data)})")
+
+
+def is_wav(data) -> bool:
+    """是否以RIFF/WAVE头开始"""
+    return len(data) >= 12 and data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def iter_riff_chunks(data) -> Iterator[Tuple[bytes, memoryview]]:
+    """
+    依次返回RIFF文件中的 (块ID, 块内容memoryview)
+    块内容不复制；声明长度超出实际数据时（边录边写的WAV常见）截断到数据末尾
+    """
+    buf = memoryview(data)
+    if not is_wav(buf):
+        raise ValueError("不是RIFF/WAVE格式")
+    
+    offset = 12
+    while offset + 8 <= len(buf):
+        chunk_id = bytes(buf[offset:offset + 4])
+        size = struct.unpack_from('<I', buf, offset + 4)[0]
+        start = offset + 8
+        if chunk_id == b'data' and size in (0, 0xFFFFFFFF):
+            # 管道输出/边录边写时data块长度未回填，取到数据末尾
+            size = len(buf) - start
+        end = min(start + size, len(buf))
+        yield chunk_id, buf[start:end]
+        # 块按2字节对齐，奇数长度后有一个填充字节
+        offset = start + size + (size & 1)
+
+
+def _parse_fmt(chunk) -> Tuple[int, int, int, int, int]:
+    """解析fmt块，返回 (format_tag, channels, sample_rate, bits_per_sample, block_align)"""
+    if len(chunk) < 16:
+        raise ValueError("WAV fmt块不完整")
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from('<HHIIHH', chunk)
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+        # 扩展格式的实际编码在SubFormat GUID的前两个字节
+        format_tag = struct.unpack_from('<H', chunk, 24)[0]
+    if not block_align:
+        block_align = channels * bits // 8
+    return format_tag, channels, sample_rate, bits, block_align
+
+
+def parse_wav(data) -> WavInfo:
+    """
+    解析WAV文件，找到fmt块和data块（支持LIST/fact等附加块，以及WAVE_FORMAT_EXTENSIBLE）
+    
+    参数:
+        data: WAV文件内容（bytes/bytearray/memoryview）
+    
+    返回:
+        WavInfo
+    
+    异常:
+        ValueError: 不是WAV文件或缺少fmt/data块
+    """
+    fmt = None
+    for chunk_id, chunk in iter_riff_chunks(data):
+        if chunk_id == b'fmt ':
+            fmt = _parse_fmt(chunk)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV data块之前缺少fmt块")
+            format_tag, channels, sample_rate, bits, block_align = fmt
+            # 去掉不完整的末尾采样帧
+            usable = len(chunk) - len(chunk) % block_align if block_align else len(chunk)
+            return WavInfo(format_tag, channels, sample_rate, bits, block_align, chunk[:usable])
+    raise ValueError("WAV缺少data块")
+
+
+def read_wav_stream(chunks: Iterable[bytes]) -> Tuple[WavInfo, Iterator[bytes]]:
+    """
+    从分片到达的WAV流中读出文件头，只缓冲到data块开始为止
+
+    参数:
+        chunks: WAV文件内容的分片（如HTTP请求体）
+
+    返回:
+        (WavInfo（data为空）, 后续PCM分片的迭代器)
+
+    异常:
+        ValueError: 不是WAV或文件头不完整
+    """
+    it = iter(chunks)
+    buf = bytearray()
+
+    def need(n: int):
+        while len(buf) < n:
+            chunk = next(it, None)
+            if chunk is None:
+                raise ValueError("WAV文件头不完整")
+            buf.extend(chunk)
+
+    need(12)
+    if not is_wav(buf):
+        raise ValueError("不是RIFF/WAVE格式")
+
+    offset = 12
+    fmt = None
+    while True:
+        need(offset + 8)
+        chunk_id = bytes(buf[offset:offset + 4])
+        size = struct.unpack_from('<I', buf, offset + 4)[0]
+        if chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV data块之前缺少fmt块")
+            head = bytes(buf[offset + 8:])
+            format_tag, channels, sample_rate, bits, block_align = fmt
+            info = WavInfo(format_tag, channels, sample_rate, bits, block_align, memoryview(b''))
+            # 管道输出/边录边写时data块长度未回填，读到流结束为止
+            remaining = None if size in (0, 0xFFFFFFFF) else size
+
+            def body():
+                left = remaining
+                for chunk in itertools.chain((head,), it):
+                    if left is None:
+                        if chunk:
+                            yield chunk
+                        continue
+                    # 只取data块声明的长度，之后的LIST等附加块不是音频
+                    piece = chunk[:left]
+                    left -= len(piece)
+                    if piece:
+                        yield piece
+                    if not left:
+                        return
+
+            return info, body()
+
+        need(offset + 8 + size)
+        if chunk_id == b'fmt ':
+            fmt = _parse_fmt(bytes(buf[offset + 8:offset + 8 + size]))
+        offset += 8 + size + (size & 1)
+
+
+def iter_aligned(chunks: Iterable[bytes], align: int = 2, min_size: int = 0) -> Iterator[bytes]:
+    """
+    把任意长度的分片重新切分为align字节的整数倍（16bit PCM不能在采样中间断开），
+    并把过小的分片合并到至少min_size字节
+    """
+    pending = b''
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+        if len(chunk) < min_size:
+            pending = chunk
+            continue
+        cut = len(chunk) - len(chunk) % align
+        pending = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+    cut = len(pending) - len(pending) % align
+    if cut:
+        yield pending[:cut]
+
+
+def pcm_to_float(data, format_tag: int, bits_per_sample: int, channels: int) -> "np.ndarray":
+    """
+    把交错存放的PCM数据转为 (帧数, 声道数) 的float32数组，取值范围[-1, 1]
+    支持8/16/24/32bit整数和32/64bit浮点
+    """
+    buf = memoryview(data)
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits_per_sample in (32, 64):
+        samples = np.frombuffer(buf, dtype='<f4' if bits_per_sample == 32 else '<f8').astype(np.float32)
+    elif format_tag == WAVE_FORMAT_PCM and bits_per_sample == 8:
+        samples = (np.frombuffer(buf, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif format_tag == WAVE_FORMAT_PCM and bits_per_sample == 16:
+        samples = np.frombuffer(buf, dtype='<i2').astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits_per_sample == 24:
+        raw = np.frombuffer(buf[:len(buf) - len(buf) % 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = (ints << 8) >> 8  # 符号扩展
+        samples = ints.astype(np.float32) / 8388608.0
+    elif format_tag == WAVE_FORMAT_PCM and bits_per_sample == 32:
+        samples = np.frombuffer(buf, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"不支持的PCM格式: format_tag={format_tag:#x}, bits={bits_per_sample}")
+    
+    frames = len(samples) // channels
+    return samples[:frames * channels].reshape(frames, channels)
+
+
+def downmix(samples: "np.ndarray") -> "np.ndarray":
+    """多声道取平均混为单声道"""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def _lowpass_kernel(cutoff: float, taps: int = 63) -> "np.ndarray":
+    """加Hamming窗的sinc低通滤波器，cutoff为相对采样率的截止频率(0~0.5)"""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def resample(samples: "np.ndarray", src_rate: int, dst_rate: int = TARGET_SAMPLE_RATE) -> "np.ndarray":
+    """
+    单声道重采样：降采样时先低通抗混叠，再线性插值到目标采样点
+    """
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    if dst_rate < src_rate:
+        samples = np.convolve(samples, _lowpass_kernel(0.5 * dst_rate / src_rate), mode='same')
+    
+    out_len = int(len(samples) * dst_rate // src_rate)
+    positions = np.arange(out_len, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def to_int16(samples: "np.ndarray") -> bytes:
+    """量化为小端16bit PCM"""
+    return np.clip(np.rint(samples * 32767.0), -32768, 32767).astype('<i2').tobytes()
+
+
+def convert_pcm(data, format_tag: int, bits_per_sample: int, channels: int,
+                src_rate: int, dst_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """
+    任意PCM → 目标采样率的16bit单声道PCM（整段向量化处理）
+    
+    异常:
+        RuntimeError: 未安装numpy
+        ValueError: 不支持的PCM格式
+    """
+    if np is None:
+        raise RuntimeError("未安装numpy，无法在进程内转换音频格式")
+    samples = downmix(pcm_to_float(data, format_tag, bits_per_sample, channels))
+    return to_int16(resample(samples, src_rate, dst_rate))
+
+
+def wav_to_pcm16(info: WavInfo, dst_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """把解析后的WAV转换为目标采样率的16bit单声道PCM"""
+    if info.is_pcm16_mono and info.sample_rate == dst_rate:
+        return bytes(info.data)
+    return convert_pcm(info.data, info.format_tag, info.bits_per_sample,
+                       info.channels, info.sample_rate, dst_rate)
+
+
+def pcm16_to_wav(pcm, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """给16bit单声道PCM加上标准WAV头"""
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + len(pcm), b'WAVE',
+        b'fmt ', 16, WAVE_FORMAT_PCM, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', len(pcm)
+    )
+    return header + bytes(pcm)
+
+
+def decode_with_ffmpeg(data: bytes, input_format: str = None) -> bytes:
+    """
+    用ffmpeg解码压缩音频（WebM/Opus、MP3等），输出WAV
+    安装了numpy时只解码、保持原采样率和声道（重采样在进程内完成），
+    否则由ffmpeg直接输出16kHz单声道16bit
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if input_format:
+        cmd += ["-f", input_format]
+    cmd += ["-i", "pipe:0"]
+    if np is not None:
+        cmd += ["-acodec", "pcm_f32le"]
+    else:
+        cmd += ["-ar", str(TARGET_SAMPLE_RATE), "-ac", "1", "-acodec", "pcm_s16le"]
+    cmd += ["-f", "wav", "pipe:1"]
+    
+    result = subprocess.run(cmd, input=data, capture_output=True, check=True)
+    return result.stdout
+
+
+class StreamingDecoder:
+    """
+    流式解码：边写入WebM/Opus分片，边读出16kHz单声道16bit PCM帧
+    整个会话只启动一个ffmpeg进程，重采样由该进程连续完成（分片边界处没有接缝）
+    feed() 与 frames() 需在不同线程中调用，否则管道缓冲区写满后会互相等待
+    ffmpeg的错误输出由后台线程持续读取（只保留末尾一段），不会因管道写满卡住解码
+    """
+    
+    # 保留的错误输出字节数
+    STDERR_TAIL = 4096
+    
+    def __init__(self, input_format: str = "webm", sample_rate: int = TARGET_SAMPLE_RATE,
+                 frame_bytes: int = 1280):
+        """
+        参数:
+            input_format: ffmpeg的输入容器格式（webm/ogg等）
+            sample_rate: 输出PCM的采样率
+            frame_bytes: 每次产出的PCM字节数，默认1280字节即16kHz下的40ms
+        
+        异常:
+            FileNotFoundError: 未安装ffmpeg
+        """
+        self.sample_rate = sample_rate
+        self.frame_bytes = frame_bytes
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.proc = subprocess.Popen(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                # 减少探测，收到第一个簇就开始输出
+                "-fflags", "nobuffer", "-probesize", "4096", "-analyzeduration", "0",
+                "-f", input_format, "-i", "pipe:0",
+                "-ar", str(sample_rate), "-ac", "1", "-f", "s16le", "pipe:1"
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            bufsize=0
+        )
+        self._stderr_tail = b''
+        self._stderr_reader = threading.Thread(target=self._drain_stderr, name="ffmpeg-stderr", daemon=True)
+        self._stderr_reader.start()
+    
+    def _drain_stderr(self):
+        try:
+            for line in iter(self.proc.stderr.readline, b''):
+                self._stderr_tail = (self._stderr_tail + line)[-self.STDERR_TAIL:]
+        except (OSError, ValueError):
+            pass
+    
+    def feed(self, chunk: bytes):
+        """写入一段压缩音频"""
+        if not chunk:
+            return
+        try:
+            self.proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            raise RuntimeError(f"音频解码进程已退出: {self._stderr()}")
+        self.bytes_in += len(chunk)
+    
+    def end_input(self):
+        """输入结束，ffmpeg输出剩余PCM后退出"""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+    
+    def frames(self) -> Iterator[bytes]:
+        """
+        逐帧产出解码后的PCM，直到输入结束且全部输出完毕
+        
+        异常:
+            RuntimeError: ffmpeg解码失败
+        """
+        stdout = self.proc.stdout
+        pending = b''
+        while True:
+            data = stdout.read(self.frame_bytes)
+            if not data:
+                break
+            if pending:
+                data, pending = pending + data, b''
+            # 保持16bit采样对齐
+            if len(data) % 2:
+                data, pending = data[:-1], data[-1:]
+            self.bytes_out += len(data)
+            yield data
+        
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"音频解码失败: {self._stderr()}")
+    
+    def _stderr(self) -> str:
+        """ffmpeg错误输出的末尾（进程已退出时等读取线程读完）"""
+        if self.proc.poll() is not None:
+            self._stderr_reader.join(timeout=1)
+        return self._stderr_tail.decode('utf-8', 'replace').strip()
+    
+    def close(self):
+        """结束解码进程（提前放弃时调用）"""
+        self.end_input()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self._stderr_reader.join(timeout=1)
+        for f in (self.proc.stdout, self.proc.stderr):
+            f.close()
+
+
+def decode_stream(chunks: Iterable[bytes], input_format: str = "webm",
+                  sample_rate: int = TARGET_SAMPLE_RATE) -> Iterator[bytes]:
+    """
+    把压缩音频分片流解码为PCM帧的生成器
+    后台线程依次写入分片，解码出的PCM帧立即产出，可以直接交给ASR发送
+    
+    参数:
+        chunks: WebM/Opus等压缩音频分片（可以是边接收边产生的迭代器）
+        input_format: 容器格式
+        sample_rate: 输出PCM的采样率
+    """
+    decoder = StreamingDecoder(input_format, sample_rate)
+    
+    def pump():
+        try:
+            for chunk in chunks:
+                decoder.feed(chunk)
+        except Exception as e:
+            print(f"⚠️  音频分片写入失败: {e}")
+        finally:
+            decoder.end_input()
+    
+    threading.Thread(target=pump, name="audio-decode-feed", daemon=True).start()
+    try:
+        yield from decoder.frames()
+    finally:
+        decoder.close()
 
 
 def convert_webm_to_wav(webm_data: bytes) -> bytes:
     """
-    将WebM格式音频转换为WAV格式
+    将WebM格式音频转换为WAV格式（16kHz，16bit，单声道）
     
     参数:
         webm_data: WebM格式的音频数据
@@ -20,21 +470,12 @@ def convert_webm_to_wav(webm_data: bytes) -> bytes:
         WAV格式的音频数据
     """
     try:
-        # 使用pydub转换格式
-        audio = AudioSegment.from_file(io.BytesIO(webm_data), format="webm")
-        
-        # 转换为16k采样率，单声道
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        
-        # 导出为WAV
-        wav_io = io.BytesIO()
-        audio.export(wav_io, format="wav")
-        wav_io.seek(0)
-        
-        return wav_io.read()
-    except ImportError:
-        # 如果没有安装pydub，返回原始数据
-        print("⚠️  未安装pydub，无法转换音频格式")
+        # ffmpeg只负责解码容器，重采样和混音在进程内向量化完成
+        info = parse_wav(decode_with_ffmpeg(webm_data, "webm"))
+        return pcm16_to_wav(wav_to_pcm16(info))
+    except FileNotFoundError:
+        # 如果没有安装ffmpeg，返回原始数据
+        print("⚠️  未安装ffmpeg，无法转换音频格式")
         return webm_data
     except Exception as e:
         print(f"⚠️  音频转换失败: {e}")
@@ -5,28 +5,32 @@
 集成：文心一言(LLM)、语音识别(ASR)、语音合成(TTS)
 """
 
-import requests
 import json
 import base64
 import time
 from typing import Dict, Optional, Any
 
+from http_pool import HTTPSessionPool, get_shared_pool
+
 
 class BaiduAPIClient:
     """百度API统一客户端"""
     
-    def __init__(self, api_key: str = "", secret_key: str = ""):
+    def __init__(self, api_key: str = "", secret_key: str = "", http_pool: HTTPSessionPool = None):
         """
         初始化百度API客户端
         
         参数:
             api_key: 百度API Key
             secret_key: 百度Secret Key
+            http_pool: HTTP连接池，不传则使用进程内共享连接池
         """
+        self.http = http_pool or get_shared_pool()
         self.api_key = api_key or "YOUR_API_KEY"
         self.secret_key = secret_key or "YOUR_SECRET_KEY"
         self.access_token = None
         self.token_expire_time = 0
+        self.model = "ernie-bot"  # 对话接口 wenxinworkshop/chat/completions 对应的模型
         
     def _get_access_token(self) -> str:
         """
@@ -45,7 +49,7 @@ class BaiduAPIClient:
         }
         
         try:
-            response = requests.post(url, params=params, timeout=10)
+            response = self.http.post(url, params=params, timeout=10)
             result = response.json()
             
             if "access_token" in result:
@@ -82,9 +86,10 @@ class BaiduAPIClient:
         # 文心一言API地址
         url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions?access_token={token}"
         
-        # 构建消息列表
-        messages = history or []
+        # 构建消息列表（文心一言的系统提示词通过system字段传递，不能放在messages中）
+        messages = [m for m in history or [] if m.get("role") != "system"]
         messages.append({"role": "user", "content": message})
+        system = "\n".join(m["content"] for m in history or [] if m.get("role") == "system")
         
         payload = {
             "messages": messages,
@@ -94,9 +99,11 @@ class BaiduAPIClient:
             "disable_search": False,
             "enable_citation": False
         }
+        if system:
+            payload["system"] = system
         
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.http.post(url, json=payload, timeout=30)
             result = response.json()
             
             if "result" in result:
@@ -157,7 +164,7 @@ class BaiduAPIClient:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = self.http.post(url, json=payload, headers=headers, timeout=10)
             result = response.json()
             
             if result.get("err_no") == 0:
@@ -212,7 +219,7 @@ class BaiduAPIClient:
         }
         
         try:
-            response = requests.post(url, data=params, timeout=10)
+            response = self.http.post(url, data=params, timeout=10)
             
             # 检查是否返回的是音频数据
             if response.headers['Content-Type'] == "audio/mp3":
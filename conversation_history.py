@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话历史存储
+每个会话一个定长环形缓冲区，记录使用 __slots__ 的紧凑结构，长时间运行内存占用保持不变
+（会话本身的创建与淘汰见 session_manager.py）
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+
+class TurnRecord:
+    """一轮对话"""
+
+    __slots__ = ("timestamp", "user", "agent", "action", "parameters", "source")
+
+    def __init__(self, timestamp: float, user: str, agent: str, action: Optional[str],
+                 parameters: str, source: Optional[str]):
+        self.timestamp = timestamp
+        self.user = user
+        self.agent = agent
+        self.action = action
+        self.parameters = parameters  # 紧凑JSON字符串，比嵌套dict省内存且不可变
+        self.source = source
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "user": self.user,
+            "agent": self.agent,
+            "intent": {
+                "action": self.action,
+                "parameters": json.loads(self.parameters),
+                "source": self.source
+            }
+        }
+
+    def size(self) -> int:
+        """占用的字节数（含字段中的字符串）"""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name)) for name in ("user", "agent", "action", "parameters", "source")
+        )
+
+
+class SessionHistory:
+    """一个会话的对话历史：定长环形缓冲区，超出时丢弃最早的轮次"""
+
+    __slots__ = ("turns", "max_text_len", "_lock")
+
+    def __init__(self, max_turns: int = 50, max_text_len: int = 500):
+        """
+        参数:
+            max_turns: 保留的轮数
+            max_text_len: 用户输入和回复保存的最大长度
+        """
+        self.turns: deque = deque(maxlen=max_turns)
+        self.max_text_len = max_text_len
+        self._lock = threading.Lock()  # 同一会话的并发请求
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def add(self, user: str, agent: str, intent: Dict[str, Any]):
+        """记录一轮对话"""
+        record = TurnRecord(
+            time.time(),
+            user[:self.max_text_len],
+            (agent or "")[:self.max_text_len],
+            intent.get("action"),
+            json.dumps(intent.get("parameters") or {}, ensure_ascii=False, separators=(",", ":"), default=str),
+            intent.get("source")
+        )
+        with self._lock:
+            self.turns.append(record)
+
+    def page(self, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """
+        分页读取（从新到旧）
+
+        返回:
+            {"total": 总轮数, "offset", "limit", "items": [轮次...]}
+        """
+        offset = max(0, offset)
+        limit = max(0, limit)
+        with self._lock:
+            turns = list(self.turns)
+        newest_first = turns[::-1][offset:offset + limit]
+        return {
+            "total": len(turns),
+            "offset": offset,
+            "limit": limit,
+            "items": [record.to_dict() for record in newest_first]
+        }
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """全部历史（从旧到新）"""
+        with self._lock:
+            turns = list(self.turns)
+        return [record.to_dict() for record in turns]
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+
+    def size(self) -> int:
+        """占用的字节数"""
+        with self._lock:
+            turns = list(self.turns)
+        return sys.getsizeof(self.turns) + sum(record.size() for record in turns)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话历史压缩
+/api/chat 的历史由客户端每轮带上，会话越长提示词越大；超出按模型配置的token预算时，
+保留最近若干轮原文（滑动窗口），更早的轮次折叠成一段滚动摘要，摘要按会话缓存，
+之后每轮只需把新滑出窗口的轮次并入摘要
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from token_count import estimate_tokens, estimate_messages_tokens, MESSAGE_OVERHEAD
+
+# 各模型历史+本轮消息的token预算，未列出的模型使用 default
+DEFAULT_TOKEN_BUDGETS = {
+    "default": 3000,
+    "deepseek-v3": 6000,
+    "deepseek-chat": 6000,
+    "deepseek-ai/DeepSeek-V2.5": 6000,
+    "qwen-turbo": 4000,
+    "ernie-bot": 2000,
+}
+
+SUMMARY_PREFIX = "以下是之前对话的摘要：\n"
+SUMMARY_PROMPT = (
+    "请把下面的对话压缩成不超过{limit}字的中文摘要，保留人名、数字、结论和尚未完成的事项，只输出摘要。\n\n"
+    "{previous}对话：\n{dialogue}"
+)
+ROLE_NAMES = {"user": "用户", "assistant": "助手", "system": "系统"}
+
+
+def _digest(messages: List[Dict[str, str]]) -> str:
+    """一段历史的指纹（用于判断缓存的摘要是否仍对应客户端发来的历史）"""
+    data = json.dumps(messages, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def _format_dialogue(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{ROLE_NAMES.get(m['role'], m['role'])}：{m['content']}" for m in messages)
+
+
+def _truncate_tokens(text: str, limit: int, keep_tail: bool = False) -> str:
+    """截断到约limit个token，keep_tail为True时保留末尾（较新的内容）"""
+    if estimate_tokens(text) <= limit:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        part = text[-mid:] if keep_tail else text[:mid]
+        if estimate_tokens(part) <= limit:
+            low = mid
+        else:
+            high = mid - 1
+    return text[-low:] if keep_tail else text[:low]
+
+
+class HistoryCompactor:
+    """按token预算压缩对话历史：最近的轮次保留原文，更早的折叠成滚动摘要"""
+
+    def __init__(self, summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+                 budgets: Optional[Dict[str, int]] = None, summary_tokens: int = 300,
+                 window_ratio: float = 0.5, max_sessions: int = 1000):
+        """
+        参数:
+            summarize: 生成摘要的协程函数（提示词 → 摘要），不传或调用失败时退化为截取各轮开头的摘录
+            budgets: 各模型的token预算，与 DEFAULT_TOKEN_BUDGETS 合并
+            summary_tokens: 摘要最多占用的token数
+            window_ratio: 需要重新压缩时，原文窗口缩到预算的这个比例，
+                          之后若干轮无需再次生成摘要
+            max_sessions: 最多缓存多少个会话的摘要，超出时淘汰最久未使用的
+        """
+        self.summarize = summarize
+        self.budgets = dict(DEFAULT_TOKEN_BUDGETS, **(budgets or {}))
+        self.summary_tokens = summary_tokens
+        self.window_ratio = window_ratio
+        self.max_sessions = max_sessions
+
+        # 会话ID → (摘要覆盖的消息数, 这些消息的指纹, 摘要)
+        self._summaries: "OrderedDict[str, Tuple[int, str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.compacted = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.summary_hits = 0
+        self.summary_updates = 0
+        self.summary_failures = 0
+
+    def budget_for(self, model: Optional[str]) -> int:
+        return self.budgets.get(model or "default", self.budgets["default"])
+
+    async def acompact(self, message: str, history: Optional[List[Dict[str, Any]]],
+                       model: Optional[str] = None,
+                       session_id: Optional[str] = None) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        压缩历史
+
+        参数:
+            message: 本轮用户消息
+            history: 客户端发来的历史 [{"role", "content"}]
+            model: 模型名称，决定token预算
+            session_id: 摘要缓存的键，不传则不缓存
+
+        返回:
+            (压缩后的历史, {"budget", "tokens_before", "tokens_after", "kept", "summarized"})
+        """
+        messages = [
+            {"role": str(m["role"]), "content": str(m["content"])}
+            for m in history or []
+            if isinstance(m, dict) and m.get("role") and m.get("content") is not None
+        ]
+        budget = self.budget_for(model)
+        message_tokens = estimate_tokens(message) + MESSAGE_OVERHEAD
+        before = estimate_messages_tokens(messages) + message_tokens
+
+        compacted = messages
+        summarized = 0
+        if before > budget:
+            # 客户端放在开头的系统消息始终保留
+            pinned = 0
+            while pinned < len(messages) and messages[pinned]["role"] == "system":
+                pinned += 1
+            head, rest = messages[:pinned], messages[pinned:]
+            available = budget - message_tokens - estimate_messages_tokens(head) - self.summary_tokens - MESSAGE_OVERHEAD
+
+            summarized = self._reusable_split(session_id, rest, available)
+            if summarized is None:
+                summarized = self._split(rest, int(available * self.window_ratio))
+            summary = await self._summary_for(session_id, rest[:summarized], budget)
+            compacted = head + ([{"role": "system", "content": SUMMARY_PREFIX + summary}] if summary else []) + rest[summarized:]
+
+        after = estimate_messages_tokens(compacted) + message_tokens
+        with self._lock:
+            self.calls += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            if compacted is not messages:
+                self.compacted += 1
+
+        return compacted, {
+            "budget": budget,
+            "tokens_before": before,
+            "tokens_after": after,
+            "kept": len(compacted) - (1 if summarized else 0),
+            "summarized": summarized
+        }
+
+    def _reusable_split(self, session_id: Optional[str], rest: List[Dict[str, str]], available: int) -> Optional[int]:
+        """上次摘要覆盖的轮次仍是历史的开头、且之后的原文还放得下时，沿用上次的切分位置"""
+        if session_id is None:
+            return None
+        with self._lock:
+            cached = self._summaries.get(session_id)
+        if cached is None:
+            return None
+        count, digest, _ = cached
+        if count > len(rest) or _digest(rest[:count]) != digest:
+            return None
+        if estimate_messages_tokens(rest[count:]) > available:
+            return None
+        return count
+
+    @staticmethod
+    def _split(rest: List[Dict[str, str]], window_tokens: int) -> int:
+        """从最新的消息往前保留不超过window_tokens的原文，返回被折叠的消息数（窗口从用户消息开始）"""
+        used = 0
+        start = len(rest)
+        while start > 0:
+            cost = estimate_tokens(rest[start - 1]["content"]) + MESSAGE_OVERHEAD
+            if used + cost > window_tokens:
+                break
+            used += cost
+            start -= 1
+        # 不让窗口以助手回复开头（否则它对应的用户提问被折叠，原文读起来缺了上下文）
+        while start < len(rest) and rest[start]["role"] != "user":
+            start += 1
+        return start
+
+    async def _summary_for(self, session_id: Optional[str], older: List[Dict[str, str]], budget: int) -> str:
+        """older的摘要：缓存覆盖了其中开头部分时只把剩下的并入"""
+        if not older:
+            return ""
+        previous, covered = "", 0
+        if session_id is not None:
+            with self._lock:
+                cached = self._summaries.get(session_id)
+                if cached is not None:
+                    self._summaries.move_to_end(session_id)
+            if cached is not None and cached[0] <= len(older) and _digest(older[:cached[0]]) == cached[1]:
+                covered, previous = cached[0], cached[2]
+
+        if covered == len(older):
+            with self._lock:
+                self.summary_hits += 1
+            return previous
+
+        summary = await self._summarize(previous, older[covered:], budget)
+        if session_id is not None:
+            with self._lock:
+                self.summary_updates += 1
+                self._summaries[session_id] = (len(older), _digest(older), summary)
+                self._summaries.move_to_end(session_id)
+                while len(self._summaries) > self.max_sessions:
+                    self._summaries.popitem(last=False)
+        return summary
+
+    async def _summarize(self, previous: str, new_messages: List[Dict[str, str]], budget: int) -> str:
+        """把new_messages并入已有摘要previous"""
+        if self.summarize is not None:
+            # 摘要请求本身也要放进模型的预算：放不下的较早消息先以摘录并入已有摘要，
+            # 只把较新的部分交给模型
+            limit = max(MESSAGE_OVERHEAD, budget - 2 * self.summary_tokens - estimate_tokens(SUMMARY_PROMPT))
+            start = self._fit(new_messages, limit)
+            if start:
+                previous = self._excerpt(previous, new_messages[:start])
+            dialogue = [
+                {"role": m["role"], "content": _truncate_tokens(m["content"], limit - MESSAGE_OVERHEAD)}
+                for m in new_messages[start:]
+            ]
+            prompt = SUMMARY_PROMPT.format(
+                limit=self.summary_tokens,
+                previous=f"已有摘要：\n{previous}\n\n" if previous else "",
+                dialogue=_format_dialogue(dialogue)
+            )
+            try:
+                summary = (await self.summarize(prompt) or "").strip()
+                if summary:
+                    return _truncate_tokens(summary, self.summary_tokens)
+            except Exception as e:
+                print(f"⚠️  生成对话摘要失败，改用摘录: {e}")
+            with self._lock:
+                self.summary_failures += 1
+            return self._excerpt(previous, new_messages[start:])
+
+        return self._excerpt(previous, new_messages)
+
+    @staticmethod
+    def _fit(messages: List[Dict[str, str]], limit: int) -> int:
+        """从最新的消息往前，总token数不超过limit的起始位置（至少保留最新的一条）"""
+        used = 0
+        start = len(messages)
+        while start > 0:
+            used += estimate_tokens(messages[start - 1]["content"]) + MESSAGE_OVERHEAD
+            if used > limit and start < len(messages):
+                break
+            start -= 1
+        return start
+
+    def _excerpt(self, previous: str, messages: List[Dict[str, str]]) -> str:
+        """摘录：每条消息取开头一段接在已有摘要之后，总长超出时保留较新的部分"""
+        excerpt = _format_dialogue([
+            {"role": m["role"], "content": _truncate_tokens(m["content"], 40)} for m in messages
+        ])
+        return _truncate_tokens(f"{previous}\n{excerpt}" if previous else excerpt, self.summary_tokens, keep_tail=True)
+
+    def clear(self, session_id: Optional[str] = None):
+        """删除一个会话的摘要，不传session_id时删除全部"""
+        with self._lock:
+            if session_id is None:
+                self._summaries.clear()
+            else:
+                self._summaries.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """压缩前后的平均token数和摘要缓存统计"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "compacted": self.compacted,
+                "avg_tokens_before": round(self.tokens_before / self.calls, 1) if self.calls else 0,
+                "avg_tokens_after": round(self.tokens_after / self.calls, 1) if self.calls else 0,
+                "saved_ratio": round(1 - self.tokens_after / self.tokens_before, 4) if self.tokens_before else 0.0,
+                "summaries": len(self._summaries),
+                "summary_hits": self.summary_hits,
+                "summary_updates": self.summary_updates,
+                "summary_failures": self.summary_failures,
+                "budgets": self.budgets
+            }
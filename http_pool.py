@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP连接池 - 所有LLM/TTS客户端共享的长连接会话
+负责：连接复用(keep-alive)、连接池大小、按主机限流、重试预算、连接池统计
+"""
+
+import asyncio
+import contextlib
+import socket
+import threading
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+
+class _PoolAdapter(HTTPAdapter):
+    """可开启TCP keep-alive的HTTPAdapter"""
+
+    def __init__(self, tcp_keepalive: bool = True, **kwargs):
+        self.tcp_keepalive = tcp_keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.tcp_keepalive:
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class _PoolRetry(Retry):
+    """
+    重试策略：幂等方法遇到 status_forcelist 中的状态码都重发；
+    POST（LLM/TTS调用）只在429/503时重发——服务端明确拒绝、没有处理请求，
+    502/504时上游可能已经生成并计费，重发会重复调用
+    """
+
+    REJECTED_STATUSES = frozenset((429, 503))
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST":
+            return bool(self.total) and status_code in self.REJECTED_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class _AsyncHostLimiter:
+    """
+    aiohttp会话的按主机限流：TCPConnector的limit_per_host对所有主机相同，
+    host_limits中按URL前缀的上限用信号量实现，其它属性和方法原样转发给会话
+    """
+
+    def __init__(self, session, host_limits: Dict[str, int]):
+        self._session = session
+        # 更具体（更长）的前缀优先匹配，与同步会话的mount规则一致
+        self._limits = [
+            (prefix, asyncio.Semaphore(limit))
+            for prefix, limit in sorted(host_limits.items(), key=lambda item: len(item[0]), reverse=True)
+        ]
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def _semaphore_for(self, url: str) -> Optional[asyncio.Semaphore]:
+        for prefix, semaphore in self._limits:
+            if url.lower().startswith(prefix.lower()):
+                return semaphore
+        return None
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url, **kwargs):
+        """与 ClientSession.request 相同，达到主机上限时等待，响应释放后才让出名额"""
+        semaphore = self._semaphore_for(str(url))
+        async with semaphore or contextlib.nullcontext():
+            async with self._session.request(method, url, **kwargs) as response:
+                yield response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+class HTTPSessionPool:
+    """带连接池的HTTP会话"""
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 20,
+                 max_retries: int = 2, backoff_factor: float = 0.3,
+                 tcp_keepalive: bool = True, keepalive_timeout: float = 60.0,
+                 host_limits: Optional[Dict[str, int]] = None):
+        """
+        参数:
+            pool_connections: 缓存的主机连接池个数
+            pool_maxsize: 每个主机保持的最大连接数
+            max_retries: 每个请求的重试预算：连接失败都重试；GET等幂等请求遇到429/502/503/504重试，
+                         POST只在429/503（服务端未处理）时重试，见 _PoolRetry
+            backoff_factor: 重试退避系数
+            tcp_keepalive: 是否开启TCP keep-alive探测
+            keepalive_timeout: 异步会话中空闲连接的保持秒数
+            host_limits: 按主机限制最大连接数，如 {"https://openai.qiniu.com": 8}
+                         达到上限的请求会等待空闲连接，而不是新建连接（同步和异步会话都生效）
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.tcp_keepalive = tcp_keepalive
+        self.keepalive_timeout = keepalive_timeout
+        self.host_limits = dict(host_limits or {})
+
+        self.session = requests.Session()
+        self.session.headers["Connection"] = "keep-alive"
+
+        default_adapter = self._make_adapter(pool_maxsize, block=False)
+        self.session.mount("https://", default_adapter)
+        self.session.mount("http://", default_adapter)
+
+        # 更具体的前缀优先匹配，按主机单独限流
+        for prefix, limit in self.host_limits.items():
+            self.session.mount(prefix, self._make_adapter(limit, block=True))
+
+    def _make_adapter(self, maxsize: int, block: bool) -> HTTPAdapter:
+        retry = _PoolRetry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False
+        )
+        return _PoolAdapter(
+            tcp_keepalive=self.tcp_keepalive,
+            pool_connections=self.pool_connections,
+            pool_maxsize=maxsize,
+            pool_block=block,
+            max_retries=retry
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def create_async_session(self):
+        """
+        按相同的连接池配置创建aiohttp会话（需在事件循环中调用）
+        配置了host_limits时返回包装后的会话，request/get/post 按主机限流，用法与 ClientSession 相同
+        aiohttp会话不做重试，失败由调用方处理
+        """
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_connections * self.pool_maxsize,
+            limit_per_host=self.pool_maxsize,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        if self.host_limits:
+            return _AsyncHostLimiter(session, self.host_limits)
+        return session
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        连接池统计
+
+        返回:
+            {
+                "open_connections": 当前打开的连接数（空闲 + 使用中）,
+                "idle_connections": 空闲可复用的连接数,
+                "connections_created": 累计新建连接数,
+                "requests": 累计请求数,
+                "reuse_ratio": 连接复用率 = 1 - 新建连接数 / 请求数,
+                "hosts": {主机: 同上字段}
+            }
+        """
+        hosts = {}
+        adapters = {id(a): a for a in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                queued = list(pool.pool.queue) if pool.pool is not None else []
+                idle = sum(1 for conn in queued if conn is not None)
+                in_use = pool.pool.maxsize - len(queued) if pool.pool is not None else 0
+                host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                stats = hosts.setdefault(host, {
+                    "open_connections": 0, "idle_connections": 0,
+                    "connections_created": 0, "requests": 0
+                })
+                stats["open_connections"] += idle + in_use
+                stats["idle_connections"] += idle
+                stats["connections_created"] += pool.num_connections
+                stats["requests"] += pool.num_requests
+
+        totals = {
+            "open_connections": 0, "idle_connections": 0,
+            "connections_created": 0, "requests": 0
+        }
+        for stats in hosts.values():
+            stats["reuse_ratio"] = self._reuse_ratio(stats)
+            for field in totals:
+                totals[field] += stats[field]
+        totals["reuse_ratio"] = self._reuse_ratio(totals)
+        totals["hosts"] = hosts
+        return totals
+
+    @staticmethod
+    def _reuse_ratio(stats: Dict[str, int]) -> float:
+        if not stats["requests"]:
+            return 0.0
+        return round(max(0.0, 1 - stats["connections_created"] / stats["requests"]), 4)
+
+    def close(self):
+        self.session.close()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def configure_shared_pool(**kwargs) -> HTTPSessionPool:
+    """用指定参数（见 HTTPSessionPool）重建共享连接池，应在创建客户端之前调用"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.close()
+        _shared_pool = HTTPSessionPool(**kwargs)
+        return _shared_pool
+
+
+def get_shared_pool() -> HTTPSessionPool:
+    """获取进程内共享的连接池（首次调用时按默认参数创建）"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPSessionPool()
+        return _shared_pool
@@ -6,25 +6,45 @@
 不依赖第三方Agent框架（如LangChain Agent）
 """
 
+import asyncio
 import json
 import re
+import time
 from typing import Dict, List, Any, Optional
 from baidu_api_client import BaiduAPIClient, BaiduAPIDemoClient
+from intent_cache import IntentCache
+from intent_router import LocalIntentClassifier, RouteStats
+from intent_stream import IntentStreamParser
+from llm_stream import astream_chat
+from session_manager import SessionManager, DEFAULT_SESSION
+from token_count import PromptUsageStats, estimate_messages_tokens, estimate_tokens
 
 
 class IntelligentAgent:
     """智能Agent核心类"""
     
-    def __init__(self, api_client: BaiduAPIClient = None):
+    def __init__(self, api_client: BaiduAPIClient = None, fast_path_threshold: float = 0.6,
+                 intent_cache: IntentCache = None, sessions: SessionManager = None):
         """
         初始化智能Agent
         
         参数:
             api_client: 百度API客户端实例
+            fast_path_threshold: 本地意图识别的置信度阈值，达到时不调用LLM（大于1表示总是调用LLM）
+            intent_cache: LLM意图结果的缓存，不传则按默认参数创建
+            sessions: 会话管理器，不传则按默认参数创建
+        
+        工具注册表、本地分类器、意图缓存和API客户端由所有会话共享；
+        每个会话只在 sessions 中保存轻量的上下文（对话历史、最近一次意图）
         """
         self.api_client = api_client or BaiduAPIDemoClient()
-        self.conversation_history = []  # 对话历史
+        self.sessions = sessions or SessionManager()  # 按会话划分的上下文
         self.available_tools = self._init_tools()  # 可用工具列表
+        self.local_classifier = LocalIntentClassifier(self.available_tools, threshold=fast_path_threshold)
+        self.route_stats = RouteStats()  # 各意图识别路径的请求数和耗时
+        self.intent_cache = intent_cache or IntentCache()  # 重复指令直接复用LLM的意图结果
+        self.prompt_stats = PromptUsageStats()  # 意图理解调用的输入token统计
+        self._intent_system_prompt = None  # 含工具目录的系统提示词，工具变化时重建
         
     def _init_tools(self) -> Dict[str, Dict]:
         """
@@ -76,7 +96,17 @@ class IntelligentAgent:
             }
         }
     
-    def process_user_input(self, user_input: str) -> Dict[str, Any]:
+    def register_tool(self, name: str, spec: Dict[str, Any]):
+        """
+        新增或替换工具
+        工具目录（系统提示词）和本地分类器只在这里重建，不要直接修改 available_tools
+        """
+        self.available_tools[name] = spec
+        self.local_classifier.build(self.available_tools)
+        self._intent_system_prompt = None
+        self.intent_cache.clear()
+    
+    def process_user_input(self, user_input: str, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
         """
         处理用户输入的主流程
         
@@ -88,6 +118,7 @@ class IntelligentAgent:
         
         参数:
             user_input: 用户的文本输入
+            session_id: 会话ID，对话历史按会话分别记录
         
         返回:
             执行结果字典
@@ -98,6 +129,24 @@ class IntelligentAgent:
         
         # 步骤1: 意图理解
         intent_result = self._understand_intent(user_input)
+        return self._complete_turn(user_input, intent_result, session_id)
+    
+    async def aprocess_user_input(self, user_input: str, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """
+        process_user_input 的异步版本
+        意图理解的LLM调用在事件循环中等待，规划与执行为纯计算，直接同步完成
+        """
+        print(f"\n{'='*60}")
+        print(f"🎯 用户输入: {user_input}")
+        print(f"{'='*60}")
+        
+        # 步骤1: 意图理解
+        intent_result = await self._aunderstand_intent(user_input)
+        return self._complete_turn(user_input, intent_result, session_id)
+    
+    def _complete_turn(self, user_input: str, intent_result: Dict[str, Any],
+                       session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """意图理解之后的步骤：任务规划、执行、记录对话历史"""
         print(f"📊 意图分析: {json.dumps(intent_result, ensure_ascii=False, indent=2)}")
         
         if not intent_result.get("success"):
@@ -115,47 +164,155 @@ class IntelligentAgent:
         execution_result = self._execute_plan(plan, user_input)
         print(f"✅ 执行结果: {json.dumps(execution_result, ensure_ascii=False, indent=2)}")
         
-        # 步骤4: 添加到对话历史
-        self.conversation_history.append({
-            "user": user_input,
-            "agent": execution_result.get("message", ""),
-            "intent": intent_result,
-            "plan": plan
-        })
+        # 步骤4: 添加到会话的对话历史（计划可由意图重新得出，不再保存）
+        context = self.sessions.touch(session_id)
+        context.history.add(user_input, execution_result.get("message", ""), intent_result)
+        context.last_intent = {"action": intent_result.get("action"), "parameters": intent_result.get("parameters")}
         
         return execution_result
     
     def _understand_intent(self, user_input: str) -> Dict[str, Any]:
         """
         理解用户意图
-        使用LLM进行深度语义理解
+        先用本地分类器识别，置信度不够时使用LLM进行深度语义理解
         
         返回:
             {
                 "success": True/False,
                 "action": "动作类型",
                 "parameters": {参数字典},
-                "confidence": 置信度
+                "confidence": 置信度,
+                "source": "local" / "cache" / "llm"（备用规则的结果没有该字段）
             }
         """
-        # 构造prompt，让LLM理解用户意图并返回结构化数据
-        prompt = f"""你是一个智能助手的意图理解模块。请分析用户的指令，返回JSON格式的结果。
+        start = time.perf_counter()
+        intent_result = self.local_classifier.classify(user_input) or self._cached_intent(user_input)
+        if intent_result is None:
+            intent_result = self._llm_understand_intent(user_input)
+            self._cache_intent(user_input, intent_result)
+        self._record_route(intent_result, start)
+        return intent_result
+    
+    async def _aunderstand_intent(self, user_input: str) -> Dict[str, Any]:
+        """_understand_intent 的异步版本"""
+        start = time.perf_counter()
+        intent_result = self.local_classifier.classify(user_input) or self._cached_intent(user_input)
+        if intent_result is None:
+            intent_result = await self._allm_understand_intent(user_input)
+            self._cache_intent(user_input, intent_result)
+        self._record_route(intent_result, start)
+        return intent_result
+    
+    def _cached_intent(self, user_input: str) -> Optional[Dict[str, Any]]:
+        intent_result = self.intent_cache.get(user_input)
+        if intent_result is not None:
+            intent_result["source"] = "cache"
+        return intent_result
+    
+    def _cache_intent(self, user_input: str, intent_result: Dict[str, Any]):
+        # 只缓存LLM成功给出的结果；备用规则的结果（LLM失败时）下次仍应尝试LLM
+        if intent_result.get("success") and intent_result.get("source") == "llm":
+            self.intent_cache.put(user_input, intent_result)
+    
+    def _record_route(self, intent_result: Dict[str, Any], start: float):
+        path = intent_result.get("source", "rules")
+        if path == "local":
+            print(f"⚡ 本地识别意图: {intent_result['action']} (置信度 {intent_result['confidence']})")
+        elif path == "cache":
+            print(f"⚡ 意图缓存命中: {intent_result['action']}")
+        self.route_stats.record(path, time.perf_counter() - start)
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """意图识别路径统计：本地快速识别(local)、LLM(llm)、备用规则(rules)，以及LLM调用的输入token"""
+        stats = self.route_stats.get_stats()
+        stats["threshold"] = self.local_classifier.threshold
+        stats["prompt"] = self.prompt_stats.get_stats()
+        stats["prompt"]["system_prefix_tokens"] = estimate_tokens(self._get_intent_system_prompt())
+        stats["cache"] = self.intent_cache.get_stats()
+        return stats
+    
+    def _llm_understand_intent(self, user_input: str) -> Dict[str, Any]:
+        """使用LLM理解意图"""
+        prompt, history = self._build_intent_prompt(user_input)
+        
+        # 支持流式输出时，action和parameters一完整就结束生成
+        chat_stream = getattr(self.api_client, "chat_stream", None)
+        if chat_stream is not None:
+            parser = IntentStreamParser()
+            deltas = chat_stream(prompt, history)
+            try:
+                for delta in deltas:
+                    if parser.feed(delta) is not None:
+                        break
+            except Exception as e:
+                print(f"⚠️  意图理解流式调用失败: {e}")
+                return self._fallback_intent_understanding(user_input)
+            finally:
+                deltas.close()
+            self.prompt_stats.record(estimate_messages_tokens(history) + estimate_tokens(prompt))
+            return self._parse_intent_stream(parser, user_input)
+        
+        # 调用LLM
+        llm_result = self.api_client.chat(prompt, history)
+        self.prompt_stats.record(estimate_messages_tokens(history) + estimate_tokens(prompt), llm_result.get("usage"))
+        return self._parse_intent_result(llm_result, user_input)
+    
+    async def _allm_understand_intent(self, user_input: str) -> Dict[str, Any]:
+        """_llm_understand_intent 的异步版本，客户端没有achat时放到线程池调用chat"""
+        prompt, history = self._build_intent_prompt(user_input)
+        
+        if hasattr(self.api_client, "achat_stream") or hasattr(self.api_client, "chat_stream"):
+            parser = IntentStreamParser()
+            deltas = astream_chat(self.api_client, prompt, history)
+            try:
+                async for delta in deltas:
+                    if parser.feed(delta) is not None:
+                        break
+            except Exception as e:
+                print(f"⚠️  意图理解流式调用失败: {e}")
+                return self._fallback_intent_understanding(user_input)
+            finally:
+                # 提前结束时断开连接，模型不再继续生成reasoning
+                await deltas.aclose()
+            self.prompt_stats.record(estimate_messages_tokens(history) + estimate_tokens(prompt))
+            return self._parse_intent_stream(parser, user_input)
+        
+        achat = getattr(self.api_client, "achat", None)
+        if achat is not None:
+            llm_result = await achat(prompt, history)
+        else:
+            llm_result = await asyncio.to_thread(self.api_client.chat, prompt, history)
+        self.prompt_stats.record(estimate_messages_tokens(history) + estimate_tokens(prompt), llm_result.get("usage"))
+        return self._parse_intent_result(llm_result, user_input)
+    
+    def _get_intent_system_prompt(self) -> str:
+        """
+        意图理解的系统提示词（含紧凑JSON格式的工具目录）
+        只在工具变化时重建；每次请求的前缀完全相同，支持前缀缓存的服务可以复用
+        """
+        if self._intent_system_prompt is None:
+            catalogue = json.dumps(self.available_tools, ensure_ascii=False, separators=(',', ':'))
+            self._intent_system_prompt = f"""你是一个智能助手的意图理解模块。请分析用户的指令，返回JSON格式的结果。
 
 可用的工具有:
-{json.dumps(self.available_tools, ensure_ascii=False, indent=2)}
-
-用户指令: {user_input}
+{catalogue}
 
 请分析用户意图，返回JSON格式（只返回JSON，不要其他内容）:
-{{
-    "action": "工具名称(从上面的工具列表中选择)",
-    "parameters": {{"参数名": "参数值"}},
-    "reasoning": "为什么选择这个工具"
-}}"""
-        
-        # 调用LLM
-        llm_result = self.api_client.chat(prompt)
+{{"action": "工具名称(从上面的工具列表中选择)", "parameters": {{"参数名": "参数值"}}, "reasoning": "为什么选择这个工具"}}"""
+        return self._intent_system_prompt
+    
+    def _build_intent_prompt(self, user_input: str):
+        """
+        构造让LLM理解用户意图的消息
         
+        返回:
+            (用户消息, 历史消息)：历史消息中只有固定的系统提示词，随请求变化的只有用户消息
+        """
+        history = [{"role": "system", "content": self._get_intent_system_prompt()}]
+        return user_input, history
+    
+    def _parse_intent_result(self, llm_result: Dict[str, Any], user_input: str) -> Dict[str, Any]:
+        """解析LLM返回的意图JSON，失败时使用备用规则"""
         if not llm_result.get("success"):
             # LLM调用失败，使用备用规则
             return self._fallback_intent_understanding(user_input)
@@ -167,23 +324,7 @@ class IntelligentAgent:
             # 尝试提取JSON
             json_match = re.search(r'\{.*\}', content, re.DOTALL)
             if json_match:
-                intent_data = json.loads(json_match.group())
-                action = intent_data.get("action")
-                parameters = intent_data.get("parameters", {})
-                
-                # 如果parameters为空，尝试从intent_data的其他字段提取
-                if not parameters:
-                    for key, value in intent_data.items():
-                        if key not in ['action', 'reasoning', 'confidence']:
-                            parameters[key] = value
-                
-                return {
-                    "success": True,
-                    "action": action,
-                    "parameters": parameters,
-                    "reasoning": intent_data.get("reasoning", ""),
-                    "confidence": 0.9
-                }
+                return self._intent_from_data(json.loads(json_match.group()))
             else:
                 # JSON解析失败，使用备用方案
                 return self._fallback_intent_understanding(user_input)
@@ -192,6 +333,35 @@ class IntelligentAgent:
             print(f"⚠️  意图解析异常: {e}")
             return self._fallback_intent_understanding(user_input)
     
+    def _parse_intent_stream(self, parser: IntentStreamParser, user_input: str) -> Dict[str, Any]:
+        """解析流式输出的意图：增量解析已得到结果时直接使用，否则按完整输出再解析一次"""
+        intent_data = parser.intent
+        if intent_data is None:
+            return self._parse_intent_result({"success": True, "content": parser.text}, user_input)
+        if not parser.closed:
+            print(f"⚡ action和parameters已完整，提前结束生成（已接收 {len(parser.text)} 字符）")
+        return self._intent_from_data(intent_data)
+    
+    def _intent_from_data(self, intent_data: Dict[str, Any]) -> Dict[str, Any]:
+        """LLM返回的意图JSON → 意图结果"""
+        action = intent_data.get("action")
+        parameters = intent_data.get("parameters") or {}
+        
+        # 如果parameters为空，尝试从intent_data的其他字段提取
+        if not parameters:
+            for key, value in intent_data.items():
+                if key not in ['action', 'reasoning', 'confidence']:
+                    parameters[key] = value
+        
+        return {
+            "success": True,
+            "action": action,
+            "parameters": parameters,
+            "reasoning": intent_data.get("reasoning", ""),
+            "confidence": 0.9,
+            "source": "llm"
+        }
+    
     def _fallback_intent_understanding(self, user_input: str) -> Dict[str, Any]:
         """
         备用的意图理解（基于规则）
@@ -386,13 +556,26 @@ class IntelligentAgent:
             "original_input": original_input
         }
     
-    def get_conversation_history(self) -> List[Dict]:
-        """获取对话历史"""
-        return self.conversation_history
+    def get_conversation_history(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
+        """获取一个会话的全部对话历史（从旧到新）"""
+        context = self.sessions.get(session_id)
+        return context.history.to_list() if context else []
+    
+    def get_history_page(self, session_id: str = DEFAULT_SESSION, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """分页获取对话历史（从新到旧），见 SessionHistory.page"""
+        context = self.sessions.get(session_id)
+        if context is None:
+            return {"total": 0, "offset": offset, "limit": limit, "items": []}
+        return context.history.page(offset, limit)
     
-    def clear_history(self):
-        """清空对话历史"""
-        self.conversation_history = []
+    def clear_history(self, session_id: str = None):
+        """清空对话历史，不传session_id时删除所有会话"""
+        if session_id is None:
+            self.sessions.remove()
+            return
+        context = self.sessions.get(session_id)
+        if context is not None:
+            context.history.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+意图缓存
+以规范化后的用户指令为键缓存LLM的意图理解结果（带过期时间、LRU淘汰），
+重复的指令（"打开百度"、"播放稻香"）直接命中，不再调用LLM；
+可选按字符二元组相似度查找近似指令
+"""
+
+import copy
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from intent_router import char_bigrams
+
+try:
+    import opencc
+    _t2s = opencc.OpenCC('t2s').convert
+except ImportError:  # 可选依赖：未安装时只用下面的常用字对照表做繁简转换
+    _t2s = None
+
+# 语音指令中常见的繁体字 → 简体字
+TRADITIONAL_TO_SIMPLIFIED = str.maketrans(
+    "開啟關閉網頁訪問瀏覽搜尋詢查寫篇於碼聲調檔變樂歌曲聽請幫幾點時間資訊給讓這說裡書電視腦體"
+    "頻視窗個們麼為與實現類語學習將進應該過還運動圖片設置屬廣灣華盡擇選數據庫線圓風飛機場車東"
+    "紹氣題務覺錄記節報義會歡愛專業傳統經濟藝術職級單雙買賣價錢溫陽陰雲課號紀緒",
+    "开启关闭网页访问浏览搜寻询查写篇于码声调档变乐歌曲听请帮几点时间资讯给让这说里书电视脑体"
+    "频视窗个们么为与实现类语学习将进应该过还运动图片设置属广湾华尽择选数据库线圆风飞机场车东"
+    "绍气题务觉录记节报义会欢爱专业传统经济艺术职级单双买卖价钱温阳阴云课号纪绪"
+)
+
+PUNCTUATION_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def normalize_utterance(text: str) -> str:
+    """规范化指令：全角转半角、转小写、繁体转简体、去掉标点和空白"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = _t2s(text) if _t2s is not None else text.translate(TRADITIONAL_TO_SIMPLIFIED)
+    return PUNCTUATION_PATTERN.sub('', text)
+
+
+def _cosine(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+class IntentCache:
+    """带过期时间的LRU意图缓存"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0,
+                 similarity_threshold: Optional[float] = None):
+        """
+        参数:
+            max_entries: 最多缓存的指令数，超出时淘汰最久未使用的
+            ttl: 缓存有效期（秒）
+            similarity_threshold: 近似查找的余弦相似度阈值，None表示只做精确匹配
+                                  （阈值过低时"播放稻香"可能命中"播放七里香"，建议0.9以上）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        # 规范化指令 → (意图, 过期时间, 二元组)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        """查找缓存，未命中返回None"""
+        key = normalize_utterance(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+
+            if self.similarity_threshold is not None:
+                key, entry = self._nearest(key, now)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.near_hits += 1
+                    return copy.deepcopy(entry[0])
+
+            self.misses += 1
+            return None
+
+    def _nearest(self, key: str, now: float):
+        """最相似的未过期条目（调用方持有锁）"""
+        grams = char_bigrams(key)
+        best_key, best_entry, best_score = None, None, self.similarity_threshold
+        for other, entry in self._entries.items():
+            if entry[1] <= now:
+                continue
+            score = _cosine(grams, entry[2])
+            if score >= best_score:
+                best_key, best_entry, best_score = other, entry, score
+        return best_key, best_entry
+
+    def put(self, text: str, intent: Dict[str, Any]):
+        """缓存一条意图"""
+        key = normalize_utterance(text)
+        if not key:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (copy.deepcopy(intent), time.monotonic() + self.ttl, char_bigrams(key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（工具变化后旧的意图可能不再有效）"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "ttl": self.ttl,
+                "similarity_threshold": self.similarity_threshold
+            }
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地快速意图识别
+用工具注册表中的示例语句构建字符二元组(bigram)特征：先去掉实体和参数（网站名、歌名、搜索词等），
+只比较剩下的句式，按IDF加权计算与每条示例的F1（示例被覆盖的比例和输入中与示例相符的比例）；
+置信度足够高、且参数能直接从原文中取出时，不经过LLM直接返回意图，其余输入仍交给LLM。
+含否定、停止等词的输入（"不要播放"、"别打开"、"打不开"）一律交给LLM；
+歌名、搜索词等参数中含疑问词时（"播放列表在哪"、"搜索引擎是什么"）不算取到参数，
+这段文字留在句式中参与打分，同样交给LLM
+"""
+
+import math
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+# 可直接识别的网站：(名称, URL, 别名)
+KNOWN_SITES = [
+    ("GitHub", "https://github.com", ("github",)),
+    ("百度", "https://www.baidu.com", ("百度", "baidu")),
+    ("谷歌", "https://www.google.com", ("谷歌", "google")),
+    ("知乎", "https://www.zhihu.com", ("知乎", "zhihu")),
+    ("哔哩哔哩", "https://www.bilibili.com", ("哔哩哔哩", "b站", "bilibili")),
+    ("淘宝", "https://www.taobao.com", ("淘宝", "taobao")),
+]
+
+# 提取参数时去掉的礼貌用语和动词
+FILLER_WORDS = ("帮我", "麻烦", "请你", "请", "给我", "我想", "我要", "一下")
+MUSIC_VERBS = ("来一首", "播放", "放一首", "我想听", "听", "放")
+SEARCH_VERBS = ("搜一下", "搜索", "查询", "查找", "查一下", "搜")
+ARTICLE_VERBS = ("写一篇", "写篇", "创作", "撰写", "写")
+CODE_LANGUAGES = ("python", "javascript", "typescript", "java", "c++", "go", "rust", "shell")
+CODE_LANGUAGE_PATTERN = re.compile(
+    r'(?<![a-z])(' + '|'.join(re.escape(lang) for lang in CODE_LANGUAGES) + r')(?![a-z+])'
+)
+
+# 否定、停止类的词：本地分类器只认正向指令，这类输入的意思常与句式相反
+NEGATION_PATTERN = re.compile(r'[不别没勿]|停|取消')
+
+# 疑问词：出现在参数里时，输入多半是在提问而不是下指令（"播放列表在哪"的"列表在哪"不是歌名）
+QUESTION_PATTERN = re.compile(r'在哪|哪里|哪儿|什么|怎么|怎样|如何|为啥|多少|吗|呢')
+
+DOMAIN_PATTERN = re.compile(r'(https?://[^\s，。]+|(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,})')
+PUNCTUATION = "，。！？,.!?、 "
+
+
+def char_bigrams(text: str) -> set:
+    """去掉空白、转小写后的字符二元组集合"""
+    text = re.sub(r'\s+', '', text.lower())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def mask_entities(text: str) -> str:
+    """去掉网站名、域名等实体，只留下句式（"打开GitHub"与"打开知乎"特征相同）"""
+    text = DOMAIN_PATTERN.sub("", text.lower())
+    for _, _, aliases in KNOWN_SITES:
+        for alias in aliases:
+            text = text.replace(alias, "")
+    return text
+
+
+def _strip_words(text: str, words, once: bool = False) -> str:
+    """
+    去掉开头的words（只去前缀，不动句中的字，避免把"听说"的"听"当作动词去掉）
+    once为True时只去掉一个（动词只有一个，"播放听海"的"听"属于歌名）
+    """
+    text = text.strip(PUNCTUATION)
+    words = sorted(words, key=len, reverse=True)
+    stripped = True
+    while stripped:
+        stripped = False
+        for word in words:
+            if word and text.startswith(word):
+                text = text[len(word):].lstrip(PUNCTUATION)
+                stripped = not once
+                break
+    return text.strip(PUNCTUATION)
+
+
+class LocalIntentClassifier:
+    """基于工具示例的本地意图分类器"""
+
+    def __init__(self, tools: Dict[str, Dict], threshold: float = 0.6, margin: float = 0.15):
+        """
+        参数:
+            tools: 工具注册表（IntelligentAgent.available_tools），使用其中的 name 和 examples
+            threshold: 置信度达到该值才走快速路径
+            margin: 第一名与第二名得分之差小于该值视为有歧义，置信度减半
+        """
+        self.threshold = threshold
+        self.margin = margin
+        self.extractors = {
+            "open_website": self._extract_website,
+            "play_music": self._extract_music,
+            "web_search": self._extract_search,
+            "write_article": self._extract_article,
+            "generate_code": self._extract_code,
+        }
+        self.build(tools)
+
+    def build(self, tools: Dict[str, Dict]):
+        """根据工具注册表重建特征（工具变化时调用）"""
+        self.phrases: List[Tuple[str, set]] = []
+        tool_grams: Dict[str, set] = {}
+        for tool, spec in tools.items():
+            for phrase in list(spec.get("examples", [])) + [spec.get("name", "")]:
+                grams = char_bigrams(self._template(tool, phrase))
+                if grams:
+                    self.phrases.append((tool, grams))
+                    tool_grams.setdefault(tool, set()).update(grams)
+
+        # 只在少数工具中出现的二元组区分度高，权重大；示例中没有的二元组按最高权重计
+        n_tools = max(1, len(tool_grams))
+        df: Dict[str, int] = {}
+        for grams in tool_grams.values():
+            for gram in grams:
+                df[gram] = df.get(gram, 0) + 1
+        self.idf = {gram: math.log(1 + n_tools / count) for gram, count in df.items()}
+        self.unseen_idf = math.log(1 + n_tools)
+
+    def _template(self, tool: str, text: str) -> str:
+        """
+        去掉实体和该工具能提取出的参数值后剩下的句式（"播放稻香" → "播放"）
+        取不出参数（如参数含疑问词）时不去掉任何内容，多出的文字降低打分的精确率
+        """
+        template = _strip_words(mask_entities(text), FILLER_WORDS)
+        extractor = self.extractors.get(tool)
+        parameters = extractor(text) if extractor else None
+        for value in (parameters or {}).values():
+            value = str(value).lower()
+            if value and value != template:
+                template = template.replace(value, "")
+        return template
+
+    def _weight(self, grams: set) -> float:
+        return sum(self.idf.get(g, self.unseen_idf) for g in grams)
+
+    def score(self, text: str) -> List[Tuple[str, float]]:
+        """
+        每个工具的得分，从高到低：输入句式与该工具最相符的一条示例的加权F1
+        （召回：示例被输入覆盖的比例；精确：输入中与示例相符的比例，多出无关内容时降低）
+        """
+        templates: Dict[str, set] = {}
+        best: Dict[str, float] = {}
+        for tool, phrase_grams in self.phrases:
+            if tool not in templates:
+                templates[tool] = char_bigrams(self._template(tool, text))
+            grams = templates[tool]
+            covered = self._weight(phrase_grams & grams)
+            if not covered:
+                continue
+            recall = covered / self._weight(phrase_grams)
+            precision = covered / self._weight(grams)
+            score = 2 * recall * precision / (recall + precision)
+            if score > best.get(tool, 0.0):
+                best[tool] = score
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)
+
+    def classify(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        置信度达到阈值时返回意图，否则返回None（交给LLM）
+
+        返回:
+            {"success": True, "action", "parameters", "confidence", "source": "local"}
+        """
+        if NEGATION_PATTERN.search(text):
+            return None
+
+        scores = self.score(text)
+        if not scores:
+            return None
+        action, confidence = scores[0]
+        if len(scores) > 1 and confidence - scores[1][1] < self.margin:
+            confidence *= 0.5
+
+        extractor = self.extractors.get(action)
+        parameters = extractor(text) if extractor else None
+        if parameters is None or confidence < self.threshold:
+            return None
+
+        return {
+            "success": True,
+            "action": action,
+            "parameters": parameters,
+            "confidence": round(confidence, 3),
+            "source": "local"
+        }
+
+    # ------------------------------------------------------------
+    # 参数提取：取不出必需参数时返回None
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _extract_website(text: str) -> Optional[Dict[str, Any]]:
+        lower = text.lower()
+        for name, url, aliases in KNOWN_SITES:
+            if any(alias in lower for alias in aliases):
+                return {"url": url, "target_name": name}
+        match = DOMAIN_PATTERN.search(text)
+        if match:
+            url = match.group(1)
+            return {"url": url if url.startswith("http") else f"https://{url}", "target_name": url}
+        return None
+
+    @staticmethod
+    def _extract_music(text: str) -> Optional[Dict[str, Any]]:
+        rest = _strip_words(_strip_words(text, FILLER_WORDS), MUSIC_VERBS, once=True)
+        if QUESTION_PATTERN.search(rest):
+            return None
+        artist = ""
+        song_name = rest
+        if "的" in rest:
+            artist, song_name = [part.strip() for part in rest.split("的", 1)]
+        if song_name in ("", "歌", "歌曲", "音乐", "一首歌"):
+            song_name = "未指定"
+        return {"song_name": song_name, "artist": artist}
+
+    @staticmethod
+    def _extract_search(text: str) -> Optional[Dict[str, Any]]:
+        query = _strip_words(_strip_words(text, FILLER_WORDS), SEARCH_VERBS, once=True)
+        if not query or QUESTION_PATTERN.search(query):
+            return None
+        return {"query": query}
+
+    @staticmethod
+    def _extract_article(text: str) -> Optional[Dict[str, Any]]:
+        match = re.search(r'关于(.+?)的', text)
+        if match:
+            topic = match.group(1).strip()
+        else:
+            topic = _strip_words(_strip_words(text, FILLER_WORDS), ARTICLE_VERBS, once=True)
+            topic = re.sub(r'的?文章$', '', topic).strip(PUNCTUATION)
+        if not topic or QUESTION_PATTERN.search(topic):
+            return None
+        return {"topic": topic, "length": "medium"}
+
+    @staticmethod
+    def _extract_code(text: str) -> Optional[Dict[str, Any]]:
+        match = CODE_LANGUAGE_PATTERN.search(text.lower())
+        language = match.group(1) if match else "python"
+        return {"requirements": text, "language": language}
+
+
+class RouteStats:
+    """意图识别各路径（local / llm / rules）的请求数和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._seconds: Dict[str, float] = {}
+
+    def record(self, path: str, seconds: float):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+            self._seconds[path] = self._seconds.get(path, 0.0) + seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        返回:
+            {"total": 总数, "paths": {路径: {"count", "ratio", "avg_ms"}}}
+        """
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                "total": total,
+                "paths": {
+                    path: {
+                        "count": count,
+                        "ratio": round(count / total, 4),
+                        "avg_ms": round(self._seconds[path] / count * 1000, 3)
+                    }
+                    for path, count in self._counts.items()
+                }
+            }
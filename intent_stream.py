@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+意图JSON的增量解析
+大模型逐段输出 {"action": ..., "parameters": {...}, "reasoning": ...} 时，
+action 和 parameters 一完整就可以开始执行，不必等模型把 reasoning 写完
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+REQUIRED_FIELDS = ("action", "parameters")
+
+
+class IntentStreamParser:
+    """
+    逐段输入模型输出，增量扫描第一个顶层JSON对象
+    每个顶层字段的值一结束就解析出来；必需字段齐全或对象结束时 intent 可用
+    对象之前的内容（如 ```json 代码块标记、说明文字）会被跳过
+    """
+
+    def __init__(self, required=REQUIRED_FIELDS):
+        self.required = tuple(required)
+        self.fields: Dict[str, Any] = {}
+        self.closed = False  # 顶层对象已结束
+        self.text = ""
+
+        self._pos = 0
+        self._start = -1  # 顶层对象的起始位置
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token_start = -1  # 当前字符串（键或值）的起始位置
+        self._key: Optional[str] = None
+        self._value_start = -1
+
+    @property
+    def complete(self) -> bool:
+        """是否已经可以开始执行"""
+        return self.closed or all(name in self.fields for name in self.required)
+
+    @property
+    def intent(self) -> Optional[Dict[str, Any]]:
+        """已解析出的顶层字段，尚不完整时返回None"""
+        return dict(self.fields) if self.complete else None
+
+    def feed(self, text: str) -> Optional[Dict[str, Any]]:
+        """输入一段模型输出，返回 intent（尚不完整时为None）"""
+        self.text += text
+        if not self.complete:
+            self._scan()
+        return self.intent
+
+    def _finish_value(self, end: int):
+        """当前顶层字段的值在end处结束，解析并记录"""
+        if self._key is not None and self._value_start >= 0:
+            raw = self.text[self._value_start:end].strip()
+            try:
+                self.fields[self._key] = json.loads(raw)
+            except ValueError:
+                pass
+        self._key = None
+        self._value_start = -1
+
+    def _scan(self):
+        text = self.text
+        while self._pos < len(text) and not self.complete:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if self._start < 0:
+                if ch == '{':
+                    self._start = i
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._value_start < 0:
+                            # 顶层的键
+                            self._key = json.loads(text[self._token_start:i + 1])
+                        else:
+                            self._finish_value(i + 1)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._token_start = i
+                if self._depth == 1 and self._key is not None and self._value_start < 0:
+                    self._value_start = i
+            elif ch in '{[':
+                if self._depth == 1 and self._key is not None and self._value_start < 0:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1:
+                    self._finish_value(i + 1)
+                elif self._depth == 0:
+                    # 数字、true/false/null 等在对象结束时才结束
+                    self._finish_value(i)
+                    self.closed = True
+            elif self._depth == 1:
+                if ch == ',':
+                    self._finish_value(i)
+                elif ch == ':':
+                    self._value_start = -1
+                elif not ch.isspace() and self._key is not None and self._value_start < 0:
+                    self._value_start = i
@@ -4,9 +4,11 @@
 通用LLM客户端 - 支持多种大模型API
 """
 
-import requests
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
+
+from http_pool import HTTPSessionPool, get_shared_pool
+from llm_stream import LLMStreamError, iter_content_deltas, error_message
 
 
 class OpenAICompatibleClient:
@@ -15,15 +17,18 @@ class OpenAICompatibleClient:
     支持：OpenAI、DeepSeek、硅基流动等
     """
     
-    def __init__(self, api_key: str, base_url: str = "https://api.siliconflow.cn/v1"):
+    def __init__(self, api_key: str, base_url: str = "https://api.siliconflow.cn/v1",
+                 http_pool: HTTPSessionPool = None):
         """
         初始化客户端
         
         参数:
             api_key: API密钥
             base_url: API基础URL（默认使用硅基流动）
+            http_pool: HTTP连接池，不传则使用进程内共享连接池
         """
         self.api_key = api_key
+        self.http = http_pool or get_shared_pool()
         self.base_url = base_url.rstrip('/')
         self.model = "deepseek-ai/DeepSeek-V2.5"  # 默认模型
         
@@ -45,27 +50,10 @@ class OpenAICompatibleClient:
                 "error": "错误信息(如果有)"
             }
         """
-        url = f"{self.base_url}/chat/completions"
-        
-        # 构建消息列表
-        messages = history or []
-        messages.append({"role": "user", "content": message})
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 2000,
-            "stream": False
-        }
+        url, headers, payload = self._build_chat_request(message, history, stream=False)
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self.http.post(url, headers=headers, json=payload, timeout=30)
             result = response.json()
             
             if "choices" in result and len(result["choices"]) > 0:
@@ -91,6 +79,43 @@ class OpenAICompatibleClient:
                 "error": f"API调用异常: {str(e)}"
             }
     
+    def chat_stream(self, message: str, history: List[Dict] = None) -> Iterator[str]:
+        """
+        流式对话：以SSE方式请求，逐段产出回复内容
+        提前关闭生成器会断开连接
+        
+        异常:
+            LLMStreamError: 接口返回错误
+        """
+        url, headers, payload = self._build_chat_request(message, history, stream=True)
+        
+        with self.http.post(url, headers=headers, json=payload, timeout=(10, 30), stream=True) as response:
+            if response.status_code != 200:
+                raise LLMStreamError(error_message(response.status_code, response.content))
+            yield from iter_content_deltas(response.iter_lines(chunk_size=None))
+    
+    def _build_chat_request(self, message: str, history: List[Dict], stream: bool):
+        """构建对话请求的URL、请求头和payload"""
+        url = f"{self.base_url}/chat/completions"
+        
+        # 构建消息列表（复制一份，避免修改调用方的history）
+        messages = list(history or [])
+        messages.append({"role": "user", "content": message})
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 2000,
+            "stream": stream
+        }
+        return url, headers, payload
+    
     def speech_recognition(self, audio_data: bytes, format: str = "pcm", rate: int = 16000) -> Dict[str, Any]:
         """
         语音识别（需要单独的ASR服务）
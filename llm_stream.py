@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型流式输出(SSE)工具
+解析OpenAI兼容接口 "stream": true 时返回的 Server-Sent Events，逐段取出回复内容增量
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+SSE_DONE = "[DONE]"
+
+
+class LLMStreamError(Exception):
+    """流式对话失败（接口返回错误，或流中途出现错误事件）"""
+
+
+class SSEParser:
+    """
+    逐行解析SSE，事件结束（空行）时返回该事件的data内容
+    多行data按SSE规范用换行拼接，注释行和其它字段忽略；收到 [DONE] 后 done 为True
+    """
+
+    def __init__(self):
+        self.done = False
+        self._data: List[str] = []
+
+    def feed_line(self, line: Union[bytes, str]) -> Optional[str]:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+        if line.startswith('data:'):
+            value = line[5:]
+            self._data.append(value[1:] if value.startswith(' ') else value)
+            return None
+        if line:
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[str]:
+        """结束当前事件（流在没有空行的情况下结束时调用）"""
+        if not self._data:
+            return None
+        payload = "\n".join(self._data)
+        self._data = []
+        if payload == SSE_DONE:
+            self.done = True
+            return None
+        return payload
+
+
+def delta_content(payload: str) -> str:
+    """取出一个流式事件中的回复增量（没有内容时返回空字符串）"""
+    event = json.loads(payload)
+    if event.get("error"):
+        error = event["error"]
+        raise LLMStreamError(error.get("message", "未知错误") if isinstance(error, dict) else str(error))
+    choices = event.get("choices") or []
+    if not choices:
+        return ""
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+def iter_content_deltas(lines: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """SSE文本行 → 非空的回复增量，遇到 [DONE] 结束"""
+    parser = SSEParser()
+    for line in lines:
+        payload = parser.feed_line(line)
+        if parser.done:
+            return
+        if payload is not None:
+            content = delta_content(payload)
+            if content:
+                yield content
+    payload = parser.flush()
+    content = delta_content(payload) if payload is not None else ""
+    if content:
+        yield content
+
+
+async def aiter_content_deltas(lines: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """iter_content_deltas 的异步版本（如 aiohttp 的 response.content）"""
+    parser = SSEParser()
+    async for line in lines:
+        payload = parser.feed_line(line)
+        if parser.done:
+            return
+        if payload is not None:
+            content = delta_content(payload)
+            if content:
+                yield content
+    payload = parser.flush()
+    content = delta_content(payload) if payload is not None else ""
+    if content:
+        yield content
+
+
+def error_message(status_code: int, body: Union[bytes, str]) -> str:
+    """非200响应的错误信息"""
+    try:
+        error = json.loads(body).get("error", {})
+        if isinstance(error, dict) and error.get("message"):
+            return error["message"]
+    except (ValueError, AttributeError):
+        pass
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    return f"HTTP {status_code}: {body[:200]}"
+
+
+async def astream_in_thread(factory: Callable[..., Iterator[str]], *args) -> AsyncIterator[str]:
+    """把阻塞的同步生成器放到线程池中逐个取值，包装成异步生成器"""
+    iterator = factory(*args)
+    done = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        try:
+            iterator.close()
+        except ValueError:  # 线程中仍在读取，读取结束后由线程自然退出
+            pass
+
+
+async def astream_chat(client, message: str, history: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+    """
+    以流式方式调用任意LLM客户端，逐段产出回复内容
+    优先使用 achat_stream，其次在线程中使用 chat_stream；都没有时调用 chat 一次性产出完整回复
+
+    异常:
+        LLMStreamError: 对话失败
+    """
+    achat_stream = getattr(client, "achat_stream", None)
+    if achat_stream is not None:
+        async for delta in achat_stream(message, history):
+            yield delta
+        return
+
+    chat_stream = getattr(client, "chat_stream", None)
+    if chat_stream is not None:
+        async for delta in astream_in_thread(chat_stream, message, history):
+            yield delta
+        return
+
+    result = await asyncio.to_thread(client.chat, message, history)
+    if not result.get('success'):
+        raise LLMStreamError(result.get('error') or "对话失败")
+    if result.get('content'):
+        yield result['content']
@@ -5,25 +5,38 @@
 支持：语音识别(ASR)、语音合成(TTS)、大模型对话
 """
 
-import requests
+import asyncio
 import json
 import base64
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, AsyncIterator
+
+from http_pool import HTTPSessionPool, get_shared_pool
+from llm_stream import LLMStreamError, iter_content_deltas, aiter_content_deltas, astream_in_thread, error_message
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖：未安装时异步接口回退到线程池执行同步请求
+    aiohttp = None
 
 
 class QiniuAPIClient:
     """七牛云AI API客户端"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, http_pool: HTTPSessionPool = None, model: str = "deepseek-v3"):
         """
         初始化七牛云API客户端
         
         参数:
             api_key: 七牛云 AI API KEY
+            http_pool: HTTP连接池，不传则使用进程内共享连接池
+            model: 对话使用的模型，各对话方法未指定model时使用
         """
         self.api_key = api_key
+        self.model = model
+        self.http = http_pool or get_shared_pool()
         self.base_url = "https://openai.qiniu.com/v1"
         self.backup_url = "https://api.qnaigc.com/v1"
+        self._async_session = None
         
         print(f"✅ 已配置七牛云API")
         print(f"🔑 API Key: {api_key[:20]}...")
@@ -35,14 +48,14 @@ class QiniuAPIClient:
             "Content-Type": "application/json"
         }
     
-    def chat(self, message: str, history: List[Dict] = None, model: str = "deepseek-v3") -> Dict[str, Any]:
+    def chat(self, message: str, history: List[Dict] = None, model: str = None) -> Dict[str, Any]:
         """
         调用大模型进行对话（使用OpenAI兼容接口）
         
         参数:
             message: 用户消息
             history: 对话历史
-            model: 模型名称，默认 deepseek-v3
+            model: 模型名称，默认使用 self.model
         
         返回:
             {
@@ -51,44 +64,111 @@ class QiniuAPIClient:
                 "error": "错误信息(如果有)"
             }
         """
+        url, payload = self._build_chat_request(message, history, model)
+        
+        try:
+            response = self.http.post(url, headers=self._get_headers(), json=payload, timeout=30)
+            return self._parse_chat_result(response.json())
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"API调用异常: {str(e)}"
+            }
+    
+    async def achat(self, message: str, history: List[Dict] = None, model: str = None) -> Dict[str, Any]:
+        """chat 的异步版本，返回格式相同"""
+        if aiohttp is None:
+            return await asyncio.to_thread(self.chat, message, history, model)
+        
+        url, payload = self._build_chat_request(message, history, model)
+        
+        try:
+            result = await self._apost_json(url, payload, timeout=30)
+            return self._parse_chat_result(result)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"API调用异常: {str(e)}"
+            }
+    
+    def chat_stream(self, message: str, history: List[Dict] = None,
+                    model: str = None) -> Iterator[str]:
+        """
+        流式对话：以SSE方式请求，逐段产出回复内容（首个token到达即可处理）
+        提前关闭生成器会断开连接，模型停止生成
+        
+        异常:
+            LLMStreamError: 接口返回错误
+        """
+        url, payload = self._build_chat_request(message, history, model, stream=True)
+        
+        # 读超时针对相邻两段数据之间的间隔，而不是整个回复
+        with self.http.post(url, headers=self._get_headers(), json=payload,
+                            timeout=(10, 30), stream=True) as response:
+            if response.status_code != 200:
+                raise LLMStreamError(error_message(response.status_code, response.content))
+            # chunk_size=None：数据到达即处理，不等凑满缓冲区
+            yield from iter_content_deltas(response.iter_lines(chunk_size=None))
+    
+    async def achat_stream(self, message: str, history: List[Dict] = None,
+                           model: str = None) -> AsyncIterator[str]:
+        """chat_stream 的异步版本"""
+        if aiohttp is None:
+            async for delta in astream_in_thread(self.chat_stream, message, history, model):
+                yield delta
+            return
+        
+        url, payload = self._build_chat_request(message, history, model, stream=True)
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = self.http.create_async_session()
+        
+        async with self._async_session.post(
+            url,
+            headers=self._get_headers(),
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+        ) as response:
+            if response.status != 200:
+                raise LLMStreamError(error_message(response.status, await response.read()))
+            async for delta in aiter_content_deltas(response.content):
+                yield delta
+    
+    def _build_chat_request(self, message: str, history: List[Dict], model: str, stream: bool = False):
+        """构建对话请求的URL和payload"""
         url = f"{self.base_url}/chat/completions"
         
-        # 构建消息列表
-        messages = history or []
+        # 构建消息列表（复制一份，避免修改调用方的history）
+        messages = list(history or [])
         messages.append({"role": "user", "content": message})
         
         payload = {
-            "model": model,
+            "model": model or self.model,
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 2000
         }
-        
-        try:
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=30)
-            result = response.json()
-            
-            if "choices" in result and len(result["choices"]) > 0:
-                content = result["choices"][0]["message"]["content"]
-                return {
-                    "success": True,
-                    "content": content,
-                    "usage": result.get("usage", {})
-                }
-            elif "error" in result:
-                return {
-                    "success": False,
-                    "error": result["error"].get("message", "未知错误")
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"API返回格式异常: {result}"
-                }
-        except Exception as e:
+        if stream:
+            payload["stream"] = True
+        return url, payload
+    
+    def _parse_chat_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """解析对话接口的返回"""
+        if "choices" in result and len(result["choices"]) > 0:
+            content = result["choices"][0]["message"]["content"]
+            return {
+                "success": True,
+                "content": content,
+                "usage": result.get("usage", {})
+            }
+        elif "error" in result:
             return {
                 "success": False,
-                "error": f"API调用异常: {str(e)}"
+                "error": result["error"].get("message", "未知错误")
+            }
+        else:
+            return {
+                "success": False,
+                "error": f"API返回格式异常: {result}"
             }
     
     def speech_recognition(self, audio_url: str, audio_format: str = "mp3") -> Dict[str, Any]:
@@ -117,7 +197,7 @@ class QiniuAPIClient:
         }
         
         try:
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=30)
+            response = self.http.post(url, headers=self._get_headers(), json=payload, timeout=30)
             result = response.json()
             
             if "data" in result and "result" in result["data"]:
@@ -157,6 +237,36 @@ class QiniuAPIClient:
                 "error": "错误信息(如果有)"
             }
         """
+        url, payload = self._build_tts_request(text, voice_type, encoding, speed_ratio)
+        
+        try:
+            response = self.http.post(url, headers=self._get_headers(), json=payload, timeout=30)
+            return self._parse_tts_result(response.json())
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"语音合成异常: {str(e)}"
+            }
+    
+    async def atext_to_speech(self, text: str, voice_type: str = "qiniu_zh_female_tmjxxy",
+                              encoding: str = "mp3", speed_ratio: float = 1.0) -> Dict[str, Any]:
+        """text_to_speech 的异步版本，返回格式相同"""
+        if aiohttp is None:
+            return await asyncio.to_thread(self.text_to_speech, text, voice_type, encoding, speed_ratio)
+        
+        url, payload = self._build_tts_request(text, voice_type, encoding, speed_ratio)
+        
+        try:
+            result = await self._apost_json(url, payload, timeout=30)
+            return self._parse_tts_result(result)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"语音合成异常: {str(e)}"
+            }
+    
+    def _build_tts_request(self, text: str, voice_type: str, encoding: str, speed_ratio: float):
+        """构建语音合成请求的URL和payload"""
         url = f"{self.base_url}/voice/tts"
         
         payload = {
@@ -169,33 +279,46 @@ class QiniuAPIClient:
                 "text": text
             }
         }
-        
-        try:
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=30)
-            result = response.json()
+        return url, payload
+    
+    def _parse_tts_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """解析语音合成接口的返回"""
+        if "data" in result:
+            # data字段是base64编码的音频数据
+            audio_base64 = result["data"]
+            duration = result.get("addition", {}).get("duration", "0")
             
-            if "data" in result:
-                # data字段是base64编码的音频数据
-                audio_base64 = result["data"]
-                duration = result.get("addition", {}).get("duration", "0")
-                
-                return {
-                    "success": True,
-                    "audio_data": audio_base64,  # 已经是base64格式
-                    "duration": duration,
-                    "reqid": result.get("reqid", "")
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": result.get("error", "合成失败")
-                }
-        except Exception as e:
+            return {
+                "success": True,
+                "audio_data": audio_base64,  # 已经是base64格式
+                "duration": duration,
+                "reqid": result.get("reqid", "")
+            }
+        else:
             return {
                 "success": False,
-                "error": f"语音合成异常: {str(e)}"
+                "error": result.get("error", "合成失败")
             }
     
+    async def _apost_json(self, url: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """使用aiohttp发送JSON POST请求并返回解析后的JSON"""
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = self.http.create_async_session()
+        
+        async with self._async_session.post(
+            url,
+            headers=self._get_headers(),
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            return await response.json(content_type=None)
+    
+    async def aclose(self):
+        """关闭异步HTTP会话"""
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+    
     def get_voice_list(self) -> Dict[str, Any]:
         """
         获取可用的音色列表
@@ -210,7 +333,7 @@ class QiniuAPIClient:
         url = f"{self.base_url}/voice/list"
         
         try:
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self.http.get(url, headers=self._get_headers(), timeout=10)
             voices = response.json()
             
             if isinstance(voices, list):
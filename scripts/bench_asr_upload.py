@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+讯飞ASR上传模式基准测试
+对比实时间隔发送(realtime)与完整音频突发发送(burst)的端到端识别延迟
+
+用法:
+    export XUNFEI_APPID=... XUNFEI_API_KEY=... XUNFEI_API_SECRET=...
+    python3 scripts/bench_asr_upload.py sample.wav --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xunfei_asr_official import XunfeiASROfficial, UPLOAD_REALTIME, UPLOAD_BURST, load_pcm
+
+
+def run_mode(client: XunfeiASROfficial, audio_data: bytes, upload_mode: str, runs: int):
+    """多次识别，返回 (耗时列表, 最后一次识别文本, 失败次数)"""
+    latencies = []
+    text = ""
+    failures = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = client.recognize(audio_data, upload_mode)
+        latencies.append(time.perf_counter() - start)
+        if result.get("success"):
+            text = result.get("text", "")
+        else:
+            failures += 1
+    return latencies, text, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="讯飞ASR上传模式基准测试")
+    parser.add_argument("audio", help="16bit单声道 WAV或16kHz PCM文件")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的识别次数")
+    parser.add_argument("--pool-size", type=int, default=1, help="预热连接数")
+    args = parser.parse_args()
+
+    appid = os.environ.get("XUNFEI_APPID")
+    api_key = os.environ.get("XUNFEI_API_KEY")
+    api_secret = os.environ.get("XUNFEI_API_SECRET")
+    if not (appid and api_key and api_secret):
+        print("❌ 请设置环境变量 XUNFEI_APPID / XUNFEI_API_KEY / XUNFEI_API_SECRET")
+        return 1
+
+    with open(args.audio, "rb") as f:
+        audio_data = f.read()
+
+    # 16bit 单声道：每秒 采样率*2 字节
+    pcm, sample_rate = load_pcm(audio_data)
+    duration = len(pcm) / (sample_rate * 2)
+    client = XunfeiASROfficial(appid, api_key, api_secret, pool_size=args.pool_size)
+    time.sleep(1)  # 等待预热连接建立，两种模式条件一致
+
+    print("=" * 60)
+    print(f"音频: {args.audio}  时长约 {duration:.2f}s  每种模式 {args.runs} 次")
+    print("=" * 60)
+
+    summary = {}
+    for mode in (UPLOAD_REALTIME, UPLOAD_BURST):
+        latencies, text, failures = run_mode(client, audio_data, mode, args.runs)
+        summary[mode] = statistics.median(latencies)
+        print(f"\n【{mode}】 失败 {failures}/{args.runs}  识别文本: {text}")
+        print(f"  平均 {statistics.mean(latencies) * 1000:.0f} ms  "
+              f"中位数 {statistics.median(latencies) * 1000:.0f} ms  "
+              f"最小 {min(latencies) * 1000:.0f} ms  最大 {max(latencies) * 1000:.0f} ms")
+
+    saved = summary[UPLOAD_REALTIME] - summary[UPLOAD_BURST]
+    print(f"\n突发模式中位数延迟减少 {saved * 1000:.0f} ms")
+    client.connection_pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话管理
+每个会话只保存轻量的上下文（对话历史、最近一次意图、活动时间），
+API客户端、工具注册表、各类缓存等重量级对象由所有会话共享，只有一份；
+会话数有上限，长时间不活动的会话自动淘汰，并统计内存占用
+"""
+
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from conversation_history import SessionHistory
+
+DEFAULT_SESSION = "default"
+
+
+class SessionContext:
+    """一个会话的上下文"""
+
+    __slots__ = ("session_id", "created_at", "last_active", "requests", "history", "last_intent")
+
+    def __init__(self, session_id: str, max_turns: int):
+        now = time.time()
+        self.session_id = session_id
+        self.created_at = now
+        self.last_active = now
+        self.requests = 0
+        self.history = SessionHistory(max_turns)
+        self.last_intent: Optional[Dict[str, Any]] = None  # 最近一次识别出的意图 {"action", "parameters"}
+
+    def size(self) -> int:
+        """占用的字节数（含对话历史）"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.session_id) + self.history.size()
+                + (sys.getsizeof(self.last_intent) if self.last_intent else 0))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "last_active": self.last_active,
+            "requests": self.requests,
+            "turns": len(self.history)
+        }
+
+
+class SessionManager:
+    """按会话ID管理会话上下文"""
+
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 1800.0,
+                 max_turns: int = 50, sweep_interval: float = 60.0):
+        """
+        参数:
+            max_sessions: 最多同时保留的会话数，超出时淘汰最久未活动的会话
+            idle_timeout: 会话空闲多少秒后淘汰
+            max_turns: 每个会话保留的对话轮数
+            sweep_interval: 清理空闲会话的最小间隔（秒），在访问会话时顺带进行
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_turns = max_turns
+        self.sweep_interval = sweep_interval
+
+        # 按最近活动时间排序：最久未活动的在最前
+        self._sessions: "OrderedDict[str, SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        """生成新的会话ID"""
+        return secrets.token_urlsafe(16)
+
+    def get(self, session_id: str) -> Optional[SessionContext]:
+        """获取已有会话（不创建，不更新活动时间），不存在或已过期返回None"""
+        with self._lock:
+            context = self._sessions.get(session_id)
+            if context is not None and time.time() - context.last_active > self.idle_timeout:
+                return None
+            return context
+
+    def touch(self, session_id: str) -> SessionContext:
+        """获取会话并记录一次活动，不存在时创建"""
+        now = time.time()
+        with self._lock:
+            self._sweep_locked(now)
+            context = self._sessions.get(session_id)
+            if context is None:
+                context = self._sessions[session_id] = SessionContext(session_id, self.max_turns)
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_capacity += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            context.last_active = now
+            context.requests += 1
+            return context
+
+    def _sweep_locked(self, now: float):
+        """淘汰空闲会话（调用方持有锁；按活动时间排序，只需检查最前面的）"""
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = time.monotonic()
+        while self._sessions:
+            context = next(iter(self._sessions.values()))
+            if now - context.last_active <= self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_idle += 1
+
+    def remove(self, session_id: Optional[str] = None):
+        """删除一个会话，不传session_id时删除全部"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """会话数、对话轮数、内存占用和淘汰统计"""
+        with self._lock:
+            self._sweep_locked(time.time())
+            contexts = list(self._sessions.values())
+        return {
+            "sessions": len(contexts),
+            "turns": sum(len(context.history) for context in contexts),
+            "bytes": sys.getsizeof(self._sessions) + sum(context.size() for context in contexts),
+            "created": self.created,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout
+        }
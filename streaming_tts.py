@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分句流式语音合成
+把回复按句子/标点切分，多个句子并行合成（限制并发数），按原顺序逐段输出
+第一句合成完就可以开始播放，不必等整段文字合成完
+也可以直接接在大模型的流式输出后面：边生成边分句，句子一完整就开始合成
+"""
+
+import asyncio
+import base64
+import re
+from typing import Dict, Any, List, AsyncIterator, Optional
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[。！？!?；;…\n])|(?<=\.)(?=\s)')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[，,、：:])')
+
+
+def split_sentences(text: str, min_len: int = 6, max_len: int = 60,
+                    first_max_len: int = 20) -> List[str]:
+    """
+    按句子边界切分文本（支持中英文标点），过长的句子再按逗号等切分
+    切分由 SentenceBuffer 完成（整段输入后flush），与流式分句的结果一致；
+    整段文本已知，末尾过短的片段在不超过长度限制时并入前一段
+
+    参数:
+        text: 要合成的文本
+        min_len: 短于该长度的片段并入下一段，避免过多的小请求
+        max_len: 每段的最大长度
+        first_max_len: 第一段的最大长度，第一段越短，首段音频到达越早
+
+    返回:
+        片段列表，拼接后与原文一致（去掉首尾空白）
+    """
+    buffer = SentenceBuffer(min_len, max_len, first_max_len)
+    segments = buffer.feed(text) + buffer.flush()
+    if len(segments) > 1 and len(segments[-1]) < min_len:
+        tail = segments[-1]
+        previous = segments[-2]
+        limit = first_max_len if len(segments) == 2 else max_len
+        # 英文单词之间保留空格
+        joined = f"{previous} {tail}" if previous[-1].isascii() and tail[0].isascii() else previous + tail
+        if len(joined) <= limit:
+            segments[-2:] = [joined]
+    return segments
+
+
+class SentenceBuffer:
+    """
+    增量分句：逐段输入文本（如大模型的流式输出），句子完整时立即切出
+    短于min_len的片段并入下一句，过长的句子在逗号等处切分（split_sentences 也由它完成切分）
+    """
+
+    def __init__(self, min_len: int = 6, max_len: int = 60, first_max_len: int = 20):
+        self.min_len = min_len
+        self.max_len = max_len
+        self.first_max_len = first_max_len
+        self.count = 0
+        self._text = ""
+
+    def _find_cut(self) -> Optional[int]:
+        """当前缓冲中可以切出的位置，还不能切时返回None"""
+        limit = self.first_max_len if self.count == 0 else self.max_len
+        for match in SENTENCE_BOUNDARY.finditer(self._text):
+            if len(self._text[:match.end()].strip()) >= self.min_len:
+                if match.end() <= limit:
+                    return match.end()
+                break
+
+        if len(self._text) <= limit:
+            return None
+        # 过长：优先在限长以内最后一个逗号等处切分，没有时硬切
+        cuts = [m.end() for m in CLAUSE_BOUNDARY.finditer(self._text, 0, limit)
+                if len(self._text[:m.end()].strip()) >= self.min_len]
+        return cuts[-1] if cuts else limit
+
+    def feed(self, text: str) -> List[str]:
+        """输入一段文本，返回已经完整的片段"""
+        self._text += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                return segments
+            segment = self._text[:cut].strip()
+            self._text = self._text[cut:]
+            if segment:
+                segments.append(segment)
+                self.count += 1
+
+    def flush(self) -> List[str]:
+        """输入结束，返回剩余的文本"""
+        segment = self._text.strip()
+        self._text = ""
+        if not segment:
+            return []
+        self.count += 1
+        return [segment]
+
+
+def audio_bytes(tts_result: Dict[str, Any]) -> bytes:
+    """取出TTS结果中的音频字节（七牛云返回base64字符串，百度返回字节）"""
+    audio_data = tts_result.get('audio_data', b'')
+    if isinstance(audio_data, str):
+        return base64.b64decode(audio_data)
+    return bytes(audio_data)
+
+
+class StreamingTTS:
+    """分句并行合成、按顺序输出的TTS"""
+
+    def __init__(self, api_client, max_concurrency: int = 3):
+        """
+        参数:
+            api_client: 提供 text_to_speech（或 atext_to_speech）的客户端
+            max_concurrency: 同时进行的合成请求数
+        """
+        self.api_client = api_client
+        self.max_concurrency = max_concurrency
+
+    async def _synthesize(self, text: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        async with semaphore:
+            method = getattr(self.api_client, "atext_to_speech", None)
+            if method is not None:
+                return await method(text)
+            return await asyncio.to_thread(self.api_client.text_to_speech, text)
+
+    @staticmethod
+    async def _result_item(index: int, segment: str, task: asyncio.Future) -> Dict[str, Any]:
+        """等待一段合成完成，转换成产出的格式"""
+        try:
+            result = await task
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        item = {"index": index, "text": segment, "success": bool(result.get('success'))}
+        if item["success"]:
+            item["audio"] = audio_bytes(result)
+        else:
+            item["error"] = result.get('error')
+        return item
+
+    async def astream(self, text: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐段产出合成结果（按原文顺序）
+
+        产出:
+            {"index": 序号, "text": 片段文本, "success": True/False,
+             "audio": 音频字节, "error": 错误信息}
+        """
+        segments = split_sentences(text)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # 信号量按先来先得放行，前面的片段总是先开始合成
+        tasks = [asyncio.ensure_future(self._synthesize(segment, semaphore)) for segment in segments]
+        try:
+            for index, (segment, task) in enumerate(zip(segments, tasks)):
+                yield await self._result_item(index, segment, task)
+        finally:
+            # 客户端中途断开时取消尚未完成的合成
+            for task in tasks:
+                task.cancel()
+
+    async def astream_text(self, deltas: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        边接收文本增量边合成：文本增量原样转发，句子一完整就开始合成，音频按顺序产出
+
+        参数:
+            deltas: 文本增量（如 llm_stream.astream_chat 的输出）
+
+        产出:
+            {"type": "delta", "content": 文本增量}
+            {"type": "audio", "index", "text", "success", "audio"/"error"}（同 astream）
+        """
+        buffer = SentenceBuffer()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        output = asyncio.Queue()
+        pending = asyncio.Queue()
+        tasks = []
+        done = object()
+
+        def schedule(segments: List[str]):
+            for segment in segments:
+                task = asyncio.ensure_future(self._synthesize(segment, semaphore))
+                tasks.append(task)
+                pending.put_nowait((len(tasks) - 1, segment, task))
+
+        async def read():
+            try:
+                async for delta in deltas:
+                    output.put_nowait({"type": "delta", "content": delta})
+                    schedule(buffer.feed(delta))
+                schedule(buffer.flush())
+            except Exception as e:
+                output.put_nowait(e)
+            finally:
+                pending.put_nowait(None)
+
+        async def sequence():
+            # 按顺序等待各句合成结果，与文本增量交错输出
+            while True:
+                entry = await pending.get()
+                if entry is None:
+                    output.put_nowait(done)
+                    return
+                item = await self._result_item(*entry)
+                output.put_nowait(dict(item, type="audio"))
+
+        workers = [asyncio.ensure_future(read()), asyncio.ensure_future(sequence())]
+        try:
+            while True:
+                item = await output.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for task in workers + tasks:
+                task.cancel()
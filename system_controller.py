@@ -5,17 +5,21 @@
 负责：打开网站、播放音乐、文件操作、系统控制等
 """
 
+import asyncio
 import os
 import subprocess
 import webbrowser
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 from datetime import datetime
 
 
 class SystemController:
     """系统控制器类"""
     
+    # 常用的网站名称，用于生成常见回复（TTS缓存预热）
+    COMMON_TARGETS = ["GitHub", "百度", "谷歌"]
+    
     def __init__(self):
         """初始化系统控制器"""
         self.music_player = None
@@ -27,6 +31,21 @@ class SystemController:
         os.makedirs(os.path.join(self.base_output_dir, "code"), exist_ok=True)
         os.makedirs(os.path.join(self.base_output_dir, "files"), exist_ok=True)
     
+    def common_messages(self) -> List[str]:
+        """
+        不含用户输入的固定回复，以及按常用网站展开的模板回复
+        供TTS缓存启动时预先合成
+        """
+        messages = [f"已为您打开{target}" for target in self.COMMON_TARGETS]
+        messages += [
+            "正在为您播放音乐",
+            "我明白了",
+            "未提供URL",
+            "未提供搜索关键词",
+            "文件读取成功",
+        ]
+        return messages
+    
     def execute_action(self, action: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
         执行动作的统一入口
@@ -62,6 +81,13 @@ class SystemController:
                 "message": f"未知的动作类型: {action}"
             }
     
+    async def aexecute_action(self, action: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        execute_action 的异步版本
+        打开浏览器、写文件等本地阻塞操作放到线程池执行，不阻塞事件循环
+        """
+        return await asyncio.to_thread(self.execute_action, action, parameters)
+    
     def open_website(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
         打开网站
@@ -74,7 +100,7 @@ class SystemController:
         target_name = parameters.get("target_name") or parameters.get("target", "网站")
         
         if not url:
-                return {
+            return {
                 "success": False,
                 "message": "未提供URL"
             }
@@ -83,8 +109,8 @@ class SystemController:
             # 使用webbrowser模块打开网站
             webbrowser.open(url)
             
-                return {
-                    "success": True,
+            return {
+                "success": True,
                 "action": "open_website",
                 "message": f"已为您打开{target_name}",
                 "url": url,
@@ -123,14 +149,14 @@ class SystemController:
             else:
                 message += "音乐"
             
-                return {
-                    "success": True,
+            return {
+                "success": True,
                 "action": "play_music",
                 "message": message,
                 "song": song_name,
                 "artist": artist,
                 "search_url": music_url
-                }
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -150,12 +176,12 @@ class SystemController:
         
         # 生成文章内容（这里使用示例内容，实际应该调用LLM生成）
         article_content = self._generate_article_content(topic, length)
-            
-            # 保存文章到文件
+        
+        # 保存文章到文件
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"article_{timestamp}.txt"
         filepath = os.path.join(self.base_output_dir, "articles", filename)
-            
+        
         try:
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write(f"主题: {topic}\n")
@@ -363,8 +389,8 @@ if __name__ == "__main__":
         """
         action = parameters.get("action", "")
         
-            return {
-                "success": True,
+        return {
+            "success": True,
             "action": "system_control",
             "message": f"系统控制功能开发中: {action}"
         }
@@ -375,7 +401,7 @@ if __name__ == "__main__":
         """
         message = parameters.get("message", "我明白了")
         
-            return {
+        return {
             "success": True,
             "action": "general_response",
             "message": message
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""WAV解析（整段与分片流式）、分片对齐和重采样"""
+
+import os
+import stat
+import struct
+import sys
+import threading
+
+import pytest
+
+from audio_utils import (parse_wav, read_wav_stream, iter_aligned, pcm16_to_wav, np,
+                         StreamingDecoder, WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE)
+
+
+def chunk(chunk_id: bytes, payload: bytes) -> bytes:
+    return chunk_id + struct.pack('<I', len(payload)) + payload + (b'\0' if len(payload) & 1 else b'')
+
+
+def fmt_chunk(rate=16000, channels=1, bits=16, format_tag=WAVE_FORMAT_PCM, extensible=False):
+    block_align = channels * bits // 8
+    payload = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE if extensible else format_tag,
+                          channels, rate, rate * block_align, block_align, bits)
+    if extensible:
+        payload += struct.pack('<HHI', 22, bits, 0) + struct.pack('<H', format_tag) + b'\0' * 14
+    return chunk(b'fmt ', payload)
+
+
+def wav(*chunks, riff_size=None) -> bytes:
+    body = b'WAVE' + b''.join(chunks)
+    return b'RIFF' + struct.pack('<I', len(body) if riff_size is None else riff_size) + body
+
+
+PCM = bytes(range(256)) * 8
+LIST = chunk(b'LIST', b'INFOISFT' + struct.pack('<I', 6) + b'Lavf\0\0')
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_parse_wav_skips_extra_chunks():
+    info = parse_wav(wav(fmt_chunk(), LIST, chunk(b'data', PCM), LIST))
+    assert info.is_pcm16_mono
+    assert info.sample_rate == 16000
+    assert bytes(info.data) == PCM
+
+
+def test_parse_wav_extensible_format():
+    info = parse_wav(wav(fmt_chunk(rate=48000, channels=2, extensible=True), chunk(b'data', PCM)))
+    assert info.format_tag == WAVE_FORMAT_PCM
+    assert info.channels == 2
+    assert info.sample_rate == 48000
+
+
+def test_parse_wav_with_unfilled_data_size():
+    data = wav(fmt_chunk(), b'data' + struct.pack('<I', 0xFFFFFFFF) + PCM, riff_size=0xFFFFFFFF)
+    assert bytes(parse_wav(data).data) == PCM
+
+
+def test_parse_wav_rejects_missing_fmt():
+    with pytest.raises(ValueError):
+        parse_wav(wav(chunk(b'data', PCM)))
+
+
+def test_round_trip_with_pcm16_to_wav():
+    assert bytes(parse_wav(pcm16_to_wav(PCM)).data) == PCM
+
+
+@pytest.mark.parametrize("piece", [1, 7, 44, 4096])
+def test_read_wav_stream_stops_at_data_size(piece):
+    data = wav(fmt_chunk(), LIST, chunk(b'data', PCM), LIST)
+    info, body = read_wav_stream(split(data, piece))
+    assert info.sample_rate == 16000
+    assert b''.join(body) == PCM
+
+
+def test_read_wav_stream_reads_to_end_when_size_unknown():
+    data = wav(fmt_chunk(), b'data' + struct.pack('<I', 0) + PCM, riff_size=0)
+    _, body = read_wav_stream(split(data, 100))
+    assert b''.join(body) == PCM
+
+
+def test_read_wav_stream_truncated_header():
+    with pytest.raises(ValueError):
+        read_wav_stream([wav(fmt_chunk())[:20]])
+
+
+def test_iter_aligned():
+    out = list(iter_aligned([b'\x01', b'\x02\x03\x04\x05', b'\x06\x07'], align=2, min_size=4))
+    assert b''.join(out) == b'\x01\x02\x03\x04\x05\x06'
+    assert all(len(part) % 2 == 0 for part in out)
+
+
+@pytest.mark.skipif(np is None, reason="需要numpy")
+def test_resample_and_downmix_to_16k_mono():
+    from audio_utils import convert_pcm
+    rate = 48000
+    t = np.arange(rate) / rate
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t) * 32767).astype('<i2')
+    stereo = np.stack([tone, tone], axis=1).tobytes()
+    pcm = convert_pcm(stereo, WAVE_FORMAT_PCM, 16, 2, rate)
+    samples = np.frombuffer(pcm, dtype='<i2')
+    assert len(samples) == 16000
+    # 440Hz正弦重采样后频率不变
+    spectrum = np.abs(np.fft.rfft(samples.astype(np.float32)))
+    assert abs(int(np.argmax(spectrum)) - 440) <= 1
+
+
+# 代替ffmpeg的脚本：标准输入原样输出，同时向标准错误写出远超管道缓冲区的内容
+NOISY_FFMPEG = """#!{python}
+import sys
+for i in range(4000):
+    sys.stderr.write("corrupt packet %d\\n" % i)
+sys.stderr.flush()
+data = sys.stdin.buffer.read()
+sys.stdout.buffer.write(data)
+sys.exit(1 if data.startswith(b"bad") else 0)
+"""
+
+
+@pytest.fixture
+def noisy_ffmpeg(tmp_path, monkeypatch):
+    if os.name != "posix":
+        pytest.skip("需要可执行脚本")
+    script = tmp_path / "ffmpeg"
+    script.write_text(NOISY_FFMPEG.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+
+def run_decoder(payload: bytes):
+    decoder = StreamingDecoder()
+
+    def feed():
+        decoder.feed(payload)
+        decoder.end_input()
+
+    writer = threading.Thread(target=feed)
+    writer.start()
+    try:
+        return b"".join(decoder.frames())
+    finally:
+        writer.join()
+        decoder.close()
+
+
+def test_streaming_decoder_not_blocked_by_stderr(noisy_ffmpeg):
+    assert run_decoder(b"\x01\x02" * 5000) == b"\x01\x02" * 5000
+
+
+def test_streaming_decoder_reports_stderr_tail(noisy_ffmpeg):
+    with pytest.raises(RuntimeError, match="corrupt packet 3999"):
+        run_decoder(b"bad" + b"\x00" * 99)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""对话历史环形缓冲区"""
+
+from conversation_history import SessionHistory
+
+INTENT = {"action": "open_website", "parameters": {"url": "https://github.com"}, "source": "local"}
+
+
+def test_ring_buffer_keeps_latest_turns():
+    history = SessionHistory(max_turns=3)
+    for i in range(5):
+        history.add(f"问题{i}", f"回答{i}", INTENT)
+    assert len(history) == 3
+    assert [turn["user"] for turn in history.to_list()] == ["问题2", "问题3", "问题4"]
+
+
+def test_record_round_trip_and_truncation():
+    history = SessionHistory(max_text_len=4)
+    history.add("打开GitHub网站", None, {"action": None, "parameters": None})
+    turn = history.to_list()[0]
+    assert turn["user"] == "打开Gi"
+    assert turn["agent"] == ""
+    assert turn["intent"] == {"action": None, "parameters": {}, "source": None}
+
+    history.add("打开", "好的", INTENT)
+    assert history.to_list()[1]["intent"] == INTENT
+
+
+def test_page_is_newest_first():
+    history = SessionHistory()
+    for i in range(5):
+        history.add(f"问题{i}", "", INTENT)
+    page = history.page(offset=1, limit=2)
+    assert page["total"] == 5
+    assert [turn["user"] for turn in page["items"]] == ["问题3", "问题2"]
+    assert history.page(offset=-3, limit=-1)["items"] == []
+
+
+def test_size_bounded_by_max_turns():
+    history = SessionHistory(max_turns=10)
+    for i in range(10):
+        history.add("问题" * 20, "回答" * 20, INTENT)
+    full = history.size()
+    for i in range(100):
+        history.add("问题" * 20, "回答" * 20, INTENT)
+    assert history.size() == full
+    history.clear()
+    assert len(history) == 0
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""对话历史压缩"""
+
+import asyncio
+
+from history_compactor import HistoryCompactor, SUMMARY_PREFIX
+from token_count import estimate_tokens
+
+
+def turns(n, start=0):
+    history = []
+    for i in range(start, start + n):
+        history.append({"role": "user", "content": f"问题{i}" + "内容" * 10})
+        history.append({"role": "assistant", "content": "回答" * 20})
+    return history
+
+
+class Summarizer:
+    """记录收到的提示词，返回编号摘要"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return f"摘要{len(self.prompts)}"
+
+
+def compact(compactor, message, history, **kwargs):
+    return asyncio.run(compactor.acompact(message, history, **kwargs))
+
+
+def test_history_within_budget_is_unchanged():
+    compactor = HistoryCompactor(Summarizer(), budgets={"default": 1000})
+    history = turns(2)
+    out, info = compact(compactor, "你好", history)
+    assert out == history
+    assert info["tokens_before"] == info["tokens_after"]
+    assert info["summarized"] == 0
+
+
+def test_over_budget_keeps_recent_turns_and_summarizes_older():
+    summarize = Summarizer()
+    compactor = HistoryCompactor(summarize, budgets={"default": 300}, summary_tokens=50)
+    history = [{"role": "system", "content": "你是助手"}] + turns(8)
+    out, info = compact(compactor, "新问题", history)
+
+    assert info["tokens_after"] <= info["budget"] < info["tokens_before"]
+    assert out[0] == {"role": "system", "content": "你是助手"}
+    assert out[1] == {"role": "system", "content": SUMMARY_PREFIX + "摘要1"}
+    assert out[2]["role"] == "user"
+    assert out[-2:] == history[-2:]
+    assert len(summarize.prompts) == 1
+
+
+def test_rolling_summary_is_reused_across_turns():
+    summarize = Summarizer()
+    compactor = HistoryCompactor(summarize, budgets={"default": 800}, summary_tokens=50)
+    history = turns(12)
+    compact(compactor, "问题12", history, session_id="s")
+    assert len(summarize.prompts) == 1
+
+    # 新增的轮次还放得下时沿用上次的摘要，不再调用模型
+    out, _ = compact(compactor, "问题13", history + turns(1, 12), session_id="s")
+    assert len(summarize.prompts) == 1
+    assert out[0]["content"] == SUMMARY_PREFIX + "摘要1"
+
+    added = 1
+    while len(summarize.prompts) == 1:
+        added += 1
+        assert added < 20
+        compact(compactor, "下一个问题", history + turns(added, 12), session_id="s")
+    # 再放不下时只把新滑出窗口的轮次并入已有摘要
+    assert "已有摘要：\n摘要1" in summarize.prompts[1]
+    assert "问题0" not in summarize.prompts[1]
+    assert compactor.get_stats()["summary_hits"] >= 1
+
+
+def test_changed_history_is_not_matched_to_cached_summary():
+    summarize = Summarizer()
+    compactor = HistoryCompactor(summarize, budgets={"default": 800}, summary_tokens=50)
+    compact(compactor, "x", turns(12), session_id="s")
+    compact(compactor, "x", turns(12, 100), session_id="s")
+    assert len(summarize.prompts) == 2
+    assert "已有摘要" not in summarize.prompts[1]
+
+
+def test_summarizer_prompt_is_capped_to_budget():
+    summarize = Summarizer()
+    compactor = HistoryCompactor(summarize, budgets={"default": 600}, summary_tokens=100)
+    compact(compactor, "新问题", turns(200))
+    assert estimate_tokens(summarize.prompts[0]) <= 600
+    # 放不下的较早轮次以摘录形式并入，最新的被折叠轮次交给模型
+    assert "问题0" not in summarize.prompts[0]
+
+
+def test_summarizer_failure_falls_back_to_excerpt():
+    async def failing(prompt):
+        raise RuntimeError("boom")
+
+    compactor = HistoryCompactor(failing, budgets={"default": 300}, summary_tokens=50)
+    out, _ = compact(compactor, "x", turns(8))
+    assert out[0]["content"].startswith(SUMMARY_PREFIX)
+    assert estimate_tokens(out[0]["content"]) <= 50 + estimate_tokens(SUMMARY_PREFIX)
+    assert compactor.get_stats()["summary_failures"] == 1
+
+
+def test_budget_is_chosen_per_model():
+    compactor = HistoryCompactor(budgets={"default": 100, "big": 5000})
+    assert compactor.budget_for("big") == 5000
+    assert compactor.budget_for("unknown") == 100
+    assert compactor.budget_for(None) == 100
+
+
+def test_pipeline_uses_client_model_budget():
+    from async_pipeline import VoicePipeline
+    from qiniu_api_client import QiniuAPIClient
+
+    pipeline = VoicePipeline(QiniuAPIClient("test-key"), None, None, None)
+    try:
+        assert pipeline.chat_model == "deepseek-v3"
+        _, info = pipeline.compact_history("你好", [])
+        assert info["budget"] == pipeline.history_compactor.budgets["deepseek-v3"]
+    finally:
+        pipeline.runtime.stop()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""HTTP连接池的重试和按主机限流"""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_pool import HTTPSessionPool
+
+
+class StatusServer:
+    """按顺序返回给定状态码的本地HTTP服务，记录收到的请求数"""
+
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.hits = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                with owner.lock:
+                    owner.hits += 1
+                    owner.active += 1
+                    owner.peak = max(owner.peak, owner.active)
+                    status = owner.statuses.pop(0) if owner.statuses else 200
+                if owner.delay:
+                    threading.Event().wait(owner.delay)
+                with owner.lock:
+                    owner.active -= 1
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def make(statuses, delay=0.0):
+        server = StatusServer(statuses, delay)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+@pytest.mark.parametrize("method, statuses, hits, final", [
+    ("GET", [502, 503], 3, 200),
+    ("POST", [503, 429], 3, 200),
+    ("POST", [502], 1, 502),
+    ("POST", [504], 1, 504),
+])
+def test_retry_policy(server_factory, method, statuses, hits, final):
+    server = server_factory(statuses)
+    pool = HTTPSessionPool(max_retries=2, backoff_factor=0)
+    response = pool.request(method, server.url, data=b"{}")
+    assert response.status_code == final
+    assert server.hits == hits
+    pool.close()
+
+
+def test_retry_budget(server_factory):
+    server = server_factory([503, 503, 503, 503])
+    pool = HTTPSessionPool(max_retries=2, backoff_factor=0)
+    assert pool.post(server.url, data=b"{}").status_code == 503
+    assert server.hits == 3
+    pool.close()
+
+
+def test_async_session_applies_host_limits(server_factory):
+    pytest.importorskip("aiohttp")
+    limited = server_factory([], delay=0.1)
+    other = server_factory([], delay=0.1)
+    pool = HTTPSessionPool(pool_maxsize=8, host_limits={limited.url: 2})
+
+    async def run():
+        session = pool.create_async_session()
+
+        async def fetch(url):
+            async with session.post(url, data=b"{}") as response:
+                return response.status
+
+        statuses = await asyncio.gather(*(fetch(limited.url) for _ in range(6)),
+                                        *(fetch(other.url) for _ in range(6)))
+        await session.close()
+        assert session.closed
+        return statuses
+
+    assert asyncio.run(run()) == [200] * 12
+    assert limited.peak == 2
+    assert other.peak > 2
+    pool.close()
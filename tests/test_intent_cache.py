@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""意图缓存"""
+
+import intent_cache
+from intent_cache import IntentCache, normalize_utterance
+
+INTENT = {"action": "play_music", "parameters": {"song_name": "稻香", "artist": ""}}
+
+
+def test_normalize_utterance():
+    assert normalize_utterance("  打開 百度！ ") == "打开百度"
+    assert normalize_utterance("ＯＰＥＮ，GitHub。") == "opengithub"
+    assert normalize_utterance("？！。") == ""
+
+
+def test_equivalent_utterances_share_entry():
+    cache = IntentCache()
+    cache.put("播放稻香。", INTENT)
+    assert cache.get("播放 稻香") == INTENT
+    assert cache.get("播放七里香") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_returned_intent_is_a_copy():
+    cache = IntentCache()
+    cache.put("播放稻香", INTENT)
+    cache.get("播放稻香")["parameters"]["song_name"] = "改掉"
+    assert cache.get("播放稻香") == INTENT
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(intent_cache.time, "monotonic", lambda: now[0])
+    cache = IntentCache(ttl=10)
+    cache.put("打开百度", INTENT)
+    now[0] += 11
+    assert cache.get("打开百度") is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_lru_eviction():
+    cache = IntentCache(max_entries=2)
+    cache.put("一", INTENT)
+    cache.put("二", INTENT)
+    cache.get("一")
+    cache.put("三", INTENT)
+    assert cache.get("二") is None
+    assert cache.get("一") == INTENT
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_near_match_only_when_enabled():
+    exact = IntentCache()
+    near = IntentCache(similarity_threshold=0.8)
+    for cache in (exact, near):
+        cache.put("帮我打开百度网站", INTENT)
+    assert exact.get("帮我打开百度网站吧") is None
+    assert near.get("帮我打开百度网站吧") == INTENT
+    assert near.get("播放七里香") is None
+    assert near.get_stats()["near_hits"] == 1
+
+
+def test_empty_utterance_not_cached():
+    cache = IntentCache()
+    cache.put("。。", INTENT)
+    assert cache.get_stats()["entries"] == 0
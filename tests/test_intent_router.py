@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""本地意图分类器"""
+
+import pytest
+
+from intelligent_agent import IntelligentAgent
+from intent_router import LocalIntentClassifier, _strip_words, MUSIC_VERBS
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return LocalIntentClassifier(IntelligentAgent().available_tools)
+
+
+@pytest.mark.parametrize("text, action, parameters", [
+    ("播放稻香", "play_music", {"song_name": "稻香", "artist": ""}),
+    ("播放晴天", "play_music", {"song_name": "晴天", "artist": ""}),
+    ("放周杰伦的晴天", "play_music", {"song_name": "晴天", "artist": "周杰伦"}),
+    ("请打开知乎", "open_website", {"url": "https://www.zhihu.com", "target_name": "知乎"}),
+    ("打开GitHub", "open_website", {"url": "https://github.com", "target_name": "GitHub"}),
+    ("搜索Python教程", "web_search", {"query": "Python教程"}),
+    ("写一篇关于AI的文章", "write_article", {"topic": "AI", "length": "medium"}),
+])
+def test_direct_commands_use_fast_path(classifier, text, action, parameters):
+    result = classifier.classify(text)
+    assert result is not None
+    assert result["action"] == action
+    assert result["parameters"] == parameters
+    assert result["source"] == "local"
+
+
+@pytest.mark.parametrize("text", [
+    "不要播放稻香了",
+    "别打开淘宝",
+    "不要打开百度",
+    "停止播放音乐",
+    "百度浏览器打不开怎么办",
+])
+def test_negation_goes_to_llm(classifier, text):
+    assert classifier.classify(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "听说周杰伦的歌很好听",
+    "今天天气怎么样",
+    "打开百度搜索一下周杰伦的新歌和演唱会门票",
+])
+def test_unrelated_or_mixed_sentences_go_to_llm(classifier, text):
+    assert classifier.classify(text) is None
+
+
+@pytest.mark.parametrize("text, action", [
+    ("播放列表在哪", "play_music"),
+    ("搜索引擎是什么", "web_search"),
+    ("播放稻香吗", "play_music"),
+])
+def test_questions_in_slots_go_to_llm(classifier, text, action):
+    assert classifier.classify(text) is None
+    # 疑问内容不算参数，留在句式中，得分低于阈值
+    assert dict(classifier.score(text))[action] < classifier.threshold
+
+
+def test_question_topic_not_taken_as_article(classifier):
+    assert classifier.classify("写一篇关于什么是爱的文章") is None
+
+
+def test_extra_content_lowers_score(classifier):
+    exact = dict(classifier.score("打开知乎"))["open_website"]
+    noisy = dict(classifier.score("打开知乎然后把屏幕调暗再写个总结"))["open_website"]
+    assert noisy < exact
+
+
+def test_strip_words_only_removes_prefix():
+    assert _strip_words("听说周杰伦的歌很好听", MUSIC_VERBS, once=True) == "说周杰伦的歌很好听"
+    assert _strip_words("播放听海", MUSIC_VERBS, once=True) == "听海"
+    assert _strip_words("请帮我播放", ("请", "帮我")) == "播放"
+    assert _strip_words("播放放学后", MUSIC_VERBS, once=True) == "放学后"
+
+
+def test_music_parameters_keep_verbs_inside_song_name(classifier):
+    assert classifier.classify("播放听海")["parameters"]["song_name"] == "听海"
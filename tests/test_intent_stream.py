@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""意图JSON的增量解析"""
+
+import json
+
+import pytest
+
+from intent_stream import IntentStreamParser
+
+INTENT = {
+    "action": "play_music",
+    "parameters": {"song_name": "稻香", "artist": "周杰伦", "tags": ["流行", "{不是对象}"]},
+    "reasoning": "用户想听\"稻香\"，这是一首歌"
+}
+
+
+def feed_in_pieces(parser, text, size):
+    """按size个字符一段输入，返回intent首次可用时已输入的长度"""
+    for end in range(size, len(text) + size, size):
+        if parser.feed(text[end - size:end]) is not None:
+            return min(end, len(text))
+    return None
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_intent_ready_before_reasoning(size):
+    text = json.dumps(INTENT, ensure_ascii=False)
+    parser = IntentStreamParser()
+    ready_at = feed_in_pieces(parser, text, size)
+    assert ready_at is not None
+    assert ready_at <= text.index('"reasoning"') + size
+    assert parser.intent == {"action": INTENT["action"], "parameters": INTENT["parameters"]}
+
+
+def test_skips_code_fence_and_preamble():
+    parser = IntentStreamParser()
+    text = '好的，结果如下：\n```json\n{"action": "open_website", "parameters": {"url": "https://github.com"}}\n```'
+    assert feed_in_pieces(parser, text, 5) is not None
+    assert parser.intent["parameters"]["url"] == "https://github.com"
+
+
+def test_scalar_values_end_at_comma_or_brace():
+    parser = IntentStreamParser(required=("action", "confidence", "parameters", "ok"))
+    parser.feed('{"action": "chat", "confidence": 0.85')
+    assert parser.intent is None
+    parser.feed(', "parameters": null, "ok": true')
+    assert parser.intent is None
+    parser.feed('}')
+    assert parser.intent == {"action": "chat", "confidence": 0.85, "parameters": None, "ok": True}
+    assert parser.closed
+
+
+def test_object_end_makes_intent_available_without_required_fields():
+    parser = IntentStreamParser()
+    assert parser.feed('{"action": "chat"') is None
+    assert parser.feed('}') == {"action": "chat"}
+
+
+def test_escaped_quotes_in_keys_and_values():
+    parser = IntentStreamParser(required=("a\"b", "parameters"))
+    parser.feed('{"a\\"b": "x\\\\", "parameters": {"q": "\\"}"}}')
+    assert parser.intent == {"a\"b": "x\\", "parameters": {"q": "\"}"}}
+
+
+def test_later_text_ignored_once_complete():
+    parser = IntentStreamParser()
+    parser.feed('{"action": "chat", "parameters": {}}')
+    parser.feed(' {"action": "other", "parameters": {}}')
+    assert parser.intent == {"action": "chat", "parameters": {}}
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""请求体读取（Content-Length与分块传输编码）"""
+
+import io
+
+import pytest
+
+from voice_assistant_server import RequestBody
+
+CHUNKED = {"Transfer-Encoding": "chunked"}
+
+
+def read_all(raw: bytes, headers=CHUNKED, chunk_size=16384):
+    return list(RequestBody(io.BufferedReader(io.BytesIO(raw)), headers, chunk_size))
+
+
+def test_chunked_body():
+    raw = b"5\r\nhello\r\n6\r\n world\r\n0\r\n\r\nNEXT"
+    stream = io.BufferedReader(io.BytesIO(raw))
+    body = RequestBody(stream, CHUNKED)
+    assert b"".join(body) == b"hello world"
+    assert body.bytes_read == 11
+    # 请求体之后的内容（下一个请求）不被读走
+    assert stream.read() == b"NEXT"
+
+
+def test_chunk_larger_than_read_size():
+    assert read_all(b"A\r\n0123456789\r\n0\r\n\r\n", chunk_size=4) == [b"0123", b"4567", b"89"]
+
+
+def test_chunk_extensions_and_trailers():
+    raw = b"5;name=value\r\nhello\r\n0;last\r\nX-Checksum: abc\r\nX-Other: 1\r\n\r\n"
+    assert read_all(raw) == [b"hello"]
+
+
+def test_uppercase_hex_and_bare_newlines():
+    assert b"".join(read_all(b"1A\n" + b"x" * 26 + b"\n0\n\n")) == b"x" * 26
+
+
+@pytest.mark.parametrize("raw", [
+    b"",
+    b"5\r\nhello\r\n",
+    b"5\r\nhel",
+    b"5\r\nhello",
+    b"5",
+    b"5\r\nhello\r\n0\r\nX-Trailer: 1\r\n",
+])
+def test_truncated_chunked_body_raises(raw):
+    with pytest.raises(ConnectionError):
+        read_all(raw)
+
+
+@pytest.mark.parametrize("raw", [
+    b"zz\r\nhello\r\n0\r\n\r\n",
+    b"\r\nhello\r\n0\r\n\r\n",
+    b"0x5\r\nhello\r\n0\r\n\r\n",
+    b"-5\r\nhello\r\n0\r\n\r\n",
+    b"3\r\nhello\r\n0\r\n\r\n",
+])
+def test_malformed_chunked_body_raises(raw):
+    with pytest.raises(ValueError):
+        read_all(raw)
+
+
+def test_content_length_body():
+    assert b"".join(read_all(b"hello worldEXTRA", {"Content-Length": "11"})) == b"hello world"
+    assert read_all(b"", {}) == []
+    with pytest.raises(ConnectionError):
+        read_all(b"hello", {"Content-Length": "11"})
+
+
+def test_drain_swallows_errors_and_stops():
+    body = RequestBody(io.BufferedReader(io.BytesIO(b"5\r\nhello\r\n")), CHUNKED)
+    body.drain()
+    assert body.done
+    assert list(body) == []
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""会话管理"""
+
+import session_manager
+from session_manager import SessionManager
+
+
+def test_touch_creates_once_and_counts_requests():
+    manager = SessionManager()
+    first = manager.touch("alice")
+    assert manager.touch("alice") is first
+    assert first.requests == 2
+    assert manager.get("bob") is None
+    assert manager.get_stats()["created"] == 1
+
+
+def test_capacity_evicts_least_recently_active():
+    manager = SessionManager(max_sessions=2)
+    manager.touch("a")
+    manager.touch("b")
+    manager.touch("a")
+    manager.touch("c")
+    assert manager.get("b") is None
+    assert manager.get("a") is not None
+    assert manager.get_stats()["evicted_capacity"] == 1
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_manager.time, "time", lambda: now[0])
+    manager = SessionManager(idle_timeout=60, sweep_interval=0)
+    manager.touch("old")
+    now[0] += 30
+    manager.touch("new")
+    now[0] += 40
+    assert manager.get("old") is None
+    assert manager.get("new") is not None
+    stats = manager.get_stats()
+    assert stats["sessions"] == 1 and stats["evicted_idle"] == 1
+
+
+def test_sessions_have_separate_histories():
+    manager = SessionManager(max_turns=2)
+    manager.touch("alice").history.add("打开百度", "好的", {"action": "open_website"})
+    assert len(manager.touch("bob").history) == 0
+    assert manager.get_stats()["turns"] == 1
+
+
+def test_remove_and_new_ids():
+    manager = SessionManager()
+    manager.touch("a")
+    manager.touch("b")
+    manager.remove("a")
+    assert manager.get("a") is None
+    manager.remove()
+    assert manager.get_stats()["sessions"] == 0
+    assert SessionManager.new_session_id() != SessionManager.new_session_id()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""分句（整段与流式）"""
+
+import pytest
+
+from streaming_tts import split_sentences, SentenceBuffer
+
+TEXTS = [
+    "你好。今天天气很好，我们去公园散步吧！好的。",
+    "好的，已经为您打开GitHub。",
+    "第一句话在这里。第二句。第三句话比较长一些，包含逗号，还有更多内容。好。",
+    "这是一个没有任何标点符号的句子" * 6,
+    "Hello world. This is a test of the English splitting, with commas, and more words here. OK.",
+]
+
+
+def buffered(text, piece=None, **limits):
+    buffer = SentenceBuffer(**limits)
+    piece = piece or len(text) or 1
+    segments = []
+    for i in range(0, len(text), piece):
+        segments += buffer.feed(text[i:i + piece])
+    return segments + buffer.flush()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_segments_respect_length_limits(text):
+    for segments in (split_sentences(text), buffered(text), buffered(text, piece=3)):
+        assert segments
+        assert len(segments[0]) <= 20
+        assert all(len(segment) <= 60 for segment in segments)
+        assert "".join(segments).replace(" ", "") == text.replace(" ", "")
+
+
+def test_first_segment_limit_applies_to_tail_merge():
+    text = "你好。今天天气很好，我们去公园散步吧！好的。"
+    assert split_sentences(text) == ["你好。今天天气很好，我们去公园散步吧！", "好的。"]
+    assert split_sentences(text) == buffered(text)
+
+
+def test_short_tail_merged_into_previous_segment():
+    text = "第一句话在这里。第二句。第三句话比较长一些，包含逗号，还有更多内容。好。"
+    segments = split_sentences(text)
+    assert segments[-1].endswith("内容。好。")
+    assert buffered(text)[-1] == "好。"
+
+
+def test_english_words_keep_space_when_merged():
+    assert split_sentences("Hello world. This is a longer sentence here. OK.")[-1].endswith("here. OK.")
+
+
+def test_stream_splits_as_soon_as_sentence_complete():
+    buffer = SentenceBuffer()
+    assert buffer.feed("你好，我是语音") == []
+    assert buffer.feed("助手。很高兴") == ["你好，我是语音助手。"]
+    assert buffer.flush() == ["很高兴"]
+    assert buffer.flush() == []
+
+
+def test_short_and_empty_text():
+    assert split_sentences("") == []
+    assert split_sentences("   ") == []
+    assert split_sentences("嗯。") == ["嗯。"]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""有界线程池服务器：普通请求与长连接流的名额"""
+
+import http.client
+import http.server
+import threading
+import time
+
+import pytest
+
+from threaded_server import BoundedThreadPoolServer
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """/stream 转为流并保持到 release 被设置，其它路径立即返回"""
+
+    release = None
+    started = None
+
+    def do_GET(self):
+        if self.path == "/stream":
+            if not self.server.begin_stream():
+                self._reply(429)
+                return
+            self.started.release()
+            self.release.wait(5)
+        self._reply(200)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.release = threading.Event()
+    Handler.started = threading.Semaphore(0)
+    httpd = BoundedThreadPoolServer(("127.0.0.1", 0), Handler, max_workers=2, max_queue=0, max_streams=3)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    Handler.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(httpd, path, results=None):
+    conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    conn.request("GET", path)
+    status = conn.getresponse().status
+    conn.close()
+    if results is not None:
+        results.append(status)
+    return status
+
+
+def test_streams_do_not_starve_short_requests(server):
+    results = []
+    clients = [threading.Thread(target=get, args=(server, "/stream", results)) for _ in range(3)]
+    # 逐个建立：转为流之前仍占用请求名额（本例没有排队名额）
+    for client in clients:
+        client.start()
+        assert Handler.started.acquire(timeout=2)
+
+    # 三个流都在进行，普通请求仍有工作线程处理
+    assert [get(server, "/health") for _ in range(4)] == [200] * 4
+    assert get(server, "/stream") == 429
+    stats = server.get_stats()
+    assert stats["streams"] == 3 and stats["streams_rejected"] == 1
+
+    Handler.release.set()
+    for client in clients:
+        client.join(5)
+    assert results == [200] * 3
+
+    # 流结束后名额归还
+    deadline = time.monotonic() + 2
+    while server.get_stats()["streams"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.get_stats()["streams"] == 0
+    Handler.release.clear()
+    client = threading.Thread(target=get, args=(server, "/stream", results))
+    client.start()
+    assert Handler.started.acquire(timeout=2)
+    Handler.release.set()
+    client.join(5)
+
+
+def test_stats_report_stream_limit(server):
+    assert server.get_stats()["max_streams"] == 3
+    assert get(server, "/health") == 200
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""TTS缓存"""
+
+import asyncio
+import base64
+import threading
+
+from tts_cache import TTSCache, CachedTTSClient
+
+
+class FakeTTS:
+    """返回与七牛TTS相同字段的假客户端，记录调用次数和调用线程"""
+
+    def __init__(self):
+        self.calls = 0
+        self.threads = []
+
+    def text_to_speech(self, text, voice_type="qiniu_zh_female_wwxkjx", encoding="mp3", speed_ratio=1.0):
+        self.calls += 1
+        self.threads.append(threading.get_ident())
+        audio = f"{text}-{voice_type}".encode("utf-8")
+        return {"success": True, "audio_data": base64.b64encode(audio).decode(), "duration": "1.5", "reqid": "r1"}
+
+
+def test_hit_returns_same_fields_as_live_call():
+    client = CachedTTSClient(FakeTTS(), TTSCache())
+    live = client.text_to_speech("你好")
+    hit = client.text_to_speech("你好")
+    assert client.client.calls == 1
+    assert hit.pop("cached") is True
+    assert hit == live
+    assert hit["audio_data"] == "你好-qiniu_zh_female_wwxkjx".encode("utf-8")
+
+
+def test_parameters_are_part_of_key():
+    client = CachedTTSClient(FakeTTS(), TTSCache())
+    client.text_to_speech("你好")
+    client.text_to_speech("你好", voice_type="other")
+    client.text_to_speech("你好", "other")
+    assert client.client.calls == 2
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    first = CachedTTSClient(FakeTTS(), TTSCache(disk_dir=str(tmp_path)))
+    live = first.text_to_speech("你好")
+
+    second = CachedTTSClient(FakeTTS(), TTSCache(disk_dir=str(tmp_path)))
+    hit = second.text_to_speech("你好")
+    assert second.client.calls == 0
+    assert second.cache.get_stats()["disk_hits"] == 1
+    assert hit["duration"] == live["duration"]
+    assert hit["audio_data"] == live["audio_data"]
+
+
+def test_disk_hit_is_mapped_not_copied(tmp_path):
+    key = "cd" * 32
+    TTSCache(disk_dir=str(tmp_path)).put(key, b"old audio")
+    audio, _ = TTSCache(disk_dir=str(tmp_path)).get(key)
+    assert isinstance(audio, memoryview) and audio.readonly
+    # 文件被原子替换后，已有的映射仍是旧内容
+    TTSCache(disk_dir=str(tmp_path)).put(key, b"new audio!")
+    assert audio == b"old audio"
+    assert base64.b64decode(base64.b64encode(audio)) == b"old audio"
+
+
+def test_disk_entry_without_meta_still_hits(tmp_path):
+    key = "ab" * 32
+    TTSCache(disk_dir=str(tmp_path)).put(key, b"audio", {"duration": "1.5"})
+    (tmp_path / "ab" / f"{key}.json").unlink()
+
+    assert TTSCache(disk_dir=str(tmp_path)).get(key) == (b"audio", {})
+
+
+def test_memory_limits_evict_oldest():
+    cache = TTSCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, key.encode())
+    assert cache.get("a") is None
+    assert cache.get("c") == (b"c", {})
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_failed_synthesis_not_cached():
+    class Failing(FakeTTS):
+        def text_to_speech(self, text, **kwargs):
+            self.calls += 1
+            return {"success": False, "error": "boom"}
+
+    client = CachedTTSClient(Failing(), TTSCache())
+    assert not client.text_to_speech("你好")["success"]
+    assert not client.text_to_speech("你好")["success"]
+    assert client.client.calls == 2
+
+
+def test_async_cache_io_runs_off_event_loop(tmp_path):
+    cache = TTSCache(disk_dir=str(tmp_path))
+    threads = []
+    get, put = cache.get, cache.put
+
+    def recording_get(key):
+        threads.append(threading.get_ident())
+        return get(key)
+
+    def recording_put(key, audio, meta=None):
+        threads.append(threading.get_ident())
+        return put(key, audio, meta)
+
+    cache.get, cache.put = recording_get, recording_put
+    client = CachedTTSClient(FakeTTS(), cache)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        live = await client.atext_to_speech("你好")
+        hit = await client.atext_to_speech("你好")
+        return loop_thread, live, hit
+
+    loop_thread, live, hit = asyncio.run(run())
+    assert len(threads) == 3
+    assert loop_thread not in threads
+    assert hit["duration"] == live["duration"] and hit["cached"]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""本地VAD：去除首尾静音、流式说话结束检测，以及各识别入口是否启用流式VAD"""
+
+import json
+import queue
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import voice_activity
+from xunfei_asr_official import XunfeiASROfficial
+from xunfei_client import XunfeiClient
+
+RATE = 16000
+
+
+def pcm_clip(*segments):
+    """按 (秒数, 是否有声) 生成16bit PCM：有声段为300Hz正弦，静音段为微弱噪声"""
+    rng = np.random.default_rng(0)
+    parts = []
+    for seconds, voiced in segments:
+        n = int(RATE * seconds)
+        if voiced:
+            parts.append(0.3 * np.sin(2 * np.pi * 300 * np.arange(n) / RATE))
+        else:
+            parts.append(rng.normal(0, 0.0005, n))
+    return (np.concatenate(parts) * 32767).astype('<i2').tobytes()
+
+
+# 两个短语之间停顿1秒
+TWO_PHRASES = pcm_clip((0.5, False), (1.0, True), (1.0, False), (1.0, True), (0.5, False))
+
+
+def test_trim_silence_keeps_pause_between_phrases():
+    trimmed = voice_activity.trim_silence(TWO_PHRASES, RATE)
+    start = TWO_PHRASES.index(bytes(trimmed))
+    assert start <= RATE * 2 * 0.5
+    # 第二个短语在 2.5s~3.5s，必须完整保留
+    assert start + len(trimmed) >= RATE * 2 * 3.5
+
+
+def test_trim_silence_returns_view_without_copy():
+    trimmed = voice_activity.trim_silence(TWO_PHRASES, RATE)
+    assert isinstance(trimmed, memoryview)
+    assert len(trimmed) < len(TWO_PHRASES)
+
+
+def test_streaming_vad_ends_at_first_long_pause():
+    vad = voice_activity.StreamingVAD(RATE)
+    sent = b''
+    ended_at = None
+    for offset in range(0, len(TWO_PHRASES), 640):
+        out, end = vad.process(TWO_PHRASES[offset:offset + 640])
+        sent += out
+        if end:
+            ended_at = offset
+            break
+    # 实时录音：第一次停顿超过800ms即结束
+    assert ended_at is not None
+    assert RATE * 2 * 2.0 <= ended_at < RATE * 2 * 2.5
+
+
+def test_streaming_vad_skips_leading_silence():
+    vad = voice_activity.StreamingVAD(RATE)
+    out, _ = vad.process(pcm_clip((1.0, False)))
+    assert out == b''
+    assert not vad.speech_started
+
+
+def test_uploaded_audio_sessions_do_not_use_streaming_vad():
+    client = XunfeiASROfficial("appid", "key", "secret", pool_size=0)
+    assert client.start_stream().vad is None
+
+
+def test_live_sessions_use_streaming_vad(monkeypatch):
+    monkeypatch.setattr("xunfei_asr_official.XunfeiConnectionPool",
+                        lambda *args, **kwargs: None)
+    client = XunfeiClient("appid", "key", "secret")
+    assert client.start_speech_stream().vad is not None
+
+
+class EchoWebSocket:
+    """收到结束帧后返回最终结果的假连接"""
+
+    def __init__(self):
+        self.results = queue.Queue()
+
+    def send(self, frame):
+        if json.loads(frame)["data"]["status"] == 2:
+            self.results.put(json.dumps({"code": 0, "data": {"status": 2, "result": {
+                "sn": 1, "ls": True, "ws": [{"cw": [{"w": "好"}]}]}}}))
+
+    def recv(self):
+        return self.results.get(timeout=5)
+
+    def close(self):
+        pass
+
+
+def test_recognize_stream_keeps_phrase_after_pause(monkeypatch):
+    """上传的完整录音经 recognize_stream 发送时，停顿之后的短语也要发送"""
+    client = XunfeiASROfficial("appid", "key", "secret", pool_size=0)
+    monkeypatch.setattr(client.connection_pool, "acquire", EchoWebSocket)
+    sessions = []
+    start_stream = client.start_stream
+    monkeypatch.setattr(client, "start_stream",
+                        lambda *args, **kwargs: sessions.append(start_stream(*args, **kwargs)) or sessions[-1])
+
+    frames = [TWO_PHRASES[i:i + 1280] for i in range(0, len(TWO_PHRASES), 1280)]
+    assert client.recognize_stream(frames, RATE)["success"]
+    assert sessions[0].bytes_sent == len(TWO_PHRASES)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""讯飞动态修正(wpgs)结果拼接"""
+
+from xunfei_transcript import TranscriptAssembler
+
+
+def result(text, sn, pgs="apd", rg=None, ls=False):
+    data = {"sn": sn, "pgs": pgs, "ls": ls, "ws": [{"cw": [{"w": ch}]} for ch in text]}
+    if rg is not None:
+        data["rg"] = rg
+    return data
+
+
+def test_append_and_replace():
+    assembler = TranscriptAssembler()
+    assembler.add_result(result("今天", 1))
+    assembler.add_result(result("今天天", 2, "rpl", [1, 1]))
+    assert assembler.text == "今天天"
+    assembler.add_result(result("今天天气", 3, "rpl", [2, 2]))
+    assembler.add_result(result("怎么样", 4))
+    assert assembler.text == "今天天气怎么样"
+    # 追加之后，被追加的片段不会再被修改
+    assert assembler.stable_text == "今天天气"
+    assert assembler.partial_text == "怎么样"
+
+
+def test_replace_range_spanning_segments():
+    assembler = TranscriptAssembler()
+    assembler.add_result(result("打开百", 1))
+    assembler.add_result(result("打开百度", 2, "rpl", [1, 1]))
+    assembler.add_result(result("打开百度网", 3, "rpl", [1, 2]))
+    assert assembler.text == "打开百度网"
+    assert assembler.stable_text == ""
+
+
+def test_replace_of_settled_segment_keeps_stable_text():
+    assembler = TranscriptAssembler()
+    assembler.add_result(result("播放", 1))
+    assembler.add_result(result("稻香", 2))
+    assembler.add_result(result("改写", 3, "rpl", [1, 3]))
+    assert assembler.stable_text == "播放"
+    assert assembler.text == "播放改写"
+
+
+def test_last_result_settles_everything():
+    assembler = TranscriptAssembler()
+    assembler.add_message({"data": {"result": result("你好", 1)}})
+    assembler.add_message({"data": {"result": result("", 2, ls=True)}})
+    assert assembler.last
+    assert assembler.stable_text == "你好"
+    assert assembler.partial_text == ""
+
+
+def test_results_without_wpgs_are_appended():
+    assembler = TranscriptAssembler()
+    for text in ("一", "二", "三"):
+        assembler.add_result({"ws": [{"cw": [{"w": text}]}]})
+    assert assembler.text == "一二三"
+
+
+def test_changed_flag_and_reset():
+    assembler = TranscriptAssembler()
+    assert not assembler.add_result({})
+    assert not assembler.add_message({"data": {}})
+    assert assembler.add_result(result("好", 1))
+    assembler.reset()
+    assert assembler.text == "" and not assembler.last
+
+
+def test_long_stream_keeps_pending_small():
+    assembler = TranscriptAssembler()
+    for sn in range(1, 2001):
+        assembler.add_result(result("字", sn))
+        assembler.add_result(result("词", sn, "rpl", [sn, sn]))
+    assert assembler.text == "词" * 2000
+    assert len(assembler._pending) == 1
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""讯飞连接池与识别会话的连接使用"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+import xunfei_ws_pool
+from xunfei_asr_official import XunfeiASROfficial, UPLOAD_BURST
+from xunfei_ws_pool import XunfeiConnectionPool
+
+
+class FakeWebSocket:
+    """只实现连接池和识别会话用到的方法；recv按顺序返回预先放入的消息"""
+
+    def __init__(self, messages=()):
+        self.connected = True
+        self.ping_ok = True
+        self.sent = []
+        self.messages = queue.Queue()
+        for message in messages:
+            self.messages.put(message)
+
+    def ping(self):
+        if not self.ping_ok:
+            raise ConnectionResetError("closed by server")
+
+    def send(self, frame):
+        self.sent.append(frame)
+
+    def recv(self):
+        return self.messages.get(timeout=5)
+
+    def close(self):
+        self.connected = False
+
+
+FINAL_MESSAGE = json.dumps({
+    "code": 0,
+    "data": {"status": 2, "result": {"sn": 1, "ls": True, "ws": [{"cw": [{"w": "你好"}]}]}}
+})
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """记录连接池新建的连接"""
+    connections = []
+
+    def create_connection(url, **kwargs):
+        ws = FakeWebSocket()
+        connections.append(ws)
+        return ws
+
+    monkeypatch.setattr(xunfei_ws_pool.websocket, "create_connection", create_connection)
+    return connections
+
+
+def test_idle_connections_are_kept_while_healthy(opened):
+    pool = XunfeiConnectionPool(lambda: "wss://example", pool_size=1, ping_interval=0.01)
+    try:
+        time.sleep(0.2)
+        assert len(opened) == 1
+        assert pool.get_stats()["expired"] == 0
+    finally:
+        pool.close()
+
+
+def test_acquire_does_not_wait_for_health_check(opened):
+    pool = XunfeiConnectionPool(lambda: "wss://example", pool_size=2, ping_interval=0.01)
+    release = threading.Event()
+    pinging = threading.Event()
+
+    def slow_ping():
+        pinging.set()
+        release.wait(5)
+
+    try:
+        time.sleep(0.05)
+        assert len(opened) == 2
+        for ws in opened:
+            ws.ping = slow_ping
+        assert pinging.wait(1)
+        # 后台线程正在ping其中一个连接，另一个连接立即可用
+        started = time.monotonic()
+        ws = pool.acquire()
+        assert time.monotonic() - started < 0.5
+        assert ws in opened
+        assert pool.get_stats()["warm_hits"] == 1
+    finally:
+        release.set()
+        pool.close()
+
+
+def test_failed_ping_replaces_connection(opened):
+    pool = XunfeiConnectionPool(lambda: "wss://example", pool_size=1, ping_interval=0.01)
+    try:
+        time.sleep(0.05)
+        opened[0].ping_ok = False
+        time.sleep(0.1)
+        assert len(opened) == 2
+        assert pool.acquire() is opened[1]
+    finally:
+        pool.close()
+
+
+def test_expired_url_replaces_connection(opened):
+    pool = XunfeiConnectionPool(lambda: "wss://example", pool_size=1, ping_interval=0.01, url_ttl=0.05)
+    try:
+        time.sleep(0.3)
+        assert len(opened) > 1
+        assert not opened[0].connected
+    finally:
+        pool.close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = XunfeiASROfficial("appid", "key", "secret", pool_size=0)
+    acquired = []
+
+    def acquire():
+        ws = FakeWebSocket([FINAL_MESSAGE])
+        acquired.append(ws)
+        return ws
+
+    monkeypatch.setattr(client.connection_pool, "acquire", acquire)
+    client.acquired = acquired
+    return client
+
+
+def test_session_acquires_connection_on_first_frame(client):
+    session = client.start_stream(vad=False)
+    assert client.acquired == []
+    session.feed(b'\x00\x00' * 640)
+    assert len(client.acquired) == 1
+    assert session.finish()["text"] == "你好"
+
+
+def test_async_recognize_uses_pool(client):
+    result = asyncio.run(client.arecognize(b'\x00\x00' * 1600, UPLOAD_BURST))
+    assert result == {"success": True, "text": "你好"}
+    assert len(client.acquired) == 1
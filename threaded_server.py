@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发HTTP服务器 - 有界线程池 + 背压
+负责：并发处理请求、饱和时返回429、统计排队等待时间；
+长时间占用连接的流（WebSocket、SSE、分块音频）使用单独的名额，不挤占普通请求的工作线程
+"""
+
+import json
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+
+class RequestMetrics:
+    """请求排队与拒绝统计（线程安全）"""
+
+    def __init__(self, window_size: int = 1024):
+        """
+        参数:
+            window_size: 计算分位数时保留的最近样本数
+        """
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=window_size)
+        self.accepted = 0
+        self.rejected = 0
+        self.active = 0
+        self.streams = 0
+        self.streams_rejected = 0
+        self.started = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def record_accept(self):
+        with self._lock:
+            self.accepted += 1
+
+    def record_reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_start(self, queue_wait: float):
+        """记录一个请求开始处理，queue_wait为排队等待秒数"""
+        with self._lock:
+            self.active += 1
+            self.started += 1
+            self.total_queue_wait += queue_wait
+            self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+            self._queue_waits.append(queue_wait)
+
+    def record_finish(self):
+        with self._lock:
+            self.active -= 1
+
+    def record_stream(self, started: bool):
+        """记录一个请求转为流（started为False表示流名额已满被拒绝）"""
+        with self._lock:
+            if started:
+                self.streams += 1
+            else:
+                self.streams_rejected += 1
+
+    def record_stream_finish(self):
+        with self._lock:
+            self.streams -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前统计快照（时间单位: 毫秒）"""
+        with self._lock:
+            waits = sorted(self._queue_waits)
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "active": self.active,
+                "streams": self.streams,
+                "streams_rejected": self.streams_rejected,
+                "queue_wait_ms": {
+                    "avg": round(self.total_queue_wait / self.started * 1000, 3) if self.started else 0.0,
+                    "p50": round(self._percentile(waits, 0.50) * 1000, 3),
+                    "p95": round(self._percentile(waits, 0.95) * 1000, 3),
+                    "p99": round(self._percentile(waits, 0.99) * 1000, 3),
+                    "max": round(self.max_queue_wait * 1000, 3)
+                }
+            }
+
+    @staticmethod
+    def _percentile(sorted_values, q: float) -> float:
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+        return sorted_values[index]
+
+
+class BoundedThreadPoolServer(socketserver.TCPServer):
+    """
+    有界线程池TCP服务器
+
+    - 最多 max_workers 个请求同时处理
+    - 最多 max_queue 个请求排队等待
+    - 超出容量的连接直接返回 429 Too Many Requests
+    - 处理器调用 begin_stream() 把当前请求转为长连接流：改占 max_streams 中的流名额并让出请求名额，
+      线程池另有 max_streams 个线程，流再多也总有 max_workers 个线程处理普通请求（如/health）
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_workers: int = 8,
+                 max_queue: int = 32, retry_after: int = 1, max_streams: int = 16):
+        """
+        参数:
+            server_address: (host, port)
+            handler_class: 请求处理器类
+            max_workers: 并发处理的最大请求数（不含已转为流的请求）
+            max_queue: 允许排队的最大请求数
+            retry_after: 429响应中建议的重试秒数
+            max_streams: 同时保持的长连接流数，超出时 begin_stream() 返回False
+        """
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.max_streams = max_streams
+        self.metrics = RequestMetrics()
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._stream_slots = threading.BoundedSemaphore(max_streams)
+        self._streaming = threading.local()  # 当前工作线程上的请求是否已转为流
+        self._executor = ThreadPoolExecutor(max_workers=max_workers + max_streams,
+                                            thread_name_prefix="request-worker")
+
+    def process_request(self, request, client_address):
+        """接收连接后放入线程池，容量已满时立即拒绝"""
+        if not self._slots.acquire(blocking=False):
+            self.metrics.record_reject()
+            self._reject_busy(request)
+            self.shutdown_request(request)
+            return
+
+        self.metrics.record_accept()
+        enqueued_at = time.monotonic()
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address, enqueued_at)
+        except RuntimeError:
+            # 线程池已关闭（服务器正在停止）
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address, enqueued_at: float):
+        """线程池中执行的请求处理"""
+        self.metrics.record_start(time.monotonic() - enqueued_at)
+        self._streaming.active = False
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.metrics.record_finish()
+            if self._streaming.active:
+                self._streaming.active = False
+                self.metrics.record_stream_finish()
+                self._stream_slots.release()
+            else:
+                self._slots.release()
+
+    def begin_stream(self) -> bool:
+        """
+        在处理器中调用：当前请求将长时间占用连接（WebSocket、SSE等），
+        改占流名额并让出请求名额，连接结束时归还流名额
+
+        返回:
+            流名额已满时返回False（处理器应返回429），否则True
+        """
+        if getattr(self._streaming, "active", False):
+            return True
+        if not self._stream_slots.acquire(blocking=False):
+            self.metrics.record_stream(False)
+            return False
+        self._streaming.active = True
+        self.metrics.record_stream(True)
+        self._slots.release()
+        return True
+
+    def _reject_busy(self, request):
+        """直接在socket上写出429响应，不占用工作线程"""
+        body = json.dumps({
+            "success": False,
+            "error": "服务器繁忙，请稍后重试"
+        }, ensure_ascii=False).encode('utf-8')
+        header = (
+            "HTTP/1.1 429 Too Many Requests\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Retry-After: {self.retry_after}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode('ascii')
+        try:
+            # 先尽量读掉请求头，避免关闭时因接收缓冲区有残留数据而发送RST
+            request.settimeout(0.05)
+            request.recv(65536)
+        except OSError:
+            pass
+        try:
+            request.sendall(header + body)
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """服务器并发统计"""
+        stats = self.metrics.snapshot()
+        stats["max_workers"] = self.max_workers
+        stats["max_queue"] = self.max_queue
+        stats["max_streams"] = self.max_streams
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
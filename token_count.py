@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词token数估算
+不依赖具体模型的分词器：中日韩字符约1个token，其它文本约4个字符1个token
+用于统计每次调用的输入规模，接口返回 usage 时以接口为准
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+MESSAGE_OVERHEAD = 4  # 每条消息的角色、分隔符等固定开销
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的token数"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """估算消息列表的token数"""
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD for m in messages)
+
+
+class PromptUsageStats:
+    """按调用统计输入token：本地估算值，以及接口返回的 usage（含前缀缓存命中的token数）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.estimated_tokens = 0
+        self.reported_calls = 0
+        self.reported_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, estimated: int, usage: Optional[Dict[str, Any]] = None):
+        """
+        参数:
+            estimated: 本次输入的估算token数
+            usage: 接口返回的usage（流式调用通常没有）
+        """
+        with self._lock:
+            self.calls += 1
+            self.estimated_tokens += estimated
+            if usage and usage.get("prompt_tokens"):
+                self.reported_calls += 1
+                self.reported_tokens += usage["prompt_tokens"]
+                details = usage.get("prompt_tokens_details") or {}
+                self.cached_tokens += details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avg_estimated_tokens": round(self.estimated_tokens / self.calls, 1) if self.calls else 0,
+                "reported_calls": self.reported_calls,
+                "avg_reported_tokens": round(self.reported_tokens / self.reported_calls, 1) if self.reported_calls else 0,
+                "cached_token_ratio": round(self.cached_tokens / self.reported_tokens, 4) if self.reported_tokens else 0.0
+            }
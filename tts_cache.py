@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TTS音频缓存
+按 (文本, 发音人, 编码, 语速) 的内容哈希缓存合成结果（音频和时长等附加字段）：
+内存中为有容量上限的LRU，可选的磁盘层重启后仍然有效；
+磁盘层以只读内存映射打开，命中时返回映射上的memoryview，不把整个文件复制到内存
+"""
+
+import asyncio
+import hashlib
+import inspect
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from streaming_tts import audio_bytes
+
+
+def cache_key(text: str, voice_type: Any = None, encoding: str = "mp3", speed_ratio: float = 1.0,
+              namespace: str = "") -> str:
+    """缓存键：合成参数的SHA-256"""
+    raw = json.dumps([namespace, text, voice_type, encoding, float(speed_ratio)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """两级TTS缓存：内存LRU + 可选磁盘目录"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024,
+                 disk_dir: Optional[str] = None):
+        """
+        参数:
+            max_entries: 内存中最多缓存的条目数
+            max_bytes: 内存中缓存音频的总字节上限
+            disk_dir: 磁盘缓存目录，None表示只用内存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        # 键 → (音频字节, 附加字段如duration)
+        self._memory: "OrderedDict[str, Tuple[bytes, Dict[str, Any]]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[memoryview, Dict[str, Any]]]:
+        """
+        映射音频文件，读取旁边的附加字段文件
+        关闭文件后映射仍然有效，页面由操作系统按需读入；文件被原子替换时映射仍指向旧内容
+        """
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                audio = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️  读取TTS磁盘缓存失败: {e}")
+            return None
+        try:
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        return audio, meta
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            # 原子替换，并发读取的进程不会读到半个文件
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _write_disk(self, key: str, audio: bytes, meta: Dict[str, Any]):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写附加字段，音频文件出现时附加字段已经就绪
+            self._write_atomic(f"{path}.json", json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            self._write_atomic(path, audio)
+        except OSError as e:
+            print(f"⚠️  写入TTS磁盘缓存失败: {e}")
+
+    def _remember(self, key: str, audio: bytes, meta: Dict[str, Any]):
+        """放入内存LRU（调用方持有锁）"""
+        if len(audio) > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old[0])
+        self._memory[key] = (audio, meta)
+        self._memory_bytes += len(audio)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """
+        查找缓存，磁盘命中时提升到内存（磁盘读取会阻塞，异步代码中应放到线程池执行）
+
+        返回:
+            (音频字节, 附加字段)，未命中返回None；来自磁盘层的音频为只读memoryview
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        entry = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, *entry)
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        """是否已缓存（不计入命中统计）"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, key: str, audio: bytes, meta: Optional[Dict[str, Any]] = None):
+        """
+        写入缓存（内存，以及配置了的磁盘目录）
+
+        参数:
+            audio: 音频字节
+            meta: 与音频一起返回的附加字段（如duration），须能序列化为JSON
+        """
+        audio = bytes(audio)
+        meta = dict(meta or {})
+        with self._lock:
+            self._remember(key, audio, meta)
+        if self.disk_dir:
+            self._write_disk(key, audio, meta)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "disk_dir": self.disk_dir
+            }
+
+
+class CachedTTSClient:
+    """
+    给TTS客户端加缓存的包装器，其它方法（chat等）原样转发
+    audio_data 统一为音频字节（磁盘层命中时为只读memoryview，用法与bytes相同）；
+    命中时返回与实际合成相同的字段（如duration），另加 cached=True
+    """
+
+    # 不随音频缓存的结果字段
+    _RESULT_FIELDS = ("success", "audio_data", "error", "cached")
+
+    def __init__(self, client, cache: TTSCache):
+        self.client = client
+        self.cache = cache
+        self._signature = inspect.signature(client.text_to_speech)
+        self._namespace = type(client).__name__
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _key(self, text: str, args, kwargs) -> str:
+        bound = self._signature.bind(text, *args, **kwargs)
+        bound.apply_defaults()
+        params = bound.arguments
+        return cache_key(text, params.get("voice_type"), params.get("encoding", "mp3"),
+                         params.get("speed_ratio", 1.0), self._namespace)
+
+    @staticmethod
+    def _hit(entry: Tuple[bytes, Dict[str, Any]]) -> Dict[str, Any]:
+        audio, meta = entry
+        return dict(meta, success=True, audio_data=audio, cached=True)
+
+    def _store(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        if result.get('success') and not result.get('demo_mode'):
+            audio = audio_bytes(result)
+            if audio:
+                meta = {}
+                for name, value in result.items():
+                    if name in self._RESULT_FIELDS:
+                        continue
+                    try:
+                        json.dumps(value)
+                    except (TypeError, ValueError):
+                        continue
+                    meta[name] = value
+                self.cache.put(key, audio, meta)
+                result = dict(result, audio_data=audio)
+        return result
+
+    def text_to_speech(self, text: str, *args, **kwargs) -> Dict[str, Any]:
+        key = self._key(text, args, kwargs)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return self._hit(entry)
+        return self._store(key, self.client.text_to_speech(text, *args, **kwargs))
+
+    async def atext_to_speech(self, text: str, *args, **kwargs) -> Dict[str, Any]:
+        key = self._key(text, args, kwargs)
+        # 磁盘读写放到线程池，不阻塞事件循环
+        entry = await asyncio.to_thread(self.cache.get, key)
+        if entry is not None:
+            return self._hit(entry)
+        method = getattr(self.client, "atext_to_speech", None)
+        if method is not None:
+            result = await method(text, *args, **kwargs)
+        else:
+            result = await asyncio.to_thread(self.client.text_to_speech, text, *args, **kwargs)
+        return await asyncio.to_thread(self._store, key, result)
+
+    def prewarm(self, texts: Iterable[str], background: bool = True):
+        """
+        预先合成常用回复，已缓存的跳过
+
+        参数:
+            texts: 要预热的文本
+            background: 是否在后台线程中进行（不阻塞启动）
+        """
+        texts = list(dict.fromkeys(texts))
+
+        def run():
+            warmed = 0
+            for text in texts:
+                key = self._key(text, (), {})
+                if key in self.cache:
+                    continue
+                try:
+                    if self._store(key, self.client.text_to_speech(text)).get('success'):
+                        warmed += 1
+                except Exception as e:
+                    print(f"⚠️  TTS预热失败: {text}: {e}")
+            print(f"🔥 TTS缓存预热完成: 新合成 {warmed} 条，共 {len(texts)} 条")
+
+        if background:
+            threading.Thread(target=run, name="tts-prewarm", daemon=True).start()
+        else:
+            run()
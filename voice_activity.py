@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地语音活动检测(VAD) - 基于短时能量和过零率
+用于：上传前去除首尾静音，流式识别时检测说话结束并提前结束发送
+只处理16bit单声道PCM，特征按帧向量化计算（需要numpy）
+"""
+
+from collections import deque
+from typing import Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：未安装时不做本地VAD，完全依赖讯飞的vad_eos
+    np = None
+
+FRAME_MS = 20  # 分析帧长度
+MIN_THRESHOLD_DB = -45.0  # 绝对能量门限(dBFS)，低于该值一定是静音
+NOISE_MARGIN_DB = 12.0  # 高于背景噪声多少dB认为是语音
+FRICATIVE_ZCR = 0.25  # 清辅音（如s、x）能量低但过零率高
+
+
+def available() -> bool:
+    """是否可以使用本地VAD"""
+    return np is not None
+
+
+def frame_features(pcm, sample_rate: int = 16000, frame_ms: int = FRAME_MS):
+    """
+    逐帧计算能量和过零率（不足一帧的尾部忽略）
+
+    返回:
+        (能量dBFS数组, 过零率数组)
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    samples = np.frombuffer(memoryview(pcm), dtype='<i2')
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20.0 * np.log10(np.maximum(rms, 1e-6))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1)
+    return energy_db, zcr.astype(np.float32)
+
+
+def speech_mask(energy_db, zcr, noise_db: float):
+    """按能量门限（随背景噪声自适应）和过零率判断每一帧是否为语音"""
+    threshold = max(MIN_THRESHOLD_DB, noise_db + NOISE_MARGIN_DB)
+    voiced = energy_db > threshold
+    unvoiced = (energy_db > threshold - 6.0) & (zcr > FRICATIVE_ZCR)
+    return voiced | unvoiced
+
+
+def trim_silence(pcm, sample_rate: int = 16000, pad_ms: int = 200) -> memoryview:
+    """
+    去除首尾静音，保留语音前后各pad_ms毫秒
+
+    参数:
+        pcm: 16bit单声道PCM
+        sample_rate: 采样率
+        pad_ms: 语音前后保留的静音长度，避免截掉起始/结尾的弱音
+
+    返回:
+        原缓冲区上的memoryview切片；未检测到语音时返回完整音频
+    """
+    view = memoryview(pcm)
+    if np is None:
+        return view
+
+    energy_db, zcr = frame_features(view, sample_rate)
+    if len(energy_db) == 0:
+        return view
+
+    # 以较安静的10%帧估计背景噪声
+    noise_db = float(np.percentile(energy_db, 10))
+    speech = np.flatnonzero(speech_mask(energy_db, zcr, noise_db))
+    if len(speech) == 0:
+        return view
+
+    frame_bytes = sample_rate * FRAME_MS // 1000 * 2
+    pad_bytes = sample_rate * pad_ms // 1000 * 2
+    start = max(0, int(speech[0]) * frame_bytes - pad_bytes)
+    end = min(len(view), (int(speech[-1]) + 1) * frame_bytes + pad_bytes)
+    return view[start:end]
+
+
+class StreamingVAD:
+    """
+    流式VAD：逐段输入PCM，返回应当发送的音频
+    说话开始前只缓存最近preroll_ms的音频（不发送），检测到语音后连同缓存一起发送；
+    语音之后连续静音达到hangover_ms时报告说话结束
+    """
+
+    def __init__(self, sample_rate: int = 16000, hangover_ms: int = 800,
+                 preroll_ms: int = 300, min_speech_ms: int = 60):
+        """
+        参数:
+            sample_rate: 采样率
+            hangover_ms: 语音之后多长的静音判定为说话结束
+            preroll_ms: 语音开始前保留的音频长度
+            min_speech_ms: 连续多长的语音帧才判定为开始说话（过滤短暂噪声）
+        """
+        self.frame_bytes = sample_rate * FRAME_MS // 1000 * 2
+        self.sample_rate = sample_rate
+        self.hangover_frames = hangover_ms // FRAME_MS
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+
+        self.noise_db = MIN_THRESHOLD_DB - NOISE_MARGIN_DB
+        self.speech_started = False
+        self.end_of_speech = False
+        self.silence_frames = 0
+        self.bytes_skipped = 0
+
+        self._speech_run = 0
+        self._remainder = b''
+        self._preroll = deque(maxlen=max(1, preroll_ms // FRAME_MS))
+
+    def process(self, pcm) -> Tuple[bytes, bool]:
+        """
+        输入一段PCM
+
+        返回:
+            (应发送的音频, 是否检测到说话结束)
+        """
+        data = self._remainder + bytes(pcm)
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable or self.end_of_speech:
+            return (data[:usable] if self.speech_started and not self.end_of_speech else b''), self.end_of_speech
+
+        energy_db, zcr = frame_features(memoryview(data)[:usable], self.sample_rate)
+        is_speech = speech_mask(energy_db, zcr, self.noise_db)
+
+        # 用静音帧更新背景噪声估计
+        if not is_speech.all():
+            quiet = float(energy_db[~is_speech].mean())
+            self.noise_db = 0.9 * self.noise_db + 0.1 * quiet
+
+        out = []
+        for i, speech in enumerate(is_speech.tolist()):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            if not self.speech_started:
+                self._speech_run = self._speech_run + 1 if speech else 0
+                if len(self._preroll) == self._preroll.maxlen:
+                    self.bytes_skipped += len(self._preroll[0])
+                self._preroll.append(frame)
+                if self._speech_run >= self.min_speech_frames:
+                    self.speech_started = True
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                continue
+
+            out.append(frame)
+            self.silence_frames = 0 if speech else self.silence_frames + 1
+            if self.silence_frames >= self.hangover_frames:
+                self.end_of_speech = True
+                break
+
+        return b''.join(out), self.end_of_speech
@@ -6,18 +6,136 @@
 """
 
 import http.server
-import socketserver
 import json
 import os
 import base64
+import re
+import threading
+from http.cookies import SimpleCookie, CookieError
 from urllib.parse import urlparse, parse_qs
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from baidu_api_client import BaiduAPIClient, BaiduAPIDemoClient
 from qiniu_api_client import QiniuAPIClient
 from xunfei_client import XunfeiClient
 from intelligent_agent import IntelligentAgent
 from system_controller import SystemController
+from threaded_server import BoundedThreadPoolServer
+from async_pipeline import VoicePipeline
+from http_pool import configure_shared_pool, get_shared_pool
+from websocket_server import is_websocket_upgrade, accept_websocket, WebSocketClosed
+from audio_utils import StreamingDecoder
+from tts_cache import TTSCache, CachedTTSClient
+from session_manager import SessionManager
+
+# 会话ID的Cookie名和允许的格式
+SESSION_COOKIE = "session_id"
+SESSION_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# 请求中可指定的裸PCM采样率范围（Hz），讯飞实际只接受16000/8000，其余由识别时报错说明
+MIN_SAMPLE_RATE = 4000
+MAX_SAMPLE_RATE = 192000
+
+# 可直接上传到 /api/voice 的音频类型 -> 识别使用的音频格式
+AUDIO_CONTENT_TYPES = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/pcm": "pcm",
+    "audio/l16": "pcm",
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+}
+
+# 分块传输编码中的块大小（十六进制）
+CHUNK_SIZE_PATTERN = re.compile(rb'[0-9A-Fa-f]{1,16}')
+
+
+def parse_sample_rate(value) -> Optional[int]:
+    """解析请求中的采样率，不是合理范围内的正整数时返回None"""
+    try:
+        rate = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return rate if MIN_SAMPLE_RATE <= rate <= MAX_SAMPLE_RATE else None
+
+
+class RequestBody:
+    """
+    按块读取HTTP请求体的迭代器，支持Content-Length和分块传输编码(chunked)
+    读取加锁，可以被解码线程和处理线程先后消费；drain()丢弃未读完的部分
+    请求体不完整（连接提前断开）时抛出ConnectionError，分块格式错误时抛出ValueError
+    """
+    
+    def __init__(self, rfile, headers, chunk_size: int = 16384):
+        self.rfile = rfile
+        self.chunk_size = chunk_size
+        self.chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+        self.remaining = 0 if self.chunked else int(headers.get('Content-Length', 0))
+        self.bytes_read = 0
+        self.done = not self.chunked and self.remaining <= 0
+        self._read = getattr(rfile, 'read1', rfile.read)
+        self._lock = threading.Lock()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> bytes:
+        with self._lock:
+            if self.done:
+                raise StopIteration
+            if self.chunked and self.remaining == 0:
+                self.remaining = self._next_chunk_size()
+                if self.remaining == 0:
+                    self.done = True
+                    raise StopIteration
+            
+            # read1只返回已到达的数据，不等凑满chunk_size，边传边识别
+            data = self._read(min(self.chunk_size, self.remaining))
+            if not data:
+                self.done = True
+                raise ConnectionError("请求体不完整，连接已断开")
+            self.remaining -= len(data)
+            self.bytes_read += len(data)
+            if self.remaining == 0:
+                if self.chunked:
+                    # 块末尾的CRLF
+                    if self._readline().strip():
+                        self.done = True
+                        raise ValueError("分块数据长度与声明不符")
+                else:
+                    self.done = True
+            return data
+    
+    def _readline(self) -> bytes:
+        """读取一行，连接断开（没有读到换行）时抛出ConnectionError"""
+        line = self.rfile.readline(65537)
+        if not line.endswith(b'\n'):
+            self.done = True
+            raise ConnectionError("请求体不完整，连接已断开")
+        return line
+    
+    def _next_chunk_size(self) -> int:
+        line = self._readline()
+        # 块大小后可以带 ;扩展参数
+        size_field = line.split(b';', 1)[0].strip()
+        if not CHUNK_SIZE_PATTERN.fullmatch(size_field):
+            self.done = True
+            raise ValueError(f"分块大小无效: {size_field[:20]!r}")
+        size = int(size_field, 16)
+        if size == 0:
+            # 跳过trailer直到空行
+            while self._readline().strip():
+                pass
+        return size
+    
+    def drain(self):
+        """读完剩余的请求体（识别提前结束时，保证响应能被客户端正常收到）"""
+        try:
+            for _ in self:
+                pass
+        except (ConnectionError, ValueError):
+            pass
 
 
 class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
@@ -28,6 +146,12 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
     xunfei_client = None
     agent = None
     controller = None
+    tts_client = None
+    pipeline = None
+    
+    # 每个请求的会话ID（见 get_session_id）
+    _session_id = None
+    _issued_session_id = None
     
     @classmethod
     def initialize_components(cls):
@@ -35,6 +159,13 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
         if cls.api_client is None:
             print("🚀 初始化语音助手组件...")
             
+            # 所有LLM/TTS客户端共享的HTTP长连接池
+            configure_shared_pool(
+                pool_maxsize=32,
+                max_retries=2,
+                host_limits={"https://openai.qiniu.com": 16}
+            )
+            
             # 使用七牛云LLM
             qiniu_api_key = "sk-ca1afda060bc12b11cdbc0e7d34a4e1f741325f6685430ceef06f4596eaf90aa"
             cls.api_client = QiniuAPIClient(api_key=qiniu_api_key)
@@ -46,17 +177,31 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
                 api_secret="OWQyOTY5OWI4OTU0YzYwMDAzYmE1ZGQ4"
             )
             
-            # 初始化智能Agent
-            cls.agent = IntelligentAgent(cls.api_client)
+            # 初始化智能Agent：所有会话共享一个Agent（工具注册表、意图缓存、API客户端只有一份），
+            # 每个会话只在会话管理器中保存对话历史等轻量上下文
+            cls.agent = IntelligentAgent(
+                cls.api_client,
+                sessions=SessionManager(max_sessions=1000, idle_timeout=1800)
+            )
             
             # 初始化系统控制器
             cls.controller = SystemController()
             
+            # 带缓存的TTS：常用回复只合成一次，磁盘缓存在重启后仍然有效
+            tts_cache = TTSCache(disk_dir=os.path.expanduser("~/echo-command/cache/tts"))
+            cls.tts_client = CachedTTSClient(cls.api_client, tts_cache)
+            cls.tts_client.prewarm(cls.controller.common_messages())
+            
+            # 初始化异步处理流水线（ASR → Agent → 控制器 → TTS）
+            cls.pipeline = VoicePipeline(cls.api_client, cls.xunfei_client, cls.agent, cls.controller,
+                                         tts_client=cls.tts_client)
+            
             print("✅ 组件初始化完成")
     
     def do_GET(self):
         """处理GET请求"""
         parsed_path = urlparse(self.path)
+        self._session_id = self._issued_session_id = None
         
         # 健康检查
         if parsed_path.path == '/health':
@@ -73,10 +218,62 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
             })
             return
         
-        # 对话历史
+        # 并发与排队统计
+        if parsed_path.path == '/api/metrics':
+            self.send_json_response({
+                "success": True,
+                "server": self.server.get_stats(),
+                "http_pool": get_shared_pool().get_stats(),
+                "asr_pool": self.xunfei_client.websocket_asr.connection_pool.get_stats(),
+                "tts_cache": self.tts_client.cache.get_stats(),
+                "intent_routing": self.agent.get_routing_stats(),
+                "sessions": self.agent.sessions.get_stats(),
+                "chat_history": self.pipeline.history_compactor.get_stats()
+            })
+            return
+        
+        # 流式语音识别（WebSocket）
+        if parsed_path.path == '/ws':
+            if is_websocket_upgrade(self.headers):
+                audio_format = parse_qs(parsed_path.query).get('format', ['pcm'])[0]
+                self.handle_voice_stream(audio_format)
+            else:
+                self.send_json_response({
+                    "success": False,
+                    "error": "该端点需要WebSocket连接"
+                }, status_code=400)
+            return
+        
+        # 语音合成，直接返回音频（可用作 <audio src="/api/tts?text=...">）
+        if parsed_path.path == '/api/tts':
+            query = parse_qs(parsed_path.query)
+            self.handle_tts({
+                "text": query.get('text', [''])[0],
+                "response": "audio",
+                "stream": query.get('stream', ['0'])[0] in ('1', 'true')
+            })
+            return
+        
+        # 对话历史（分页，从新到旧）：/api/history?offset=0&limit=20
         if parsed_path.path == '/api/history':
-            history = self.agent.get_conversation_history()
-            self.send_json_response({"success": True, "history": history})
+            query = parse_qs(parsed_path.query)
+            try:
+                offset = int(query.get('offset', ['0'])[0])
+                limit = min(int(query.get('limit', ['20'])[0]), 100)
+            except ValueError:
+                self.send_json_response({
+                    "success": False,
+                    "error": "offset和limit必须是整数"
+                }, status_code=400)
+                return
+            page = self.agent.get_history_page(self.get_session_id(), offset, limit)
+            self.send_json_response({
+                "success": True,
+                "history": page["items"],
+                "total": page["total"],
+                "offset": page["offset"],
+                "limit": page["limit"]
+            })
             return
         
         # 静态文件服务
@@ -88,6 +285,15 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
         """处理POST请求"""
         parsed_path = urlparse(self.path)
+        self._session_id = self._issued_session_id = None
+        
+        # 语音接口也接受直接上传的二进制音频，边接收边识别
+        content_type = self.headers.get('Content-Type', '')
+        media_type = content_type.split(';', 1)[0].strip().lower()
+        if parsed_path.path == '/api/voice' and media_type in AUDIO_CONTENT_TYPES:
+            self.handle_voice_upload(AUDIO_CONTENT_TYPES[media_type], content_type,
+                                     parse_qs(parsed_path.query))
+            return
         
         # 读取请求体
         content_length = int(self.headers.get('Content-Length', 0))
@@ -121,6 +327,30 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
                 "error": f"未知的API端点: {parsed_path.path}"
             }, status_code=404)
     
+    def get_session_id(self) -> str:
+        """
+        会话ID：请求头 X-Session-ID、Cookie中的session_id或查询参数 session
+        都没有（或格式不对）时分配新的会话ID，由 end_headers 通过 Set-Cookie 下发
+        """
+        if self._session_id is not None:
+            return self._session_id
+        
+        session_id = self.headers.get('X-Session-ID', '')
+        if not session_id:
+            try:
+                morsel = SimpleCookie(self.headers.get('Cookie', '')).get(SESSION_COOKIE)
+                session_id = morsel.value if morsel else ''
+            except CookieError:
+                session_id = ''
+        if not session_id:
+            session_id = parse_qs(urlparse(self.path).query).get('session', [''])[0]
+        
+        session_id = session_id.strip()
+        if not SESSION_ID_PATTERN.fullmatch(session_id):
+            session_id = self._issued_session_id = SessionManager.new_session_id()
+        self._session_id = session_id
+        return session_id
+    
     def handle_text_input(self, request_data: Dict[str, Any]):
         """
         处理文本输入
@@ -143,43 +373,8 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
         print(f"📥 收到文本输入: {text}")
         print(f"{'='*60}")
         
-        # 使用Agent处理用户输入
-        agent_result = self.agent.process_user_input(text)
-        
-        # 如果Agent返回了工具调用，执行系统操作
-        if agent_result.get('success'):
-            action = agent_result.get('action') or agent_result.get('tool')
-            # 优先使用agent_result中的参数，fallback到parameters字段
-            parameters = dict(agent_result.get('parameters', {}))
-            # 如果parameters为空，尝试从agent_result的其他字段获取
-            if not parameters:
-                for key in ['url', 'target_name', 'song_name', 'artist', 'topic', 'query']:
-                    if key in agent_result:
-                        parameters[key] = agent_result[key]
-            
-            # 执行系统操作
-            execution_result = self.controller.execute_action(action, parameters)
-            
-            # 合并结果
-            response = {
-                "success": True,
-                "text": text,
-                "intent": {
-                    "action": action,
-                    "parameters": parameters
-                },
-                "execution": execution_result,
-                "message": execution_result.get('message', ''),
-                "tts_text": execution_result.get('message', '')
-            }
-        else:
-            response = {
-                "success": agent_result.get('success', False),
-                "text": text,
-                "message": agent_result.get('message', ''),
-                "error": agent_result.get('error'),
-                "tts_text": agent_result.get('message', '')
-            }
+        # Agent理解意图并执行系统操作
+        response = self.pipeline.process_text(text, session_id=self.get_session_id())
         
         self.send_json_response(response)
     
@@ -200,7 +395,7 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
         """
         audio_data = request_data.get('audio_data', '')
         audio_format = request_data.get('format', 'pcm')
-        sample_rate = request_data.get('rate', 16000)
+        sample_rate = parse_sample_rate(request_data.get('rate', 16000))
         
         if not audio_data:
             self.send_json_response({
@@ -209,6 +404,13 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
             }, status_code=400)
             return
         
+        if sample_rate is None:
+            self.send_json_response({
+                "success": False,
+                "error": f"采样率无效: {request_data.get('rate')}（应为 {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} 之间的整数）"
+            }, status_code=400)
+            return
+        
         print(f"\n{'='*60}")
         print(f"🎤 收到语音输入")
         print(f"{'='*60}")
@@ -217,7 +419,8 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
         if isinstance(audio_data, str) and not audio_data.startswith('data:'):
             # 直接是文本，跳过ASR
             recognized_text = audio_data
-            asr_success = True
+            print(f"📝 识别结果: {recognized_text}")
+            response = self.pipeline.process_text(recognized_text, "recognized_text", self.get_session_id())
         else:
             # 真实音频，使用讯飞语音识别
             try:
@@ -227,25 +430,8 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
                 
                 audio_bytes = base64.b64decode(audio_data)
                 
-                print(f"📤 使用讯飞ASR识别，音频大小: {len(audio_bytes)} bytes")
-                
-                # 调用讯飞语音识别
-                asr_result = self.xunfei_client.speech_recognition(
-                    audio_bytes, 
-                    format=audio_format, 
-                    rate=sample_rate
-                )
-                
-                if not asr_result.get('success'):
-                    self.send_json_response({
-                        "success": False,
-                        "error": f"讯飞语音识别失败: {asr_result.get('error')}"
-                    })
-                    return
-                
-                recognized_text = asr_result.get('text', '')
-                asr_success = True
-                print(f"✅ 讯飞识别成功: {recognized_text}")
+                response = self.pipeline.process_voice(audio_bytes, audio_format, sample_rate,
+                                                       self.get_session_id())
                 
             except Exception as e:
                 self.send_json_response({
@@ -254,54 +440,166 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
                 })
                 return
         
-        print(f"📝 识别结果: {recognized_text}")
-        
-        # 使用Agent处理识别出的文本
-        agent_result = self.agent.process_user_input(recognized_text)
-        
-        # 执行系统操作
-        if agent_result.get('success'):
-            action = agent_result.get('action') or agent_result.get('tool')
-            # 优先使用agent_result中的参数，fallback到parameters字段
-            parameters = dict(agent_result.get('parameters', {}))
-            # 如果parameters为空，尝试从agent_result的其他字段获取
-            if not parameters:
-                for key in ['url', 'target_name', 'song_name', 'artist', 'topic', 'query']:
-                    if key in agent_result:
-                        parameters[key] = agent_result[key]
-            
-            execution_result = self.controller.execute_action(action, parameters)
-            
-            response = {
-                "success": True,
-                "recognized_text": recognized_text,
-                "intent": {
-                    "action": action,
-                    "parameters": parameters
-                },
-                "execution": execution_result,
-                "message": execution_result.get('message', ''),
-                "tts_text": execution_result.get('message', '')
-            }
-        else:
+        self.send_json_response(response)
+    
+    def handle_voice_upload(self, audio_format: str, content_type: str, query: Dict[str, Any]):
+        """
+        处理二进制语音上传
+        
+        请求:
+            POST /api/voice
+            Content-Type: audio/wav | audio/pcm | audio/L16;rate=16000 | audio/webm | audio/ogg
+            请求体直接是音频（可以使用 Transfer-Encoding: chunked），
+            裸PCM的采样率取 ?rate= 或Content-Type中的rate参数，默认16000
+        
+        音频边接收边解码、发送给讯飞，不缓冲整个请求体；响应与JSON方式相同
+        """
+        rate = '16000'
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'rate':
+                rate = value
+        if 'rate' in query:
+            rate = query['rate'][0]
+        sample_rate = parse_sample_rate(rate)
+        if sample_rate is None:
+            # 请求体未读取，不能继续复用该连接
+            self.close_connection = True
+            self.send_json_response({
+                "success": False,
+                "error": f"采样率无效: {rate}（应为 {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} 之间的整数）"
+            }, status_code=400)
+            return
+        
+        print(f"\n{'='*60}")
+        print(f"🎤 收到语音上传: {content_type}")
+        print(f"{'='*60}")
+        
+        body = RequestBody(self.rfile, self.headers, chunk_size=8192)
+        try:
+            response = self.pipeline.process_voice_stream(body, audio_format, sample_rate,
+                                                          self.get_session_id())
+        except Exception as e:
             response = {
-                "success": agent_result.get('success', False),
-                "recognized_text": recognized_text,
-                "message": agent_result.get('message', ''),
-                "error": agent_result.get('error'),
-                "tts_text": agent_result.get('message', '')
+                "success": False,
+                "error": f"音频处理失败: {str(e)}"
             }
+        finally:
+            body.drain()
         
+        print(f"📊 音频上传 {body.bytes_read} bytes")
         self.send_json_response(response)
     
+    def handle_voice_stream(self, audio_format: str = "pcm"):
+        """
+        处理流式语音输入（WebSocket /ws，/ws?format=webm 表示发送MediaRecorder的WebM/Opus分片）
+        
+        客户端消息:
+            二进制帧: PCM音频（16kHz，16bit，单声道）或WebM分片，边录音边发送
+            {"type": "end"}: 录音结束
+        
+        服务端消息:
+            {"type": "partial", "text": "当前识别文本", "stable": "不会再被修正的部分"}
+            {"type": "final", "text": "最终识别文本"}
+            {"type": "result", ...与 /api/voice 相同的处理结果}
+            {"type": "error", "error": "错误信息"}
+        """
+        if not self.begin_stream():
+            return
+        conn = accept_websocket(self)
+        stream = None
+        decoder = None
+        decode_thread = None
+        
+        def push_partial(text):
+            try:
+                conn.send_json({"type": "partial", "text": text,
+                                "stable": stream.transcript.stable_text if stream else ""})
+            except (OSError, WebSocketClosed):
+                pass
+        
+        print(f"\n{'='*60}")
+        print(f"🎙️  流式语音连接已建立: {self.client_address[0]}")
+        print(f"{'='*60}")
+        
+        try:
+            stream = self.xunfei_client.start_speech_stream(on_partial=push_partial)
+            
+            if audio_format != "pcm":
+                # 压缩音频：解码线程把PCM帧随解随发，解码与录音、上传重叠
+                decoder = StreamingDecoder(audio_format)
+                
+                def forward_pcm():
+                    try:
+                        for frame in decoder.frames():
+                            if not stream.feed(frame):
+                                break
+                    except Exception as e:
+                        print(f"⚠️  流式解码失败: {e}")
+                
+                decode_thread = threading.Thread(target=forward_pcm, name="ws-decode", daemon=True)
+                decode_thread.start()
+            
+            # 转发音频，直到客户端结束录音或讯飞已给出最终结果
+            while not stream.finished.is_set():
+                message = conn.recv_message()
+                if isinstance(message, bytes):
+                    if decoder is not None:
+                        decoder.feed(message)
+                    elif not stream.feed(message):
+                        break
+                elif isinstance(message, dict) and message.get("type") == "end":
+                    break
+            
+            if decoder is not None:
+                # 等待解码器输出剩余的PCM
+                decoder.end_input()
+                decode_thread.join(timeout=10)
+            
+            asr_result = stream.finish()
+            if not asr_result.get('success'):
+                conn.send_json({
+                    "type": "error",
+                    "error": f"讯飞语音识别失败: {asr_result.get('error')}"
+                })
+                return
+            
+            # 最终结果一到立即开始意图理解
+            recognized_text = asr_result.get('text', '')
+            conn.send_json({"type": "final", "text": recognized_text})
+            
+            response = self.pipeline.process_text(recognized_text, "recognized_text", self.get_session_id())
+            conn.send_json(dict(response, type="result"))
+            
+        except WebSocketClosed:
+            print("🔌 客户端已断开流式语音连接")
+            if stream is not None:
+                stream.cancel()
+        except Exception as e:
+            print(f"❌ 流式语音处理失败: {e}")
+            if stream is not None:
+                stream.cancel()
+            try:
+                conn.send_json({"type": "error", "error": f"流式语音处理失败: {str(e)}"})
+            except (OSError, WebSocketClosed):
+                pass
+        finally:
+            if decoder is not None:
+                decoder.close()
+            conn.close()
+    
     def handle_tts(self, request_data: Dict[str, Any]):
         """
         处理TTS请求
         
         请求格式:
         {
-            "text": "要合成的文本"
+            "text": "要合成的文本",
+            "response": "audio",  # 可选，直接返回audio/mpeg音频；请求头 Accept: audio/mpeg 效果相同
+            "stream": true        # 可选，分句合成，每句合成完立即以分块传输发送
         }
+        
+        默认返回JSON，audio_data为base64编码的音频
         """
         text = request_data.get('text', '')
         
@@ -312,24 +610,101 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
             }, status_code=400)
             return
         
+        binary = request_data.get('response') == 'audio' or 'audio/' in self.headers.get('Accept', '')
+        
+        if request_data.get('stream'):
+            self.handle_tts_stream(text)
+            return
+        
         # 调用TTS
-        tts_result = self.api_client.text_to_speech(text)
+        tts_result = self.pipeline.text_to_speech(text)
         
-        if tts_result.get('success'):
-            # 将音频数据转为base64
-            audio_data = tts_result.get('audio_data', b'')
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
+        if not tts_result.get('success'):
             self.send_json_response({
-                "success": True,
-                "audio_data": audio_base64,
-                "text": text
+                "success": False,
+                "error": tts_result.get('error')
             })
-        else:
+            return
+        
+        # 七牛云返回的已是base64字符串，百度返回的是音频字节，各自只转换一次
+        audio_data = tts_result.get('audio_data', b'')
+        if binary:
+            if isinstance(audio_data, str):
+                audio_data = base64.b64decode(audio_data)
+            self.send_audio_response(audio_data)
+            return
+        
+        if isinstance(audio_data, (bytes, bytearray, memoryview)):
+            audio_data = base64.b64encode(audio_data).decode('ascii')
+        self.send_json_response({
+            "success": True,
+            "audio_data": audio_data,
+            "text": text
+        })
+    
+    def handle_tts_stream(self, text: str):
+        """
+        分句流式TTS：句子按顺序逐段发送audio/mpeg（MP3帧可以直接拼接播放）
+        HTTP/1.1使用分块传输编码，HTTP/1.0直接发送到连接关闭
+        """
+        if not self.begin_stream():
+            return
+        segments = self.pipeline.text_to_speech_stream(text)
+        
+        # 第一段出错时还可以返回JSON错误
+        try:
+            first = next(segments, None)
+        except Exception as e:
+            segments.close()
             self.send_json_response({
                 "success": False,
-                "error": tts_result.get('error')
+                "error": f"语音合成失败: {str(e)}"
             })
+            return
+        if first is None or not first.get('success'):
+            segments.close()
+            self.send_json_response({
+                "success": False,
+                "error": first.get('error') if first else "没有可合成的文本"
+            })
+            return
+        
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.protocol_version = 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.close_connection = True
+        
+        def write(data: bytes):
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+            self.wfile.flush()
+        
+        try:
+            write(first['audio'])
+            print(f"🔊 首段音频已发送: {first['text']}")
+            for segment in segments:
+                if segment.get('success'):
+                    write(segment['audio'])
+                else:
+                    print(f"⚠️  第{segment['index'] + 1}段合成失败，已跳过: {segment.get('error')}")
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            print("🔌 客户端已断开，停止合成")
+        except Exception as e:
+            # 响应头已发出，只能结束这次响应
+            print(f"❌ 流式合成中断: {e}")
+        finally:
+            segments.close()
     
     def handle_chat(self, request_data: Dict[str, Any]):
         """
@@ -338,8 +713,13 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
         请求格式:
         {
             "message": "用户消息",
-            "history": [对话历史]
+            "history": [对话历史],
+            "stream": true,  # 可选，以SSE逐段返回回复；请求头 Accept: text/event-stream 效果相同
+            "tts": true      # 可选，流式时同时分句合成语音，以audio事件返回
         }
+        
+        历史超出当前模型的token预算时，较早的轮次折叠成摘要（见 HistoryCompactor），
+        压缩前后的提示词规模在返回的 prompt_tokens 中（流式时在done事件中）
         """
         message = request_data.get('message', '')
         history = request_data.get('history', [])
@@ -351,29 +731,145 @@ class VoiceAssistantHandler(http.server.SimpleHTTPRequestHandler):
             }, status_code=400)
             return
         
+        if not isinstance(history, list):
+            self.send_json_response({
+                "success": False,
+                "error": "history必须是消息列表"
+            }, status_code=400)
+            return
+        
+        history, prompt_tokens = self.pipeline.compact_history(message, history, self.get_session_id())
+        
+        if request_data.get('stream') or 'text/event-stream' in self.headers.get('Accept', ''):
+            self.handle_chat_stream(message, history, speak=bool(request_data.get('tts')),
+                                    prompt_tokens=prompt_tokens)
+            return
+        
         # 调用LLM对话
-        chat_result = self.api_client.chat(message, history)
+        chat_result = self.pipeline.chat(message, history)
+        chat_result["prompt_tokens"] = prompt_tokens
         
         self.send_json_response(chat_result)
     
+    def handle_chat_stream(self, message: str, history: List[Dict], speak: bool = False,
+                           prompt_tokens: Dict[str, Any] = None):
+        """
+        SSE流式对话，事件依次为：
+            event: delta  data: {"content": 回复增量}
+            event: audio  data: {"index", "text", "audio_data": base64音频}（仅tts）
+            event: done   data: {"success": true, "content": 完整回复, "prompt_tokens": 压缩前后的提示词规模}
+            event: error  data: {"success": false, "error": 错误信息}
+        """
+        if not self.begin_stream():
+            return
+        events = self.pipeline.chat_stream(message, history, speak)
+        
+        # 第一个事件之前出错时还可以返回JSON错误
+        try:
+            first = next(events, None)
+        except Exception as e:
+            events.close()
+            self.send_json_response({
+                "success": False,
+                "error": f"对话失败: {str(e)}"
+            })
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.close_connection = True
+        
+        def send_event(name: str, data: Dict[str, Any]):
+            payload = json.dumps(data, ensure_ascii=False)
+            self.wfile.write(f"event: {name}\ndata: {payload}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        
+        content = []
+        event = first
+        try:
+            while event is not None:
+                if event["type"] == "delta":
+                    content.append(event["content"])
+                    send_event("delta", {"content": event["content"]})
+                elif event.get("success"):
+                    send_event("audio", {
+                        "index": event["index"],
+                        "text": event["text"],
+                        "audio_data": base64.b64encode(event["audio"]).decode('ascii')
+                    })
+                else:
+                    print(f"⚠️  第{event['index'] + 1}句合成失败，已跳过: {event.get('error')}")
+                event = next(events, None)
+            send_event("done", {"success": True, "content": "".join(content), "prompt_tokens": prompt_tokens})
+        except (BrokenPipeError, ConnectionResetError):
+            print("🔌 客户端已断开，停止生成")
+        except Exception as e:
+            try:
+                send_event("error", {"success": False, "error": f"对话失败: {str(e)}"})
+            except OSError:
+                pass
+        finally:
+            events.close()
+    
+    def begin_stream(self) -> bool:
+        """
+        长连接流（WebSocket、SSE、分块音频）开始前调用，改占服务器的流名额，不再占用普通请求的工作线程
+        流名额已满时返回429并返回False
+        """
+        begin = getattr(self.server, 'begin_stream', None)
+        if begin is None or begin():
+            return True
+        self.send_json_response({
+            "success": False,
+            "error": "流式连接数已达上限，请稍后重试"
+        }, status_code=429)
+        return False
+    
     def send_json_response(self, data: Dict[str, Any], status_code: int = 200):
         """发送JSON响应"""
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Session-ID')
         self.end_headers()
         
         response_json = json.dumps(data, ensure_ascii=False, indent=2)
         self.wfile.write(response_json.encode('utf-8'))
     
+    def send_audio_response(self, audio_data: bytes, content_type: str = "audio/mpeg"):
+        """直接发送音频字节（带Content-Length）"""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(audio_data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Session-ID')
+        self.end_headers()
+        self.wfile.write(audio_data)
+    
+    def end_headers(self):
+        """
+        结束响应头：JSON、SSE、音频和WebSocket握手等所有响应都经过这里，
+        新分配的会话ID在此下发（CORS预检和请求解析失败时不分配）
+        """
+        if self.command != 'OPTIONS' and getattr(self, 'headers', None) is not None:
+            self.get_session_id()
+            if self._issued_session_id:
+                self.send_header('Set-Cookie', f"{SESSION_COOKIE}={self._issued_session_id}; Path=/; HttpOnly; SameSite=Lax")
+        super().end_headers()
+    
     def do_OPTIONS(self):
         """处理OPTIONS请求（CORS预检）"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Session-ID')
         self.end_headers()
     
     def log_message(self, format, *args):
@@ -385,6 +881,9 @@ def main():
     """主函数"""
     HOST = "0.0.0.0"
     PORT = 8090
+    MAX_WORKERS = 16   # 同时处理的最大请求数
+    MAX_QUEUE = 64     # 排队等待的最大请求数，超出返回429
+    MAX_STREAMS = 32   # 同时保持的流式连接数（/ws、SSE对话、流式TTS），另有单独的线程，超出返回429
     
     print("=" * 60)
     print("🎙️  智能语音助手服务器")
@@ -393,17 +892,21 @@ def main():
     # 初始化组件
     VoiceAssistantHandler.initialize_components()
     
-    # 创建服务器（允许端口重用）
-    socketserver.TCPServer.allow_reuse_address = True
-    with socketserver.TCPServer((HOST, PORT), VoiceAssistantHandler) as httpd:
+    # 创建有界线程池服务器（允许端口重用）
+    with BoundedThreadPoolServer((HOST, PORT), VoiceAssistantHandler,
+                                 max_workers=MAX_WORKERS, max_queue=MAX_QUEUE,
+                                 max_streams=MAX_STREAMS) as httpd:
         print(f"\n✅ 服务器启动成功!")
         print(f"🌐 访问地址: http://localhost:{PORT}")
+        print(f"⚙️  并发上限: {MAX_WORKERS} 个工作线程, 排队上限: {MAX_QUEUE}, 流式连接上限: {MAX_STREAMS}")
         print(f"📡 API端点:")
         print(f"   - POST /api/text      文本输入")
         print(f"   - POST /api/voice     语音输入")
         print(f"   - POST /api/tts       语音合成")
         print(f"   - POST /api/chat      纯对话")
         print(f"   - GET  /api/history   对话历史")
+        print(f"   - WS   /ws            流式语音识别")
+        print(f"   - GET  /api/metrics   并发、排队与连接池统计")
         print(f"   - GET  /health        健康检查")
         print(f"\n💡 提示: 首次使用需配置百度API Key")
         print(f"📝 配置方法: 编辑 baidu_api_client.py 中的 API_KEY 和 SECRET_KEY")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket服务端协议（RFC 6455）
+在 http.server 的请求处理器上完成握手，并提供帧的收发
+只依赖标准库，供 /ws 流式语音接口使用
+"""
+
+import base64
+import hashlib
+import json
+import struct
+import threading
+from typing import Tuple, Any
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # 单条消息上限，防止恶意超大帧
+
+
+class WebSocketClosed(Exception):
+    """对端关闭了WebSocket连接"""
+
+
+def is_websocket_upgrade(headers) -> bool:
+    """判断HTTP请求是否为WebSocket升级请求"""
+    return (headers.get('Upgrade', '').lower() == 'websocket'
+            and 'upgrade' in headers.get('Connection', '').lower()
+            and bool(headers.get('Sec-WebSocket-Key')))
+
+
+def accept_websocket(handler) -> "WebSocketConnection":
+    """
+    在 BaseHTTPRequestHandler 上完成WebSocket握手
+
+    参数:
+        handler: 当前请求处理器（已确认是升级请求）
+
+    返回:
+        WebSocketConnection
+    """
+    key = handler.headers.get('Sec-WebSocket-Key', '')
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+
+    handler.send_response(101, "Switching Protocols")
+    handler.send_header('Upgrade', 'websocket')
+    handler.send_header('Connection', 'Upgrade')
+    handler.send_header('Sec-WebSocket-Accept', accept)
+    handler.end_headers()
+    handler.wfile.flush()
+    handler.close_connection = True
+
+    return WebSocketConnection(handler.rfile, handler.wfile)
+
+
+class WebSocketConnection:
+    """服务端WebSocket连接，发送线程安全，接收只应在一个线程中进行"""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self.rfile.read(n)
+        if data is None or len(data) < n:
+            raise WebSocketClosed("连接已断开")
+        return data
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        """读取一帧，返回 (fin, opcode, payload)"""
+        b1, b2 = self._read_exact(2)
+        fin = bool(b1 & 0x80)
+        opcode = b1 & 0x0F
+        masked = bool(b2 & 0x80)
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self._read_exact(8))[0]
+        if length > MAX_MESSAGE_SIZE:
+            self.close(1009, "message too big")
+            raise WebSocketClosed("消息过大")
+
+        mask = self._read_exact(4) if masked else None
+        payload = self._read_exact(length) if length else b''
+        if mask:
+            # 按4字节掩码整体异或
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+            payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+        return fin, opcode, payload
+
+    def recv(self) -> Tuple[int, bytes]:
+        """
+        接收一条完整消息（自动处理分片、ping和close）
+
+        返回:
+            (opcode, payload)，opcode为 OPCODE_TEXT 或 OPCODE_BINARY
+
+        异常:
+            WebSocketClosed: 对端关闭或连接断开
+        """
+        message_opcode = None
+        chunks = []
+        while True:
+            fin, opcode, payload = self._read_frame()
+
+            if opcode == OPCODE_PING:
+                self._send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                code = struct.unpack('>H', payload[:2])[0] if len(payload) >= 2 else 1000
+                self.close(code)
+                raise WebSocketClosed(f"对端关闭连接: {code}")
+
+            if opcode != OPCODE_CONTINUATION:
+                message_opcode = opcode
+            chunks.append(payload)
+            if fin:
+                return message_opcode, b''.join(chunks)
+
+    def recv_message(self) -> Any:
+        """接收一条消息：文本消息按JSON解析（失败时返回原字符串），二进制消息返回bytes"""
+        opcode, payload = self.recv()
+        if opcode == OPCODE_TEXT:
+            text = payload.decode('utf-8')
+            try:
+                return json.loads(text)
+            except ValueError:
+                return text
+        return payload
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(length)
+        elif length < 65536:
+            header.append(126)
+            header += struct.pack('>H', length)
+        else:
+            header.append(127)
+            header += struct.pack('>Q', length)
+        with self._send_lock:
+            if self.closed and opcode != OPCODE_CLOSE:
+                raise WebSocketClosed("连接已关闭")
+            self.wfile.write(bytes(header) + payload)
+            self.wfile.flush()
+
+    def send_text(self, text: str):
+        self._send_frame(OPCODE_TEXT, text.encode('utf-8'))
+
+    def send_binary(self, data: bytes):
+        self._send_frame(OPCODE_BINARY, bytes(data))
+
+    def send_json(self, data: Any):
+        self.send_text(json.dumps(data, ensure_ascii=False))
+
+    def close(self, code: int = 1000, reason: str = ""):
+        """发送close帧（重复调用无副作用）"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OPCODE_CLOSE, struct.pack('>H', code) + reason.encode('utf-8'))
+        except (OSError, ValueError):
+            pass
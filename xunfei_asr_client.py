@@ -42,8 +42,6 @@ class XunfeiASRClient:
         self.api_secret = api_secret
         
         self.ws_url = "wss://iat-api.xfyun.cn/v2/iat"
-        self.result_text = ""
-        self.ws = None
         
     def create_url(self):
         """生成鉴权URL"""
@@ -80,6 +78,44 @@ class XunfeiASRClient:
         url = self.ws_url + '?' + urlencode(v)
         return url
     
+    def recognize_audio_file(self, audio_file_path):
+        """
+        识别音频文件
+        
+        参数:
+            audio_file_path: 音频文件路径（PCM格式，16k采样率）
+        
+        返回:
+            识别出的文字
+        """
+        # 每次识别使用独立的会话，多个线程可以同时调用
+        session = XunfeiASRSession(audio_file_path)
+        
+        # 创建WebSocket连接
+        websocket.enableTrace(False)
+        ws_url = self.create_url()
+        
+        session.ws = websocket.WebSocketApp(
+            ws_url,
+            on_message=session.on_message,
+            on_error=session.on_error,
+            on_close=session.on_close
+        )
+        session.ws.on_open = session.on_open
+        
+        session.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+        
+        return session.result_text
+
+
+class XunfeiASRSession:
+    """一次识别的状态（音频文件、识别结果、连接）及WebSocket回调"""
+    
+    def __init__(self, audio_file_path):
+        self.audio_file_path = audio_file_path
+        self.result_text = ""
+        self.ws = None
+    
     def on_message(self, ws, message):
         """收到消息的回调"""
         try:
@@ -126,34 +162,6 @@ class XunfeiASRClient:
             # 由于需要实际的音频流，这里只是示例框架
             
         thread.start_new_thread(run, ())
-    
-    def recognize_audio_file(self, audio_file_path):
-        """
-        识别音频文件
-        
-        参数:
-            audio_file_path: 音频文件路径（PCM格式，16k采样率）
-        
-        返回:
-            识别出的文字
-        """
-        self.result_text = ""
-        
-        # 创建WebSocket连接
-        websocket.enableTrace(False)
-        ws_url = self.create_url()
-        
-        self.ws = websocket.WebSocketApp(
-            ws_url,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close
-        )
-        self.ws.on_open = self.on_open
-        
-        self.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
-        
-        return self.result_text
 
 
 # 简化版本：使用讯飞的HTTP API（更简单）
@@ -187,7 +195,7 @@ class XunfeiASRSimple:
         # 注意：这需要根据讯飞实际的HTTP API文档来实现
         # 这里只是示例框架
         
-        import requests
+        from http_pool import get_shared_pool
         
         # 构建请求参数（需要根据实际文档调整）
         params = {
@@ -202,7 +210,7 @@ class XunfeiASRSimple:
         }
         
         try:
-            response = requests.post(
+            response = get_shared_pool().post(
                 self.api_url,
                 headers=headers,
                 data=audio_data,
@@ -4,6 +4,7 @@
 讯飞语音识别 - 基于官方Demo改写
 """
 
+import asyncio
 import websocket
 import datetime
 import hashlib
@@ -12,29 +13,183 @@ import hmac
 import json
 from urllib.parse import urlencode
 import time
-import ssl
 from wsgiref.handlers import format_date_time
 from datetime import datetime
 from time import mktime
-import _thread as thread
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Iterator, Iterable, Callable
+
+from audio_utils import is_wav, parse_wav, wav_to_pcm16, np, TARGET_SAMPLE_RATE
+from xunfei_ws_pool import XunfeiConnectionPool
+from xunfei_transcript import TranscriptAssembler
+import voice_activity
 
 STATUS_FIRST_FRAME = 0  # 第一帧的标识
 STATUS_CONTINUE_FRAME = 1  # 中间帧标识
 STATUS_LAST_FRAME = 2  # 最后一帧的标识
 
+UPLOAD_REALTIME = "realtime"  # 按固定间隔分帧发送，模拟实时录音
+UPLOAD_BURST = "burst"  # 完整音频：不等待间隔，由TCP流控决定发送速度
+
+REALTIME_FRAME_SIZE = 8000  # 实时模式每一帧的音频大小
+REALTIME_INTERVAL = 0.04  # 实时模式发送音频间隔(单位:s)
+BURST_MIN_FRAME_SIZE = 1280  # 40ms音频（16kHz，16bit，单声道）
+BURST_MAX_FRAME_SIZE = 12800  # 400ms音频
+BURST_TARGET_FRAMES = 16
+
+SUPPORTED_SAMPLE_RATES = (16000, 8000)  # 讯飞听写支持的PCM采样率
+
+
+def choose_frame_size(audio_length: int) -> int:
+    """
+    按音频长度选择突发上传的帧大小
+    目标约 BURST_TARGET_FRAMES 帧，按40ms对齐并限制在 [1280, 12800] 字节
+    """
+    size = -(-audio_length // BURST_TARGET_FRAMES)
+    size = -(-size // BURST_MIN_FRAME_SIZE) * BURST_MIN_FRAME_SIZE
+    return max(BURST_MIN_FRAME_SIZE, min(BURST_MAX_FRAME_SIZE, size))
+
+
+def upload_params(upload_mode: str, frame_size: int = REALTIME_FRAME_SIZE):
+    """
+    返回 (帧大小, 发送间隔)，突发模式的帧大小为None，表示按音频长度选择
+    
+    参数:
+        upload_mode: UPLOAD_REALTIME 或 UPLOAD_BURST
+        frame_size: 实时模式的帧大小
+    """
+    if upload_mode == UPLOAD_BURST:
+        return None, 0.0
+    if upload_mode == UPLOAD_REALTIME:
+        return frame_size, REALTIME_INTERVAL
+    raise ValueError(f"未知的上传模式: {upload_mode}")
+
+
+class FrameEncoder:
+    """
+    讯飞听写请求帧编码
+    帧的JSON结构固定，预先按状态生成模板，每帧只需拼接base64音频
+    """
+    
+    _AUDIO_PLACEHOLDER = "@AUDIO@"
+    
+    def __init__(self, appid: str):
+        self.appid = appid
+        # (帧状态, 是否带首帧参数, 采样率) -> (音频前的JSON, 音频后的JSON)
+        self._templates = {
+            (status, with_params, rate): self._make_template(status, with_params, rate)
+            for status, with_params in (
+                (STATUS_FIRST_FRAME, True),
+                (STATUS_CONTINUE_FRAME, False),
+                (STATUS_LAST_FRAME, False),
+                (STATUS_LAST_FRAME, True),
+            )
+            for rate in SUPPORTED_SAMPLE_RATES
+        }
+    
+    def _make_template(self, status: int, with_params: bool, sample_rate: int):
+        d = {
+            "data": {
+                "status": status,
+                "format": f"audio/L16;rate={sample_rate}",
+                "audio": self._AUDIO_PLACEHOLDER,
+                "encoding": "raw"
+            }
+        }
+        if with_params:
+            # 第一帧，带business参数
+            d["common"] = {"app_id": self.appid}
+            d["business"] = {
+                "domain": "iat",
+                "language": "zh_cn",
+                "accent": "mandarin",
+                "vad_eos": 2000,
+                "dwa": "wpgs"  # 开启动态修正（支持中英混合）
+            }
+        prefix, suffix = json.dumps(d).split(self._AUDIO_PLACEHOLDER)
+        return prefix, suffix
+    
+    def encode(self, buf, status: int, is_last: bool = False, sample_rate: int = 16000) -> str:
+        """
+        构建一帧待发送的JSON字符串
+        
+        参数:
+            buf: 本帧的PCM音频（bytes或memoryview，不会被复制）
+            status: STATUS_FIRST_FRAME 或 STATUS_CONTINUE_FRAME
+            is_last: 是否为最后一帧（首帧也可以同时是最后一帧）
+            sample_rate: PCM采样率，须在 SUPPORTED_SAMPLE_RATES 中
+        """
+        key = (STATUS_LAST_FRAME if is_last else status, status == STATUS_FIRST_FRAME, sample_rate)
+        prefix, suffix = self._templates[key]
+        return prefix + base64.b64encode(buf).decode('ascii') + suffix
+
+
+def load_pcm(audio_data, sample_rate: int = 16000):
+    """
+    取出待识别的PCM数据，在建立连接之前校验格式
+    WAV按RIFF块解析（不假定头部为44字节），格式以fmt块为准；
+    其它数据视为采样率为 sample_rate 的16bit单声道PCM
+    讯飞不支持的WAV格式（立体声、其它采样率/位深）在安装了numpy时转换为16kHz单声道16bit
+    
+    返回:
+        (PCM数据的memoryview, 采样率)
+    
+    异常:
+        ValueError: 讯飞不支持且无法转换的音频格式
+    """
+    if is_wav(audio_data):
+        info = parse_wav(audio_data)
+        print(f"📝 检测到WAV格式: {info.sample_rate}Hz, {info.channels}声道, {info.bits_per_sample}bit")
+        if info.is_pcm16_mono and info.sample_rate in SUPPORTED_SAMPLE_RATES:
+            pcm, sample_rate = info.data, info.sample_rate
+        elif np is not None:
+            print(f"🔄 转换为 {TARGET_SAMPLE_RATE}Hz 单声道16bit")
+            pcm, sample_rate = memoryview(wav_to_pcm16(info)), TARGET_SAMPLE_RATE
+        else:
+            raise ValueError(f"不支持的WAV格式（需要16kHz/8kHz 16bit单声道PCM）: {info}")
+    else:
+        pcm = memoryview(audio_data)
+    
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        raise ValueError(f"不支持的采样率: {sample_rate}Hz，讯飞仅支持 {SUPPORTED_SAMPLE_RATES}")
+    return pcm, sample_rate
+
+
+def iter_pcm_chunks(pcm, frame_size: int = None) -> Iterator[memoryview]:
+    """
+    把PCM音频切分为待发送的分片，分片是原缓冲区上的memoryview，不复制音频
+    frame_size为None时按音频长度选择帧大小
+    """
+    audio = memoryview(pcm)
+    
+    if frame_size is None:
+        frame_size = choose_frame_size(len(audio))
+    
+    print(f"📤 开始发送音频数据，总大小: {len(audio)} bytes，帧大小: {frame_size}")
+    
+    for offset in range(0, len(audio), frame_size):
+        yield audio[offset:offset + frame_size]
+
 
 class XunfeiASROfficial:
     """讯飞语音识别 - 官方Demo版本"""
     
-    def __init__(self, appid: str, api_key: str, api_secret: str):
+    def __init__(self, appid: str, api_key: str, api_secret: str, pool_size: int = 2):
+        """
+        参数:
+            appid: 讯飞APPID
+            api_key: API Key
+            api_secret: API Secret
+            pool_size: 预热的WebSocket连接数，0表示每次识别时现连
+        """
         self.appid = appid
         self.api_key = api_key
         self.api_secret = api_secret
         
-        self.result_text = ""
-        self.ws = None
-        self.audio_data = None
+        # 实例上只保存配置和共享的连接池；每次识别的状态都在 RecognitionSession 中，
+        # 因此同一个实例可以被多个线程同时用于识别
+        self.connection_pool = XunfeiConnectionPool(self.create_url, pool_size=pool_size)
+        self.frame_encoder = FrameEncoder(appid)
         
         print(f"✅ 讯飞ASR已配置（官方版）")
         print(f"📱 APPID: {appid}")
@@ -75,173 +230,292 @@ class XunfeiASROfficial:
         url = url + '?' + urlencode(v)
         return url
     
-    def on_message(self, ws, message):
-        """收到websocket消息的处理"""
-        try:
-            data = json.loads(message)
-            code = data.get("code", 0)
-            sid = data.get("sid", "")
-            
-            if code != 0:
-                errMsg = data.get("message", "")
-                print(f"❌ 识别错误: sid={sid}, code={code}, msg={errMsg}")
-                self.result_text = ""
-            else:
-                # 解析识别结果
-                ws_data = data.get("data", {}).get("result", {}).get("ws", [])
-                result = ""
-                for i in ws_data:
-                    for w in i.get("cw", []):
-                        result += w.get("w", "")
-                
-                self.result_text += result
-                if result:
-                    print(f"📝 识别片段: {result}")
-                
-        except Exception as e:
-            print(f"❌ 消息处理异常: {e}")
-    
-    def on_error(self, ws, error):
-        """收到websocket错误的处理"""
-        print(f"❌ WebSocket错误: {error}")
-    
-    def on_close(self, ws, close_status_code, close_msg):
-        """收到websocket关闭的处理"""
-        print("🔌 WebSocket连接已关闭")
+    def _build_frame(self, buf, status: int, is_last: bool = False, sample_rate: int = 16000) -> str:
+        """构建一帧待发送的JSON字符串（见 FrameEncoder.encode）"""
+        return self.frame_encoder.encode(buf, status, is_last, sample_rate)
     
-    def on_open(self, ws):
-        """收到websocket连接建立的处理"""
-        def run(*args):
-            try:
-                frameSize = 8000  # 每一帧的音频大小
-                intervel = 0.04  # 发送音频间隔(单位:s)
-                status = STATUS_FIRST_FRAME
-                
-                audio_data = self.audio_data
-                
-                # 如果是WAV格式，跳过头部
-                if len(audio_data) > 44 and audio_data[:4] == b'RIFF':
-                    print("📝 检测到WAV格式，跳过头部44字节")
-                    audio_data = audio_data[44:]
-                
-                print(f"📤 开始发送音频数据，总大小: {len(audio_data)} bytes")
-                
-                # 分帧发送
-                offset = 0
-                while offset < len(audio_data):
-                    buf = audio_data[offset:offset + frameSize]
-                    offset += frameSize
-                    
-                    # 判断是否为最后一帧
-                    if offset >= len(audio_data):
-                        status = STATUS_LAST_FRAME
-                    
-                    # 构建发送数据
-                    if status == STATUS_FIRST_FRAME:
-                        # 第一帧，带business参数
-                        d = {
-                            "common": {"app_id": self.appid},
-                            "business": {
-                                "domain": "iat",
-                                "language": "zh_cn",
-                                "accent": "mandarin",
-                                "vad_eos": 2000,
-                                "dwa": "wpgs"  # 开启动态修正（支持中英混合）
-                            },
-                            "data": {
-                                "status": 0,
-                                "format": "audio/L16;rate=16000",
-                                "audio": base64.b64encode(buf).decode('utf-8'),
-                                "encoding": "raw"
-                            }
-                        }
-                        ws.send(json.dumps(d))
-                        status = STATUS_CONTINUE_FRAME
-                        
-                    elif status == STATUS_CONTINUE_FRAME:
-                        # 中间帧
-                        d = {
-                            "data": {
-                                "status": 1,
-                                "format": "audio/L16;rate=16000",
-                                "audio": base64.b64encode(buf).decode('utf-8'),
-                                "encoding": "raw"
-                            }
-                        }
-                        ws.send(json.dumps(d))
-                        
-                    elif status == STATUS_LAST_FRAME:
-                        # 最后一帧
-                        d = {
-                            "data": {
-                                "status": 2,
-                                "format": "audio/L16;rate=16000",
-                                "audio": base64.b64encode(buf).decode('utf-8'),
-                                "encoding": "raw"
-                            }
-                        }
-                        ws.send(json.dumps(d))
-                        break
-                    
-                    # 模拟音频采样间隔
-                    time.sleep(intervel)
-                
-                print("✅ 音频数据发送完成")
-                time.sleep(1)
-                ws.close()
-                
-            except Exception as e:
-                print(f"❌ 发送音频失败: {e}")
-                ws.close()
+    def start_stream(self, on_partial: Callable[[str], None] = None,
+                     sample_rate: int = 16000, vad: bool = False) -> "RecognitionSession":
+        """
+        开始一次识别会话：边录音边发送，识别结果增量回调
+        
+        参数:
+            on_partial: 收到新的识别结果时回调，参数为当前完整的识别文本
+            sample_rate: 将要发送的PCM采样率（16000或8000）
+            vad: 是否启用本地VAD（不发送说话前的静音，检测到说话结束立即发送结束帧），
+                 只应用于实时录音（/ws）；完整录音或上传的音频中间的停顿会被误判为说话结束，
+                 这类音频用 trim_silence 去除首尾静音
         
-        thread.start_new_thread(run, ())
+        返回:
+            RecognitionSession，调用 feed() 发送音频，finish() 获取最终结果
+        """
+        if sample_rate not in SUPPORTED_SAMPLE_RATES:
+            raise ValueError(f"不支持的采样率: {sample_rate}Hz，讯飞仅支持 {SUPPORTED_SAMPLE_RATES}")
+        return RecognitionSession(self, on_partial, sample_rate, vad)
     
-    def recognize(self, audio_data: bytes) -> Dict[str, Any]:
+    def recognize(self, audio_data: bytes, upload_mode: str = UPLOAD_REALTIME,
+                  sample_rate: int = 16000) -> Dict[str, Any]:
         """
         识别音频
         
         参数:
-            audio_data: 音频二进制数据（PCM/WAV格式，16kHz，16bit，单声道）
+            audio_data: 音频二进制数据（WAV或16bit单声道PCM，16kHz/8kHz）
+            upload_mode: 上传模式，UPLOAD_REALTIME按40ms间隔发送，
+                         UPLOAD_BURST用于已完整录制的音频，不等待间隔直接发送
+            sample_rate: 裸PCM的采样率，WAV以文件头为准
         
         返回:
             识别结果
         """
-        self.result_text = ""
-        self.audio_data = audio_data
+        session = None
         
         try:
-            websocket.enableTrace(False)
-            wsUrl = self.create_url()
+            frame_size, intervel = upload_params(upload_mode)
             
-            print("📡 正在连接讯飞WebSocket...")
+            # 格式不支持时在连接讯飞之前直接失败
+            pcm, sample_rate = load_pcm(audio_data, sample_rate)
+            pcm = self._trim_silence(pcm, sample_rate)
             
-            self.ws = websocket.WebSocketApp(
-                wsUrl,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close
-            )
-            self.ws.on_open = self.on_open
-            self.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+            print("📡 正在获取讯飞WebSocket连接...")
+            # 完整音频已去除首尾静音，不需要流式VAD
+            session = self.start_stream(sample_rate=sample_rate)
             
-            if self.result_text:
-                print(f"✅ 最终识别结果: {self.result_text}")
-                return {
-                    "success": True,
-                    "text": self.result_text
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": "识别结果为空"
-                }
+            for i, buf in enumerate(iter_pcm_chunks(pcm, frame_size)):
+                # 模拟音频采样间隔
+                if i and intervel:
+                    time.sleep(intervel)
+                if not session.feed(buf):
+                    break
+            
+            print("✅ 音频数据发送完成")
+            
+            # 发送结束帧，收到最终结果后立即关闭连接
+            return session.finish()
                 
         except Exception as e:
             print(f"❌ 识别失败: {e}")
+            if session is not None:
+                session.cancel()
+            return {
+                "success": False,
+                "error": f"识别失败: {str(e)}"
+            }
+    
+    @staticmethod
+    def _trim_silence(pcm, sample_rate: int):
+        """去除完整音频的首尾静音（未安装numpy时原样返回）"""
+        trimmed = voice_activity.trim_silence(pcm, sample_rate)
+        if len(trimmed) < len(pcm):
+            saved_ms = (len(pcm) - len(trimmed)) * 1000 // (sample_rate * 2)
+            print(f"✂️  去除首尾静音 {saved_ms} ms")
+        return trimmed
+    
+    def recognize_stream(self, pcm_frames: Iterable[bytes], sample_rate: int = 16000) -> Dict[str, Any]:
+        """
+        识别边产生边到达的PCM帧（如解码器的输出），每帧到达后立即发送
+        音频是上传的完整录音，不做流式VAD，句中停顿不会提前结束识别
+        
+        参数:
+            pcm_frames: 16bit单声道PCM帧的迭代器
+            sample_rate: PCM采样率
+        
+        返回:
+            识别结果，格式同 recognize
+        """
+        session = None
+        
+        try:
+            print("📡 正在获取讯飞WebSocket连接...")
+            session = self.start_stream(sample_rate=sample_rate)
+            
+            for buf in pcm_frames:
+                if not buf:
+                    continue
+                if not session.feed(buf):
+                    break
+            
+            print(f"✅ 音频数据发送完成，共 {session.bytes_sent} bytes")
+            return session.finish()
+        
+        except Exception as e:
+            print(f"❌ 识别失败: {e}")
+            if session is not None:
+                session.cancel()
             return {
                 "success": False,
                 "error": f"识别失败: {str(e)}"
             }
+    
+    async def arecognize(self, audio_data: bytes, upload_mode: str = UPLOAD_REALTIME,
+                         sample_rate: int = 16000) -> Dict[str, Any]:
+        """
+        recognize 的异步版本，返回格式相同
+        在线程池中执行，与同步识别共用预热连接池（池中是 websocket-client 的同步连接）
+        """
+        return await asyncio.to_thread(self.recognize, audio_data, upload_mode, sample_rate)
+
+
+class RecognitionSession:
+    """
+    一次识别会话
+    连接、发送状态、识别结果和回调都属于会话本身，多个会话可以并行使用同一个客户端
+    音频到达时立即转发给讯飞，后台线程接收识别结果并回调部分结果
+    """
+    
+    def __init__(self, client: XunfeiASROfficial, on_partial: Callable[[str], None] = None,
+                 sample_rate: int = 16000, vad: bool = False):
+        self.client = client
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        # 本地VAD（仅实时录音）：说话开始前的静音不发送，说话结束后立即发送结束帧，
+        # 不必等待讯飞的vad_eos（2秒）
+        self.vad = voice_activity.StreamingVAD(sample_rate) if vad else None
+        # 按片段序号处理动态修正，避免被替换的片段重复拼接
+        self.transcript = TranscriptAssembler()
+        self.error = None
+        self.bytes_sent = 0
+        
+        # 讯飞返回status=2（最终结果，可能由服务端VAD提前触发）或出错时置位
+        self.finished = threading.Event()
+        self._status = STATUS_FIRST_FRAME
+        self._send_lock = threading.Lock()
+        
+        self.ws = None  # 发送首帧时才从连接池取出，创建会话不占用预热连接
+        self._receiver = threading.Thread(target=self._receive_loop, name="xunfei-session-recv", daemon=True)
+    
+    def _send_first_frame(self, frame: str):
+        """取出连接并发送首帧，预热连接已被服务端断开时换新连接重试一次，成功后启动接收线程"""
+        self.ws = self.client.connection_pool.acquire()
+        try:
+            self.ws.send(frame)
+        except Exception as e:
+            print(f"⚠️  预热连接不可用，重新连接: {e}")
+            self.ws.close()
+            self.ws = self.client.connection_pool.open_fresh()
+            self.ws.send(frame)
+        self._receiver.start()
+    
+    def _receive_loop(self):
+        try:
+            while not self.finished.is_set():
+                message = self.ws.recv()
+                if not message:
+                    break
+                data = json.loads(message)
+                code = data.get("code", 0)
+                if code != 0:
+                    self.error = f"code={code}, msg={data.get('message', '')}"
+                    print(f"❌ 识别错误: sid={data.get('sid', '')}, {self.error}")
+                    self.transcript.reset()
+                    break
+                
+                if self.transcript.add_message(data):
+                    print(f"📝 识别中: {self.transcript.text}")
+                    if self.on_partial:
+                        self.on_partial(self.transcript.text)
+                
+                # status=2表示识别结束
+                if data.get("data", {}).get("status") == STATUS_LAST_FRAME:
+                    break
+        except websocket.WebSocketConnectionClosedException:
+            pass
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ 识别结果接收异常: {e}")
+        finally:
+            self.finished.set()
+            self.ws.close()
+            print("🔌 WebSocket连接已关闭")
+    
+    def feed(self, pcm) -> bool:
+        """
+        发送一段PCM音频（16bit，单声道，采样率与会话一致），可以是bytes或memoryview
+        
+        返回:
+            False表示识别已结束（讯飞已返回最终结果、出错或本地VAD检测到说话结束），不应再发送
+        """
+        if self.vad is not None:
+            pcm, end_of_speech = self.vad.process(pcm)
+            if end_of_speech:
+                print("🔇 检测到说话结束，提前结束发送")
+                self._send_pcm(pcm)
+                self._send_end()
+                return False
+        return self._send_pcm(pcm)
+    
+    def _send_pcm(self, pcm) -> bool:
+        if not pcm:
+            return not self.finished.is_set()
+        with self._send_lock:
+            if self.finished.is_set() or self._status == STATUS_LAST_FRAME:
+                return False
+            try:
+                frame = self.client._build_frame(pcm, self._status, sample_rate=self.sample_rate)
+                if self._status == STATUS_FIRST_FRAME:
+                    self._send_first_frame(frame)
+                else:
+                    self.ws.send(frame)
+            except Exception as e:
+                self.error = f"发送音频失败: {e}"
+                self.finished.set()
+                return False
+            self._status = STATUS_CONTINUE_FRAME
+            self.bytes_sent += len(pcm)
+        return True
+    
+    def finish(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """
+        发送结束帧并等待最终结果
+        
+        返回:
+            与 XunfeiASROfficial.recognize 相同格式的识别结果
+        """
+        self._send_end()
+        
+        self.finished.wait(timeout)
+        self._close()
+        
+        if self.result_text:
+            print(f"✅ 最终识别结果: {self.result_text}")
+            return {
+                "success": True,
+                "text": self.result_text
+            }
+        return {
+            "success": False,
+            "error": self.error or "识别结果为空"
+        }
+    
+    def _send_end(self):
+        """发送结束帧（只发送一次）"""
+        with self._send_lock:
+            if not self.finished.is_set() and self._status != STATUS_LAST_FRAME:
+                try:
+                    if self._status == STATUS_FIRST_FRAME:
+                        # 没有任何音频时也要带上首帧参数
+                        self._send_first_frame(self.client._build_frame(
+                            b'', STATUS_FIRST_FRAME, is_last=True, sample_rate=self.sample_rate))
+                    else:
+                        self.ws.send(self.client._build_frame(
+                            b'', STATUS_CONTINUE_FRAME, is_last=True, sample_rate=self.sample_rate))
+                except Exception as e:
+                    self.error = f"发送结束帧失败: {e}"
+                    self.finished.set()
+                self._status = STATUS_LAST_FRAME
+    
+    @property
+    def result_text(self) -> str:
+        """当前识别文本"""
+        return self.transcript.text
+    
+    def cancel(self):
+        """放弃本次识别并关闭连接"""
+        self.finished.set()
+        self._close()
+    
+    def _close(self):
+        if self.ws is not None:
+            self.ws.close()
 
 
 if __name__ == "__main__":
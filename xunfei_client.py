@@ -5,21 +5,27 @@
 使用HTTP API，简单易用
 """
 
-import requests
+import asyncio
 import json
 import base64
 import hashlib
 import hmac
 import time
 from datetime import datetime
-from typing import Dict, Any
-from xunfei_asr_official import XunfeiASROfficial
+from typing import Dict, Any, Iterable
+from xunfei_asr_official import XunfeiASROfficial, UPLOAD_BURST, SUPPORTED_SAMPLE_RATES, BURST_MIN_FRAME_SIZE
+from audio_utils import decode_stream, read_wav_stream, iter_aligned, wav_to_pcm16, TARGET_SAMPLE_RATE
+from http_pool import HTTPSessionPool, get_shared_pool
+import voice_activity
+
+# 需要先解码的压缩音频格式
+COMPRESSED_FORMATS = ("webm", "ogg")
 
 
 class XunfeiClient:
     """讯飞API客户端 - 语音识别和语音合成"""
     
-    def __init__(self, appid: str, api_key: str, api_secret: str):
+    def __init__(self, appid: str, api_key: str, api_secret: str, http_pool: HTTPSessionPool = None):
         """
         初始化讯飞客户端
         
@@ -27,7 +33,9 @@ class XunfeiClient:
             appid: 讯飞APPID
             api_key: API Key  
             api_secret: API Secret
+            http_pool: HTTP连接池，不传则使用进程内共享连接池
         """
+        self.http = http_pool or get_shared_pool()
         self.appid = appid
         self.api_key = api_key
         self.api_secret = api_secret
@@ -38,14 +46,16 @@ class XunfeiClient:
         print(f"✅ 讯飞API已配置")
         print(f"📱 APPID: {appid}")
     
-    def speech_recognition(self, audio_data: bytes, format: str = "wav", rate: int = 16000) -> Dict[str, Any]:
+    def speech_recognition(self, audio_data: bytes, format: str = "wav", rate: int = 16000,
+                           upload_mode: str = UPLOAD_BURST) -> Dict[str, Any]:
         """
         语音识别 - 使用WebSocket API（更可靠）
         
         参数:
             audio_data: 音频二进制数据
-            format: 音频格式 (wav/pcm)
-            rate: 采样率
+            format: 音频格式 (wav/pcm/webm)，webm边解码边发送
+            rate: 裸PCM的采样率，WAV以文件头为准
+            upload_mode: 上传模式，完整音频默认使用UPLOAD_BURST不按实时间隔发送
         
         返回:
             识别结果
@@ -54,8 +64,12 @@ class XunfeiClient:
         print(f"📊 音频数据大小: {len(audio_data)} bytes")
         
         try:
+            if format in COMPRESSED_FORMATS:
+                # 解码出的PCM帧立即发送，解码与上传重叠进行
+                return self.websocket_asr.recognize_stream(decode_stream([audio_data], format))
+            
             # 使用WebSocket方式识别
-            result = self.websocket_asr.recognize(audio_data)
+            result = self.websocket_asr.recognize(audio_data, upload_mode, rate)
             return result
         except Exception as e:
             print(f"❌ WebSocket识别失败: {e}")
@@ -64,6 +78,75 @@ class XunfeiClient:
                 "error": f"WebSocket识别失败: {str(e)}"
             }
     
+    def speech_recognition_stream(self, chunks: Iterable[bytes], format: str = "pcm",
+                                  rate: int = 16000) -> Dict[str, Any]:
+        """
+        边接收边识别：音频分片一到达就解码/发送，不缓冲完整音频
+        
+        参数:
+            chunks: 音频分片（如HTTP请求体），格式为 pcm/wav/webm/ogg
+            format: 音频格式
+            rate: 裸PCM的采样率，WAV以文件头为准
+        
+        返回:
+            识别结果
+        """
+        print(f"📤 使用讯飞WebSocket ASR（流式上传，{format}）")
+        
+        try:
+            if format in COMPRESSED_FORMATS:
+                return self.websocket_asr.recognize_stream(decode_stream(chunks, format))
+            
+            if format == "wav":
+                info, chunks = read_wav_stream(chunks)
+                if not (info.is_pcm16_mono and info.sample_rate in SUPPORTED_SAMPLE_RATES):
+                    # 需要重采样/混音的WAV：读完后整段转换
+                    print(f"🔄 WAV格式 {info.sample_rate}Hz/{info.channels}声道/{info.bits_per_sample}bit，转换后识别")
+                    info.data = memoryview(b''.join(chunks))
+                    return self.websocket_asr.recognize(wav_to_pcm16(info), UPLOAD_BURST, TARGET_SAMPLE_RATE)
+                rate = info.sample_rate
+            
+            # 网络分片大小不定：对齐到采样并合并为至少40ms一帧
+            return self.websocket_asr.recognize_stream(iter_aligned(chunks, 2, BURST_MIN_FRAME_SIZE), rate)
+        except Exception as e:
+            print(f"❌ WebSocket识别失败: {e}")
+            return {
+                "success": False,
+                "error": f"WebSocket识别失败: {str(e)}"
+            }
+    
+    def start_speech_stream(self, on_partial=None):
+        """
+        开始流式语音识别（边录音边识别）
+        实时录音在安装了numpy时启用本地VAD，检测到说话结束立即结束识别
+        
+        参数:
+            on_partial: 部分识别结果回调，参数为当前识别文本
+        
+        返回:
+            RecognitionSession，feed()发送PCM音频，finish()获取最终结果
+        """
+        return self.websocket_asr.start_stream(on_partial, vad=voice_activity.available())
+    
+    async def aspeech_recognition(self, audio_data: bytes, format: str = "wav", rate: int = 16000,
+                                  upload_mode: str = UPLOAD_BURST) -> Dict[str, Any]:
+        """speech_recognition 的异步版本，返回格式相同"""
+        print(f"📤 使用讯飞WebSocket ASR（异步）")
+        print(f"📊 音频数据大小: {len(audio_data)} bytes")
+        
+        try:
+            if format in COMPRESSED_FORMATS:
+                return await asyncio.to_thread(
+                    self.websocket_asr.recognize_stream, decode_stream([audio_data], format)
+                )
+            return await self.websocket_asr.arecognize(audio_data, upload_mode, rate)
+        except Exception as e:
+            print(f"❌ WebSocket识别失败: {e}")
+            return {
+                "success": False,
+                "error": f"WebSocket识别失败: {str(e)}"
+            }
+    
     def text_to_speech(self, text: str) -> Dict[str, Any]:
         """
         语音合成
@@ -102,7 +185,7 @@ class XunfeiClient:
         }
         
         try:
-            response = requests.post(
+            response = self.http.post(
                 url,
                 headers=headers,
                 data=f"text={text}".encode('utf-8'),
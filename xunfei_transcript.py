@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+讯飞语音听写结果拼接 - 支持动态修正(dwa=wpgs)
+开启动态修正后，每条结果带有片段序号sn：
+    pgs="apd": 本片追加在前面的结果之后，之前的片段不会再被修改
+    pgs="rpl": 本片替换序号在 rg=[起, 止] 范围内的片段
+未开启动态修正时没有pgs字段，按追加处理
+"""
+
+from typing import Dict, Any
+
+
+class TranscriptAssembler:
+    """
+    按片段序号组装识别文本
+    已确定不会再被替换的片段移入稳定文本，只有尾部少量片段保存在字典中，
+    每条结果的处理为均摊O(1)
+    """
+
+    def __init__(self):
+        self._stable_parts = []  # 已确定的片段文本，按序号排列
+        self._stable_text = ""
+        self._stable_dirty = False
+        self._stable_upto = 0  # 序号小于该值的片段都已确定
+        self._pending: Dict[int, str] = {}  # 序号 -> 片段文本，可能被后续结果替换
+        self.last = False  # 是否已收到最后一片(ls=true)
+
+    @staticmethod
+    def words(result: Dict[str, Any]) -> str:
+        """拼接一条结果中的所有词"""
+        return "".join(
+            cw.get("w", "")
+            for item in result.get("ws", [])
+            for cw in item.get("cw", [])
+        )
+
+    def _settle(self, upto: int):
+        """把序号小于upto的片段移入稳定文本"""
+        if upto <= self._stable_upto:
+            return
+        for sn in sorted(s for s in self._pending if s < upto):
+            self._stable_parts.append(self._pending.pop(sn))
+            self._stable_dirty = True
+        self._stable_upto = upto
+
+    def add_result(self, result: Dict[str, Any]) -> bool:
+        """
+        处理一条识别结果（讯飞消息中的 data.result）
+
+        返回:
+            文本是否发生了变化
+        """
+        if not result:
+            return False
+
+        text = self.words(result)
+        sn = result.get("sn")
+        if sn is None:
+            # 没有片段序号：按顺序追加
+            sn = max(self._stable_upto, max(self._pending, default=-1) + 1)
+
+        pgs = result.get("pgs")
+        changed = bool(text)
+        if pgs == "rpl":
+            start, end = (result.get("rg") or [sn, sn])[:2]
+            if start < self._stable_upto:
+                print(f"⚠️  动态修正范围 {start}-{end} 覆盖了已确定的片段，忽略已确定部分")
+            for old in range(max(start, self._stable_upto), end + 1):
+                if self._pending.pop(old, None):
+                    changed = True
+            self._settle(start)
+        else:
+            self._settle(sn)
+
+        self._pending[sn] = text
+        if result.get("ls"):
+            self.last = True
+            self._settle(sn + 1)
+        return changed
+
+    def add_message(self, data: Dict[str, Any]) -> bool:
+        """处理一条完整的讯飞返回消息，返回文本是否发生了变化"""
+        return self.add_result(data.get("data", {}).get("result") or {})
+
+    @property
+    def stable_text(self) -> str:
+        """不会再被动态修正改动的文本"""
+        if self._stable_dirty:
+            self._stable_text = "".join(self._stable_parts)
+            self._stable_dirty = False
+        return self._stable_text
+
+    @property
+    def partial_text(self) -> str:
+        """尚可能被修正的尾部文本"""
+        return "".join(self._pending[sn] for sn in sorted(self._pending))
+
+    @property
+    def text(self) -> str:
+        """当前完整识别文本（稳定文本 + 尾部文本）"""
+        return self.stable_text + self.partial_text
+
+    def reset(self):
+        """清空结果（识别出错时使用）"""
+        self.__init__()
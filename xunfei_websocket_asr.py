@@ -12,12 +12,19 @@ import hmac
 import json
 from urllib.parse import urlencode
 import ssl
+import threading
 from wsgiref.handlers import format_date_time
 from datetime import datetime
 from time import mktime
 from typing import Dict, Any
 import time
 
+from xunfei_asr_official import (
+    UPLOAD_REALTIME, UPLOAD_BURST, FrameEncoder, iter_pcm_chunks, load_pcm,
+    STATUS_FIRST_FRAME, STATUS_CONTINUE_FRAME
+)
+from xunfei_transcript import TranscriptAssembler
+
 
 class XunfeiWebSocketASR:
     """讯飞WebSocket语音识别"""
@@ -27,10 +34,7 @@ class XunfeiWebSocketASR:
         self.api_key = api_key
         self.api_secret = api_secret
         self.ws_url = "wss://iat-api.xfyun.cn/v2/iat"
-        
-        self.result_text = ""
-        self.ws = None
-        self.audio_data = None
+        self.frame_encoder = FrameEncoder(appid)
         
         print(f"✅ 讯飞WebSocket ASR已配置")
     
@@ -69,6 +73,81 @@ class XunfeiWebSocketASR:
         url = self.ws_url + '?' + urlencode(v)
         return url
     
+    def recognize(self, audio_data: bytes, upload_mode: str = UPLOAD_REALTIME,
+                  sample_rate: int = 16000) -> Dict[str, Any]:
+        """
+        识别音频
+        
+        参数:
+            audio_data: 音频二进制数据（WAV或16bit单声道PCM，16kHz/8kHz）
+            upload_mode: 上传模式，UPLOAD_REALTIME按40ms间隔发送，UPLOAD_BURST尽快发送
+            sample_rate: 裸PCM的采样率，WAV以文件头为准
+        
+        返回:
+            识别结果
+        """
+        try:
+            # 格式不支持时在连接之前直接失败
+            pcm, sample_rate = load_pcm(audio_data, sample_rate)
+            
+            # 每次识别使用独立的会话，多个线程可以同时调用
+            session = WebSocketRecognitionSession(self.frame_encoder, pcm, upload_mode, sample_rate)
+            
+            # 创建WebSocket连接
+            websocket.enableTrace(False)
+            ws_url = self.create_url()
+            
+            session.ws = websocket.WebSocketApp(
+                ws_url,
+                on_message=session.on_message,
+                on_error=session.on_error,
+                on_close=session.on_close,
+                on_open=session.on_open
+            )
+            
+            print("📡 正在连接讯飞WebSocket...")
+            
+            # 运行WebSocket（会阻塞直到连接关闭）
+            session.ws.run_forever(
+                sslopt={"cert_reqs": ssl.CERT_NONE}
+            )
+            
+            if session.result_text:
+                return {
+                    "success": True,
+                    "text": session.result_text
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "识别结果为空"
+                }
+                
+        except Exception as e:
+            print(f"❌ WebSocket识别失败: {e}")
+            return {
+                "success": False,
+                "error": f"WebSocket识别失败: {str(e)}"
+            }
+
+
+class WebSocketRecognitionSession:
+    """一次识别的状态（音频、识别结果、连接）及WebSocket回调"""
+    
+    def __init__(self, frame_encoder: FrameEncoder, pcm, upload_mode: str = UPLOAD_REALTIME,
+                 sample_rate: int = 16000):
+        self.frame_encoder = frame_encoder
+        self.pcm = pcm
+        self.upload_mode = upload_mode
+        self.sample_rate = sample_rate
+        self.transcript = TranscriptAssembler()
+        self.ws = None
+    
+    @property
+    def result_text(self) -> str:
+        """当前识别文本"""
+        return self.transcript.text
+    
     def on_message(self, ws, message):
         """收到消息的回调"""
         try:
@@ -77,19 +156,13 @@ class XunfeiWebSocketASR:
             
             if code != 0:
                 print(f"❌ 识别错误: code={code}, message={data.get('message', '')}")
-                self.result_text = ""
+                self.transcript.reset()
                 ws.close()
                 return
             
-            # 解析识别结果
-            result_data = data.get("data", {})
-            status = result_data.get("status", 0)
-            result_list = result_data.get("result", {}).get("ws", [])
-            
-            # 拼接识别结果
-            for item in result_list:
-                for word in item.get("cw", []):
-                    self.result_text += word.get("w", "")
+            # 解析识别结果，按片段序号处理动态修正
+            status = data.get("data", {}).get("status", 0)
+            self.transcript.add_message(data)
             
             print(f"📝 识别中: {self.result_text}")
             
@@ -113,54 +186,22 @@ class XunfeiWebSocketASR:
         """连接建立的回调，发送音频数据"""
         def send_audio():
             try:
-                # 发送音频数据
-                chunk_size = 1280  # 每次发送1280字节（40ms音频）
-                audio_data = self.audio_data
-                
-                # 如果是WAV格式，跳过头部
-                if len(audio_data) > 44 and audio_data[:4] == b'RIFF':
-                    print("📝 检测到WAV格式，跳过头部")
-                    audio_data = audio_data[44:]
-                
-                status = 0  # 0:首帧 1:中间帧 2:尾帧
+                if self.upload_mode == UPLOAD_BURST:
+                    # 完整音频：按长度选择帧大小，不等待间隔
+                    chunk_size = None
+                    interval = 0
+                else:
+                    chunk_size = 1280  # 每次发送1280字节（40ms音频）
+                    interval = 0.04
                 
-                for i in range(0, len(audio_data), chunk_size):
-                    chunk = audio_data[i:i + chunk_size]
-                    
-                    # 判断是否为最后一帧
-                    if i + chunk_size >= len(audio_data):
-                        status = 2
-                    elif i == 0:
-                        status = 0
-                    else:
-                        status = 1
-                    
-                    # 构建发送数据
-                    frame = {
-                        "common": {
-                            "app_id": self.appid
-                        },
-                        "business": {
-                            "language": "zh_cn",
-                            "domain": "iat",
-                            "accent": "mandarin",
-                            "vad_eos": 2000,
-                            "dwa": "wpgs"
-                        },
-                        "data": {
-                            "status": status,
-                            "format": "audio/L16;rate=16000",
-                            "encoding": "raw",
-                            "audio": base64.b64encode(chunk).decode()
-                        }
-                    }
-                    
-                    # 只在首帧发送business参数
-                    if status != 0:
-                        del frame["business"]
-                    
-                    ws.send(json.dumps(frame))
-                    time.sleep(0.04)  # 模拟40ms间隔
+                # 分片是音频缓冲区上的memoryview，帧JSON由模板拼接
+                chunks = list(iter_pcm_chunks(self.pcm, chunk_size))
+                for i, chunk in enumerate(chunks):
+                    status = STATUS_FIRST_FRAME if i == 0 else STATUS_CONTINUE_FRAME  # 0:首帧 1:中间帧 2:尾帧
+                    ws.send(self.frame_encoder.encode(chunk, status, is_last=(i == len(chunks) - 1),
+                                                      sample_rate=self.sample_rate))
+                    if interval:
+                        time.sleep(interval)  # 模拟40ms间隔
                 
                 print("📤 音频数据发送完成")
                 
@@ -169,59 +210,7 @@ class XunfeiWebSocketASR:
                 ws.close()
         
         # 在新线程中发送音频
-        import threading
         threading.Thread(target=send_audio).start()
-    
-    def recognize(self, audio_data: bytes) -> Dict[str, Any]:
-        """
-        识别音频
-        
-        参数:
-            audio_data: 音频二进制数据（PCM/WAV格式，16kHz，16bit，单声道）
-        
-        返回:
-            识别结果
-        """
-        self.result_text = ""
-        self.audio_data = audio_data
-        
-        try:
-            # 创建WebSocket连接
-            websocket.enableTrace(False)
-            ws_url = self.create_url()
-            
-            self.ws = websocket.WebSocketApp(
-                ws_url,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close,
-                on_open=self.on_open
-            )
-            
-            print("📡 正在连接讯飞WebSocket...")
-            
-            # 运行WebSocket（会阻塞直到连接关闭）
-            self.ws.run_forever(
-                sslopt={"cert_reqs": ssl.CERT_NONE}
-            )
-            
-            if self.result_text:
-                return {
-                    "success": True,
-                    "text": self.result_text
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": "识别结果为空"
-                }
-                
-        except Exception as e:
-            print(f"❌ WebSocket识别失败: {e}")
-            return {
-                "success": False,
-                "error": f"WebSocket识别失败: {str(e)}"
-            }
 
 
 if __name__ == "__main__":
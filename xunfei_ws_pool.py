@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+讯飞语音识别WebSocket连接池
+负责：预先建立已鉴权的连接、在日期签名过期前重新签名、按次分发连接
+讯飞的每个WebSocket连接只能完成一次识别，用完即关闭，池中只保存尚未使用的预热连接；
+空闲连接定期ping检查，只有鉴权URL过期或ping失败（已被服务端断开）时才重连
+"""
+
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any
+
+import websocket
+
+
+class XunfeiConnectionPool:
+    """讯飞WebSocket预热连接池"""
+
+    def __init__(self, url_factory: Callable[[], str], pool_size: int = 2,
+                 ping_interval: float = 5.0, url_ttl: float = 240.0, connect_timeout: float = 10.0):
+        """
+        参数:
+            url_factory: 生成鉴权URL的函数（如 XunfeiASROfficial.create_url）
+            pool_size: 保持的预热连接数，0表示不预热、每次现连
+            ping_interval: 检查空闲连接的间隔秒数（发送ping，失败说明连接已断开）
+            url_ttl: 鉴权URL的复用秒数，须小于讯飞允许的300秒时钟偏差；
+                     用更早签名的URL建立的空闲连接也在此时替换
+            connect_timeout: 建立连接的超时秒数
+        """
+        self.url_factory = url_factory
+        self.pool_size = pool_size
+        self.ping_interval = ping_interval
+        self.url_ttl = url_ttl
+        self.connect_timeout = connect_timeout
+
+        self._idle = deque()  # (ws, URL签名时间)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._url = None
+        self._url_signed_at = 0.0
+
+        self.warm_hits = 0
+        self.cold_opens = 0
+        self.expired = 0
+
+        self._warmer = None
+        if pool_size > 0:
+            self._warmer = threading.Thread(target=self._warm_loop, name="xunfei-ws-warmer", daemon=True)
+            self._warmer.start()
+
+    def _signed_url(self):
+        """返回 (鉴权URL, 签名时间)，快到期时重新签名"""
+        now = time.monotonic()
+        with self._lock:
+            if self._url is None or now - self._url_signed_at > self.url_ttl:
+                self._url = self.url_factory()
+                self._url_signed_at = now
+            return self._url, self._url_signed_at
+
+    def _open(self):
+        """新建连接，返回 (ws, URL签名时间)"""
+        url, signed_at = self._signed_url()
+        ws = websocket.create_connection(
+            url,
+            timeout=self.connect_timeout,
+            sslopt={"cert_reqs": ssl.CERT_NONE}
+        )
+        return ws, signed_at
+
+    def _is_usable(self, ws: websocket.WebSocket, signed_at: float, now: float) -> bool:
+        return ws.connected and now - signed_at < self.url_ttl
+
+    def acquire(self) -> websocket.WebSocket:
+        """
+        取出一个可用连接：优先使用未过期的预热连接，没有则立即新建
+        调用方负责在识别结束后关闭连接
+        """
+        now = time.monotonic()
+        stale = []
+        ws = None
+        with self._lock:
+            while self._idle:
+                candidate, signed_at = self._idle.popleft()
+                if self._is_usable(candidate, signed_at, now):
+                    ws = candidate
+                    self.warm_hits += 1
+                    break
+                stale.append(candidate)
+                self.expired += 1
+
+        self._close_all(stale)
+        self._wakeup.set()
+
+        if ws is None:
+            ws = self.open_fresh()
+        return ws
+
+    def open_fresh(self) -> websocket.WebSocket:
+        """不经过预热队列，直接新建连接（用于预热连接失效后的重试）"""
+        with self._lock:
+            self.cold_opens += 1
+        return self._open()[0]
+
+    @staticmethod
+    def _ping(ws: websocket.WebSocket) -> bool:
+        """发送ping，失败说明连接已被断开"""
+        try:
+            ws.ping()
+            return True
+        except Exception:
+            return False
+
+    def _check_idle(self):
+        """
+        逐个检查空闲连接：每次只取出一个，在锁外ping（网络往返），健康的放回队尾
+        检查期间 acquire() 仍可取用其余空闲连接，不会等待ping
+        """
+        with self._lock:
+            count = len(self._idle)
+        for _ in range(count):
+            with self._lock:
+                if self._closed or not self._idle:
+                    return
+                ws, signed_at = self._idle.popleft()
+            healthy = self._is_usable(ws, signed_at, time.monotonic()) and self._ping(ws)
+            with self._lock:
+                if healthy and not self._closed:
+                    self._idle.append((ws, signed_at))
+                    continue
+                if not healthy:
+                    self.expired += 1
+            self._close_all([ws])
+
+    def _warm_loop(self):
+        """后台线程：补足预热连接，替换已断开或鉴权URL已过期的连接"""
+        while not self._closed:
+            self._check_idle()
+            with self._lock:
+                missing = self.pool_size - len(self._idle)
+
+            for _ in range(max(0, missing)):
+                try:
+                    ws, signed_at = self._open()
+                except Exception as e:
+                    print(f"⚠️  讯飞预热连接失败: {e}")
+                    break
+                with self._lock:
+                    if self._closed:
+                        stale = [ws]
+                    else:
+                        self._idle.append((ws, signed_at))
+                        stale = []
+                self._close_all(stale)
+
+            self._wakeup.wait(self.ping_interval)
+            self._wakeup.clear()
+
+    @staticmethod
+    def _close_all(connections):
+        for ws in connections:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "idle": len(self._idle),
+                "warm_hits": self.warm_hits,
+                "cold_opens": self.cold_opens,
+                "expired": self.expired
+            }
+
+    def close(self):
+        """关闭连接池及所有预热连接"""
+        with self._lock:
+            self._closed = True
+            idle = [ws for ws, _ in self._idle]
+            self._idle.clear()
+        self._wakeup.set()
+        self._close_all(idle)